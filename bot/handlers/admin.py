@@ -8,9 +8,12 @@ from datetime import datetime
 from database.database import AsyncSessionLocal
 from database.models import User, Subscription, Payment, SubscriptionStatus, PaymentStatus
 from services.user_service import UserService
-from services.marzban_service import marzban_service
+from services.marzban_service import marzban_pool
 from services.promocode_service import promocode_service
+from services.referral_service import referral_service, referral_leaderboard
+from services.node_traffic_service import node_traffic_service
 from bot.keyboards.inline import admin_panel_keyboard
+from bot.texts import ADMIN_PANEL_TEXT, ADMIN_PANEL_TEXT_HTML
 from config import settings
 from loguru import logger
 
@@ -19,7 +22,7 @@ router = Router()
 
 async def is_admin(telegram_id: int) -> bool:
     """Проверка прав администратора"""
-    return telegram_id in settings.admin_ids_list
+    return telegram_id in settings.admin_ids
 
 
 @router.message(F.text == "👨‍💼 Админ-панель")
@@ -29,12 +32,7 @@ async def show_admin_panel(message: Message):
         await message.answer("❌ У вас нет прав администратора")
         return
 
-    text = """
-👨‍💼 Админ-панель
-
-Выберите раздел:
-"""
-    await message.answer(text, reply_markup=admin_panel_keyboard())
+    await message.answer(ADMIN_PANEL_TEXT, reply_markup=admin_panel_keyboard())
 
 
 @router.callback_query(F.data == "admin_panel")
@@ -44,13 +42,8 @@ async def show_admin_panel_callback(callback: CallbackQuery):
         await callback.answer("❌ Нет доступа", show_alert=True)
         return
 
-    text = """
-👨‍💼 <b>Админ-панель</b>
-
-Выберите раздел:
-"""
     try:
-        await callback.message.edit_text(text, reply_markup=admin_panel_keyboard(), parse_mode="HTML")
+        await callback.message.edit_text(ADMIN_PANEL_TEXT_HTML, reply_markup=admin_panel_keyboard(), parse_mode="HTML")
     except TelegramBadRequest:
         pass
     await callback.answer()
@@ -99,7 +92,7 @@ async def show_admin_stats(callback: CallbackQuery):
         ) or 0
 
         # Трафик из Marzban
-        marzban_users = await marzban_service.get_all_users()
+        marzban_users = await marzban_pool.get_all_users()
         total_traffic_bytes = sum((u.get("used_traffic") or 0) for u in marzban_users)
         total_traffic_gb = total_traffic_bytes / (1024 ** 3)
         total_traffic_formatted = f"{total_traffic_gb:.2f} GB"
@@ -211,6 +204,82 @@ async def show_admin_payments(callback: CallbackQuery):
     await callback.answer()
 
 
+@router.callback_query(F.data == "admin_referrals")
+async def show_admin_referrals(callback: CallbackQuery):
+    """Показать топ рефереров"""
+    if not await is_admin(callback.from_user.id):
+        await callback.answer("❌ Нет доступа", show_alert=True)
+        return
+
+    async with AsyncSessionLocal() as session:
+        await referral_leaderboard.ensure_fresh(session)
+        by_referrals = referral_leaderboard.top_by_referrals()
+        by_earnings = referral_leaderboard.top_by_earnings()
+
+        # Размер сети (все уровни) — одним запросом по дереву рефералов
+        network = await referral_service.get_network_sizes(
+            session, list({e.telegram_id for e in by_referrals + by_earnings})
+        )
+
+    def title(entry) -> str:
+        return f"@{entry.username}" if entry.username else (entry.first_name or str(entry.telegram_id))
+
+    referrals_text = "🏆 Топ рефереров\n\n👥 По приглашённым:\n"
+    for place, entry in enumerate(by_referrals, 1):
+        referrals_text += (
+            f"{place}. {title(entry)} — {entry.total_referrals} "
+            f"(в сети: {network.get(entry.telegram_id, 0)})\n"
+        )
+    if not by_referrals:
+        referrals_text += "Пока никого\n"
+
+    referrals_text += "\n💰 По заработку:\n"
+    for place, entry in enumerate(by_earnings, 1):
+        referrals_text += f"{place}. {title(entry)} — {entry.total_earned:.2f}₽\n"
+    if not by_earnings:
+        referrals_text += "Пока никого\n"
+
+    try:
+        await callback.message.edit_text(referrals_text, reply_markup=admin_panel_keyboard())
+    except TelegramBadRequest:
+        pass
+    await callback.answer()
+
+
+@router.callback_query(F.data == "admin_nodes")
+async def show_admin_nodes(callback: CallbackQuery):
+    """Показать трафик по нодам за месяц"""
+    if not await is_admin(callback.from_user.id):
+        await callback.answer("❌ Нет доступа", show_alert=True)
+        return
+
+    async with AsyncSessionLocal() as session:
+        overview = await node_traffic_service.get_overview(session)
+
+    nodes_text = f"🖥 Трафик нод за {overview['month']}\n\n"
+    for node in overview["nodes"]:
+        used_gb = node_traffic_service.usage_gb(node)
+        percent = used_gb / node.limit_gb * 100 if node.limit_gb else 0
+        rate_mbit = (node.rx_rate + node.tx_rate) * 8 / 1_000_000
+        nodes_text += (
+            f"{'🔴' if percent >= 90 else '🟡' if percent >= 75 else '🟢'} {node.node}\n"
+            f"📊 {used_gb:.2f} / {node.limit_gb:.0f} GB ({percent:.1f}%)\n"
+            f"⚡ Сейчас: {rate_mbit:.1f} Мбит/с\n"
+            f"🕐 Обновлено: {node.updated_at.strftime('%d.%m %H:%M')}\n\n"
+        )
+
+    if overview["nodes"]:
+        nodes_text += f"Всего: {overview['total_gb']:.2f} / {overview['limit_gb']:.0f} GB"
+    else:
+        nodes_text += "Отчётов от нод пока нет"
+
+    try:
+        await callback.message.edit_text(nodes_text, reply_markup=admin_panel_keyboard())
+    except TelegramBadRequest:
+        pass
+    await callback.answer()
+
+
 @router.callback_query(F.data == "admin_traffic")
 async def show_admin_traffic(callback: CallbackQuery):
     """Показать трафик по клиентам"""
@@ -222,7 +291,7 @@ async def show_admin_traffic(callback: CallbackQuery):
 
     try:
         # Получаем всех пользователей из Marzban
-        marzban_users = await marzban_service.get_all_users()
+        marzban_users = await marzban_pool.get_all_users()
 
         if not marzban_users:
             try:
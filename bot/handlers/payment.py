@@ -6,6 +6,7 @@ from database.database import AsyncSessionLocal
 from services.payment_service import PaymentService
 from services.subscription_service import SubscriptionService
 from services.user_service import UserService
+from services.referral_service import referral_service
 from services.marzban_service import marzban_service
 from bot.keyboards.inline import payment_keyboard, subscription_plans_keyboard, payment_method_keyboard
 from loguru import logger
@@ -189,14 +190,10 @@ async def process_balance_payment(callback: CallbackQuery):
     amount = payment_service.get_price(plan_type)
     
     async with AsyncSessionLocal() as session:
-        user = await UserService.get_user_by_telegram_id(session, callback.from_user.id)
-        
-        if not user or user.balance < amount:
+        # Списываем баланс (атомарно, с проверкой достаточности средств)
+        if not await UserService.debit_balance(session, callback.from_user.id, amount):
             await callback.answer("❌ Недостаточно средств на балансе", show_alert=True)
             return
-
-        # Списываем баланс
-        user.balance -= amount
         
         # Создаем или продлеваем подписку
         existing_subscription = await subscription_service.get_active_subscription(
@@ -314,9 +311,11 @@ async def check_payment_status(callback: CallbackQuery, state: FSMContext):
                         telegram_username=callback.from_user.username,
                     )
 
-                # Начисляем реферальный бонус
+                # Начисляем реферальный бонус (повторно с того же платежа не начислится)
                 if payment.amount:
-                    await UserService.accrue_referral_bonus(session, callback.from_user.id, payment.amount)
+                    await referral_service.process_referral_payment(
+                        session, payment.id, callback.from_user.id, payment.amount
+                    )
 
                 await session.commit()
 
@@ -361,17 +360,13 @@ async def cancel_payment(callback: CallbackQuery, state: FSMContext):
 async def back_to_menu(callback: CallbackQuery):
     """Вернуться в главное меню"""
     from bot.keyboards.inline import main_menu_keyboard
+    from bot.texts import MAIN_MENU_TEXT
     from config import settings
 
-    is_admin = callback.from_user.id in settings.admin_ids_list
-
-    text = """
-🚀 <b>FreedomVPN</b> — твой свободный интернет без границ.
+    is_admin = callback.from_user.id in settings.admin_ids
 
-Выберите действие:
-"""
     await callback.message.edit_text(
-        text,
+        MAIN_MENU_TEXT,
         reply_markup=main_menu_keyboard(is_admin=is_admin),
         parse_mode="HTML"
     )
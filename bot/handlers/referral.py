@@ -7,7 +7,6 @@ from aiogram.filters import Command
 from aiogram.fsm.state import State, StatesGroup
 from aiogram.fsm.context import FSMContext
 from database.database import AsyncSessionLocal
-from services.user_service import UserService
 from services.referral_service import referral_service
 from services.promocode_service import promocode_service
 from services.subscription_service import SubscriptionService
@@ -44,12 +43,9 @@ async def show_referral_info(telegram_id: int, message: Message, callback: Callb
         # Получаем или создаём реферальный код
         referral_code = await referral_service.create_or_get_referral_code(session, telegram_id)
 
-        # Получаем статистику
+        # Получаем статистику (счётчики и баланс одним запросом)
         stats = await referral_service.get_referral_stats(session, telegram_id)
 
-        # Получаем информацию о пользователе
-        user = await UserService.get_user_by_telegram_id(session, telegram_id)
-
         referral_link = f"https://t.me/{settings.BOT_USERNAME}?start={referral_code}"
 
         text = f"""
@@ -63,7 +59,7 @@ async def show_referral_info(telegram_id: int, message: Message, callback: Callb
 📊 **Ваша статистика:**
 • Рефералов: **{stats['referrals_count']}**
 • Заработано: **{stats['total_earned']:.2f}₽**
-• Баланс: **{user.balance:.2f}₽**
+• Баланс: **{stats['balance']:.2f}₽**
 
 💡 **Как это работает:**
 1. Отправьте ссылку другу
@@ -153,7 +149,7 @@ async def process_promocode_input(message: Message, state: FSMContext):
         if not validation["valid"]:
             if attempts >= 5:
                 # После 5 неудачных попыток - возврат в главное меню
-                is_admin = message.from_user.id in settings.admin_ids_list
+                is_admin = message.from_user.id in settings.admin_ids
                 await message.answer(
                     f"❌ {validation['error']}\n\n"
                     f"Вы исчерпали 5 попыток ввода промокода.",
@@ -177,6 +173,20 @@ async def process_promocode_input(message: Message, state: FSMContext):
         if promocode.discount_type == "bonus_days":
             bonus_days = int(promocode.discount_value)
 
+            # Сначала гасим промокод (атомарно) — подписка создаётся только если он ещё доступен.
+            # Всё в одной транзакции: если выдача подписки упадёт, погашение откатится.
+            redemption = await promocode_service.apply_promocode(
+                session, promocode, message.from_user.id, 0, None
+            )
+            if not redemption["applied"]:
+                await message.answer(
+                    f"❌ {redemption['error']}",
+                    reply_markup=back_to_menu_keyboard(),
+                    parse_mode="HTML"
+                )
+                await state.clear()
+                return
+
             # Проверяем активную подписку
             existing_subscription = await subscription_service.get_active_subscription(
                 session, message.from_user.id
@@ -214,11 +224,6 @@ async def process_promocode_input(message: Message, state: FSMContext):
                     session, message.from_user.id, plan_type, first_name
                 )
 
-            # Применяем промокод (записываем использование)
-            await promocode_service.apply_promocode(
-                session, promocode, message.from_user.id, 0, None
-            )
-
             await session.commit()
 
             # Получаем ссылку для подключения
@@ -259,7 +264,7 @@ async def process_promocode_input(message: Message, state: FSMContext):
             elif promocode.discount_type == "fixed":
                 discount_text = f"скидка {int(promocode.discount_value)}₽"
 
-            is_admin = message.from_user.id in settings.admin_ids_list
+            is_admin = message.from_user.id in settings.admin_ids
             await message.answer(
                 f"✅ <b>Промокод {code} принят!</b>\n\n"
                 f"🎁 Вы получите: <b>{discount_text}</b>\n\n"
@@ -276,14 +281,13 @@ async def callback_referral_stats(callback: CallbackQuery):
     """Подробная статистика рефералов"""
     async with AsyncSessionLocal() as session:
         stats = await referral_service.get_referral_stats(session, callback.from_user.id)
-        user = await UserService.get_user_by_telegram_id(session, callback.from_user.id)
 
         text = f"""
 📊 <b>Подробная статистика</b>
 
 👥 Всего рефералов: <b>{stats['referrals_count']}</b>
 💰 Всего заработано: <b>{stats['total_earned']:.2f}₽</b>
-💳 Текущий баланс: <b>{user.balance:.2f}₽</b>
+💳 Текущий баланс: <b>{stats['balance']:.2f}₽</b>
 
 <i>Баланс можно использовать для оплаты подписки</i>
 """
@@ -1,8 +1,14 @@
+from functools import lru_cache
+
 from aiogram.types import InlineKeyboardMarkup, InlineKeyboardButton
 from aiogram.utils.keyboard import InlineKeyboardBuilder
 from config import settings
 
+# Статические клавиатуры собираются один раз и переиспользуются (lru_cache по флагам).
+# Готовые InlineKeyboardMarkup нигде не изменяются, поэтому их безопасно отдавать повторно.
+
 
+@lru_cache(maxsize=None)
 def subscription_plans_keyboard(show_trial: bool = False) -> InlineKeyboardMarkup:
     """Клавиатура с планами подписки (тестовый период теперь в главном меню)"""
     builder = InlineKeyboardBuilder()
@@ -63,6 +69,7 @@ def payment_method_keyboard(plan_type: str, price: int, balance: float) -> Inlin
     return builder.as_markup()
 
 
+@lru_cache(maxsize=None)
 def connection_guide_keyboard() -> InlineKeyboardMarkup:
     """Клавиатура с инструкциями"""
     builder = InlineKeyboardBuilder()
@@ -82,6 +89,7 @@ def connection_guide_keyboard() -> InlineKeyboardMarkup:
     return builder.as_markup()
 
 
+@lru_cache(maxsize=None)
 def admin_panel_keyboard() -> InlineKeyboardMarkup:
     """Клавиатура админ-панели"""
     builder = InlineKeyboardBuilder()
@@ -98,12 +106,19 @@ def admin_panel_keyboard() -> InlineKeyboardMarkup:
     builder.row(
         InlineKeyboardButton(text="🌐 Трафик клиентов", callback_data="admin_traffic")
     )
+    builder.row(
+        InlineKeyboardButton(text="🏆 Топ рефереров", callback_data="admin_referrals")
+    )
+    builder.row(
+        InlineKeyboardButton(text="🖥 Ноды", callback_data="admin_nodes")
+    )
     builder.row(
         InlineKeyboardButton(text="◀️ Назад", callback_data="back_to_menu")
     )
 
     return builder.as_markup()
 
+@lru_cache(maxsize=None)
 def main_menu_keyboard(is_admin: bool = False, show_trial: bool = False) -> InlineKeyboardMarkup:
     """Главное меню бота"""
     builder = InlineKeyboardBuilder()
@@ -167,6 +182,7 @@ def referral_keyboard(referral_link: str = "") -> InlineKeyboardMarkup:
     return builder.as_markup()
 
 
+@lru_cache(maxsize=None)
 def back_to_menu_keyboard() -> InlineKeyboardMarkup:
     """Кнопка назад в меню"""
     builder = InlineKeyboardBuilder()
@@ -178,6 +194,7 @@ def back_to_menu_keyboard() -> InlineKeyboardMarkup:
     return builder.as_markup()
 
 
+@lru_cache(maxsize=None)
 def status_keyboard() -> InlineKeyboardMarkup:
     """Клавиатура в статусе подписки"""
     builder = InlineKeyboardBuilder()
@@ -196,3 +213,15 @@ def status_keyboard() -> InlineKeyboardMarkup:
     )
 
     return builder.as_markup()
+
+
+def warm_up_keyboards():
+    """Собрать все статические клавиатуры заранее (вызывается при старте бота)"""
+    for show_trial in (False, True):
+        subscription_plans_keyboard(show_trial=show_trial)
+        for is_admin in (False, True):
+            main_menu_keyboard(is_admin=is_admin, show_trial=show_trial)
+    connection_guide_keyboard()
+    admin_panel_keyboard()
+    back_to_menu_keyboard()
+    status_keyboard()
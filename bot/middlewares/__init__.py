@@ -0,0 +1,4 @@
+from .metrics import MetricsMiddleware
+from .throttling import ThrottlingMiddleware, ThrottleRule
+
+__all__ = ["MetricsMiddleware", "ThrottlingMiddleware", "ThrottleRule"]
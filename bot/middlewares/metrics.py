@@ -0,0 +1,39 @@
+"""
+Метрики хендлеров: время обработки и ошибки по типу апдейта и имени хендлера,
+число запросов к БД на апдейт (в лог)
+"""
+import time
+from typing import Any, Awaitable, Callable, Dict
+
+from aiogram import BaseMiddleware
+from aiogram.types import TelegramObject
+
+from services.metrics import HANDLER_ERRORS, HANDLER_SECONDS, HANDLERS_IN_PROGRESS, track_queries
+
+
+class MetricsMiddleware(BaseMiddleware):
+    """Inner-middleware: метка handler — имя функции хендлера (а не callback_data, чтобы не плодить серии)"""
+
+    def __init__(self, event_name: str):
+        self.event_name = event_name
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any],
+    ) -> Any:
+        handler_object = data.get("handler")
+        name = getattr(getattr(handler_object, "callback", None), "__name__", "unknown")
+
+        HANDLERS_IN_PROGRESS.inc()
+        start = time.perf_counter()
+        try:
+            with track_queries(f"{self.event_name}:{name}"):
+                return await handler(event, data)
+        except Exception:
+            HANDLER_ERRORS.labels(self.event_name, name).inc()
+            raise
+        finally:
+            HANDLER_SECONDS.labels(self.event_name, name).observe(time.perf_counter() - start)
+            HANDLERS_IN_PROGRESS.dec()
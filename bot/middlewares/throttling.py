@@ -0,0 +1,112 @@
+"""
+Throttling и дедупликация callback-запросов
+
+Тяжёлые кнопки (проверка оплаты, статус, QR-код) ходят в БД, Marzban и ЮKassa.
+Middleware ограничивает частоту нажатий на пользователя и действие (token bucket),
+а повторное нажатие той же кнопки, пока первое ещё выполняется, не запускает
+обработчик заново — оно дожидается завершения первого.
+"""
+import asyncio
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable, Dict
+
+from aiogram import BaseMiddleware
+from aiogram.exceptions import TelegramBadRequest
+from aiogram.types import CallbackQuery
+from loguru import logger
+
+
+@dataclass(frozen=True)
+class ThrottleRule:
+    """Параметры token bucket: capacity нажатий подряд, refill_rate токенов в секунду"""
+    capacity: int
+    refill_rate: float
+
+
+# Ключ — callback_data; ключ с "_" на конце работает как префикс (pay_card_day, pay_card_week...)
+DEFAULT_RULES: Dict[str, ThrottleRule] = {
+    "check_payment": ThrottleRule(capacity=3, refill_rate=1 / 10),
+    "my_status": ThrottleRule(capacity=5, refill_rate=1 / 3),
+    "show_qr_code": ThrottleRule(capacity=3, refill_rate=1 / 10),
+    "pay_card_": ThrottleRule(capacity=3, refill_rate=1 / 20),
+}
+
+
+class ThrottlingMiddleware(BaseMiddleware):
+    """Per-user/per-action rate limit + in-flight дедупликация для CallbackQuery"""
+
+    THROTTLED_TEXT = "⏳ Слишком часто. Подождите немного и попробуйте снова."
+
+    def __init__(
+        self,
+        storage,
+        rules: Dict[str, ThrottleRule] | None = None,
+        lock_ttl: float = 30.0,
+    ):
+        self.storage = storage
+        self.rules = rules if rules is not None else DEFAULT_RULES
+        self.lock_ttl = lock_ttl
+        self._inflight: Dict[str, asyncio.Future] = {}
+
+    def _match(self, data: str | None) -> str | None:
+        """Найти правило для callback_data, вернуть имя действия"""
+        if not data:
+            return None
+        if data in self.rules:
+            return data
+        for action in self.rules:
+            if action.endswith("_") and data.startswith(action):
+                return action
+        return None
+
+    @staticmethod
+    async def _safe_answer(event: CallbackQuery, text: str | None = None):
+        try:
+            await event.answer(text)
+        except TelegramBadRequest:
+            # Callback уже устарел — отвечать некому
+            pass
+
+    async def __call__(
+        self,
+        handler: Callable[[CallbackQuery, Dict[str, Any]], Awaitable[Any]],
+        event: CallbackQuery,
+        data: Dict[str, Any],
+    ) -> Any:
+        action = self._match(event.data)
+        if action is None or event.from_user is None:
+            return await handler(event, data)
+
+        user_id = event.from_user.id
+        inflight_key = f"inflight:{user_id}:{event.data}"
+
+        # Такой же запрос уже выполняется в этом процессе — присоединяемся к нему
+        running = self._inflight.get(inflight_key)
+        if running is not None:
+            result = await asyncio.shield(running)
+            await self._safe_answer(event)
+            return result
+
+        rule = self.rules[action]
+        if not await self.storage.consume(f"throttle:{user_id}:{action}", rule.capacity, rule.refill_rate):
+            logger.debug(f"Throttled {action} for user {user_id}")
+            await self._safe_answer(event, self.THROTTLED_TEXT)
+            return None
+
+        # Такой же запрос выполняется в другом воркере — ждём его и не дублируем работу
+        if not await self.storage.acquire(inflight_key, self.lock_ttl):
+            await self.storage.wait_released(inflight_key, self.lock_ttl)
+            await self._safe_answer(event)
+            return None
+
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[inflight_key] = future
+        result = None
+        try:
+            result = await handler(event, data)
+            return result
+        finally:
+            # Присоединившиеся получают результат первого вызова (None, если он упал)
+            future.set_result(result)
+            self._inflight.pop(inflight_key, None)
+            await self.storage.release(inflight_key)
@@ -0,0 +1,242 @@
+"""
+Тексты сообщений бота
+
+Статические тексты собираются один раз при импорте (цены берутся из settings),
+динамические — это шаблоны str.format, которые только подставляют значения.
+"""
+from config import settings
+
+
+# ============== ГЛАВНОЕ МЕНЮ ==============
+
+MAIN_MENU_TEXT = """
+🚀 <b>FreedomVPN</b> — твой свободный интернет без границ.
+
+Выберите действие:
+"""
+
+WELCOME_NEW_TEMPLATE = """
+👋 Привет, {name}!
+
+🚀 <b>FreedomVPN</b> — твой свободный интернет без границ.
+Протокол <b>VLESS + Reality</b> невозможно заблокировать!
+
+⚡️ <b>YouTube 4K</b> без тормозов и буферизации
+🛡 <b>Полная анонимность</b> и шифрование
+🌍 <b>Доступ</b> к Instagram, Netflix, ChatGPT
+📱 Работает на <b>iPhone, Android, PC и Mac</b>
+
+🎁 <b>ПОПРОБУЙ БЕСПЛАТНО (72 часа)</b>
+Жми кнопку ниже!
+
+👇 Начни прямо сейчас!
+"""
+
+WELCOME_BACK_TEMPLATE = """
+👋 С возвращением, {name}!
+
+🚀 <b>FreedomVPN</b> — твой свободный интернет без границ.
+
+👇 Выберите действие:
+"""
+
+HELP_TEXT = f"""
+📖 <b>Справка по использованию бота:</b>
+
+💰 <b>Купить подписку</b> - выбрать и оплатить тариф
+📊 <b>Мой статус</b> - проверить активную подписку
+📱 <b>Инструкция</b> - как подключиться к VPN
+❓ <b>Помощь</b> - это сообщение
+
+📞 <b>Поддержка:</b> @{settings.SUPPORT_USERNAME}
+
+Команды:
+/start - начать работу
+/menu - главное меню
+/help - справка
+/status - проверить статус подписки
+/myid - показать ваш Telegram ID
+"""
+
+
+# ============== ТАРИФЫ ==============
+
+def _build_plans_text(bold: bool) -> str:
+    b, _b = ("<b>", "</b>") if bold else ("", "")
+    return f"""
+💰 {b}Выберите тариф:{_b}
+
+1️⃣ День - {settings.PRICE_DAY}₽
+   • Идеально для тестирования
+
+7️⃣ Неделя - {settings.PRICE_WEEK}₽
+   • Выгода 22%
+
+🗓 Месяц - {settings.PRICE_MONTH}₽
+   • Выгода 45%
+
+📆 3 месяца - {settings.PRICE_3MONTH}₽
+   • Выгода 51%
+
+📅 Год - {settings.PRICE_YEAR}₽
+   • Выгода 54%
+
+✨ {b}Все тарифы включают:{_b}
+• Безлимитный трафик
+• Высокая скорость
+• Техподдержка 24/7
+"""
+
+
+# HTML-версия для inline-кнопки, обычный текст — для reply-кнопки
+PLANS_TEXT = _build_plans_text(bold=True)
+PLANS_TEXT_PLAIN = _build_plans_text(bold=False)
+
+PLAN_NAMES = {
+    "trial": "Тестовый (72 часа)",
+    "day": "1 день",
+    "week": "1 неделя",
+    "month": "1 месяц",
+    "3month": "3 месяца",
+    "year": "1 год"
+}
+
+
+# ============== СТАТУС ПОДПИСКИ ==============
+
+STATUS_TEMPLATE = """
+{urgency} <b>Подписка активна!</b>
+
+📋 <b>Информация о подписке:</b>
+├ Тариф: <b>{plan_name}</b>
+├ Осталось: {time_status}
+└ Истекает: <b>{expires_at}</b>
+
+🔐 <b>Подключение VLESS + Reality</b>
+
+🔗 <b>Ваша ссылка подключения:</b>
+<code>{vless_link}</code>
+
+💡 <i>Нажмите на ссылку для копирования</i>
+
+━━━━━━━━━━━━━━━━━━━━━
+📱 <b>Как подключиться:</b>
+• <b>Android:</b> v2rayNG
+• <b>iPhone:</b> Streisand, Shadowrocket
+• <b>Windows:</b> v2rayN, Nekoray
+• <b>macOS:</b> V2rayU, Nekoray
+"""
+
+
+# ============== ИНСТРУКЦИИ ==============
+
+CONNECTION_GUIDE_TEXT = """
+📱 <b>Инструкция по подключению к VPN</b>
+<i>(VLESS + Reality)</i>
+
+Выберите вашу платформу:
+"""
+
+PLATFORM_GUIDES = {
+    "ios": """
+📱 Инструкция для iPhone / iPad:
+
+1. Скачайте Streisand из App Store (бесплатно):
+   https://apps.apple.com/app/streisand/id6450534064
+
+   Или Hiddify:
+   https://apps.apple.com/app/hiddify-proxy-vpn/id6596777532
+
+2. Откройте приложение
+
+3. Скопируйте вашу VLESS-ссылку из бота
+
+4. Нажмите "+" → "Добавить из буфера"
+
+5. Нажмите на созданный профиль → Подключиться
+
+✅ Готово! Вы подключены к VPN.
+
+💡 Streisand — бесплатный и простой
+💡 Hiddify — больше функций
+""",
+    "android": """
+🤖 Инструкция для Android:
+
+1. Скачайте v2rayNG из Google Play:
+   https://play.google.com/store/apps/details?id=com.v2ray.ang
+
+   Или Hiddify:
+   https://play.google.com/store/apps/details?id=app.hiddify.com
+
+2. Откройте приложение
+
+3. Скопируйте вашу VLESS-ссылку из бота
+
+4. Нажмите "+" → "Импорт из буфера обмена"
+
+5. Нажмите на профиль → кнопка ▶️ внизу
+
+✅ Готово! Вы подключены к VPN.
+
+💡 v2rayNG — классика, работает стабильно
+💡 Hiddify — современный интерфейс
+""",
+    "windows": """
+💻 Инструкция для Windows:
+
+1. Скачайте Hiddify:
+   https://github.com/hiddify/hiddify-next/releases
+   (файл Hiddify-Windows-Setup.exe)
+
+2. Установите и запустите приложение
+
+3. Скопируйте вашу VLESS-ссылку из бота
+
+4. Нажмите "+" → "Добавить из буфера"
+
+5. Выберите профиль и нажмите "Подключиться"
+
+✅ Готово! Вы подключены к VPN.
+
+💡 Альтернатива: v2rayN
+   https://github.com/2dust/v2rayN/releases
+""",
+    "macos": """
+🍎 Инструкция для macOS:
+
+1. Скачайте Hiddify:
+   https://github.com/hiddify/hiddify-next/releases
+   (файл Hiddify-MacOS.dmg)
+
+2. Установите и запустите приложение
+
+3. Скопируйте вашу VLESS-ссылку из бота
+
+4. Нажмите "+" → "Добавить из буфера"
+
+5. Выберите профиль и нажмите "Подключиться"
+
+✅ Готово! Вы подключены к VPN.
+
+💡 Альтернатива: V2RayXS
+   https://github.com/tzmax/V2RayXS/releases
+"""
+}
+
+GUIDE_NOT_FOUND_TEXT = "Инструкция не найдена"
+
+
+# ============== АДМИН-ПАНЕЛЬ ==============
+
+ADMIN_PANEL_TEXT = """
+👨‍💼 Админ-панель
+
+Выберите раздел:
+"""
+
+ADMIN_PANEL_TEXT_HTML = """
+👨‍💼 <b>Админ-панель</b>
+
+Выберите раздел:
+"""
@@ -1,5 +1,6 @@
+from functools import cached_property
 from pydantic_settings import BaseSettings, SettingsConfigDict
-from typing import List
+from typing import FrozenSet, List
 
 
 class Settings(BaseSettings):
@@ -25,6 +26,10 @@ class Settings(BaseSettings):
     MARZBAN_API_URL: str = "http://localhost:8000"
     MARZBAN_USERNAME: str = "admin"
     MARZBAN_PASSWORD: str = "admin"
+    # Несколько нод: JSON-список [{"name", "url", "host", "location", "max_users", ...}];
+    # пусто — одна нода из MARZBAN_API_URL
+    MARZBAN_NODES: str = ""
+    NODE_PROBE_INTERVAL: float = 30.0  # Как часто проверять доступность нод для /api/servers
 
     # VPN Server
     VPN_SERVER_HOST: str = "107.189.23.38"
@@ -34,6 +39,10 @@ class Settings(BaseSettings):
     # Redis
     REDIS_URL: str = "redis://localhost:6379/0"
 
+    # Throttling callback-кнопок, лимиты API и рассылка изменений подписок между воркерами webhook:
+    # "memory" (один процесс) или "redis" (общий для воркеров)
+    THROTTLE_STORAGE: str = "memory"
+
     # Pricing
     PRICE_TRIAL: int = 0  # Бесплатный тестовый период 24 часа
     PRICE_DAY: int = 9
@@ -43,17 +52,69 @@ class Settings(BaseSettings):
     PRICE_YEAR: int = 1499
 
     # Referral
-    REFERRAL_PERCENT: float = 0.15  # 15% bonus
+    REFERRAL_PERCENT: float = 0.30  # 30% bonus (единый процент для всех начислений)
+    REFERRAL_LEADERBOARD_SIZE: int = 10  # Размер топа рефереров (админка и API)
 
     # Server
     SERVER_LOCATION: str = "Netherlands"
 
+    # Webhook-сервер
+    WEBHOOK_HOST: str = "0.0.0.0"
+    WEBHOOK_PORT: int = 8080
+    # Процессов uvicorn; кэш, SSE и проверка нод — свои в каждом. При нескольких воркерах
+    # без THROTTLE_STORAGE=redis оплата сразу видна только в воркере, принявшем webhook,
+    # остальные узнают о ней по API_CACHE_TTL и тику SSE (до ~45 с)
+    WEBHOOK_WORKERS: int = 1
+    WEBHOOK_GRACEFUL_TIMEOUT: float = 30.0  # Сколько ждать текущие запросы при остановке
+
     # Flutter App API
     FLUTTER_API_KEY: str = ""
+    FLUTTER_API_KEYS: str = ""  # Дополнительные ключи через запятую (ротация, поддержка)
+    ADMIN_API_KEY: str = ""  # Ключ админских эндпоинтов (топ рефереров); пусто — они закрыты
+    API_ALLOW_QUERY_KEY: bool = True  # Принимать ключ из ?api_key= (старые версии приложения); иначе только X-API-Key
+    API_KEY_RATE_CAPACITY: int = 600  # Token bucket на ключ (ключ приложения общий для всех установок)
+    API_KEY_RATE_PER_SECOND: float = 100.0
+    API_IP_RATE_CAPACITY: int = 60  # Token bucket на IP: запросов подряд и пополнение в секунду
+    API_IP_RATE_PER_SECOND: float = 10.0
+    API_CACHE_TTL: float = 30.0  # Сколько секунд ответ о подписке живёт в кэше (ETag / 304)
+    SUBSCRIPTION_STREAM_TIMEOUT: float = 300.0  # Максимальная длительность SSE-потока, потом клиент переподключается
+
+    # Мониторинг трафика (несколько нод)
+    NODE_NAME: str = "main"
+    NODE_TRAFFIC_LIMIT_GB: float = 1000  # Лимит трафика ноды в месяц
+    TRAFFIC_INTERFACES: str = ""  # Интерфейсы через запятую; пусто — все, кроме lo
+    NODE_REPORT_URL: str = ""  # Куда нода отправляет отчёты, напр. http://127.0.0.1:8080 (webhook-сервер)
+    NODE_REPORT_KEY: str = ""  # Ключ для отчётов нод и сводки по нодам
+
+    # Метрики Prometheus: бот слушает отдельный порт (0 — выключено), webhook-сервер отдаёт /metrics
+    BOT_METRICS_PORT: int = 9101
+    METRICS_ADDR: str = "127.0.0.1"
+    METRICS_KEY: str = ""  # Ключ для /metrics webhook-сервера (X-API-Key или Bearer); пусто — закрыто
+    SLOW_QUERY_MS: float = 200.0  # Запросы к БД дольше — в лог с именем хендлера/маршрута
+    QUERY_COUNT_WARN: int = 30  # Столько запросов на один апдейт/HTTP-запрос — warning (N+1)
+
+    # Кэш профилей пользователей (in-process)
+    USER_CACHE_SIZE: int = 10000
+
+    @cached_property
+    def admin_ids(self) -> FrozenSet[int]:
+        """Множество ID админов (парсится один раз)"""
+        return frozenset(int(id.strip()) for id in self.ADMIN_IDS.split(",") if id.strip())
 
     @property
     def admin_ids_list(self) -> List[int]:
-        return [int(id.strip()) for id in self.ADMIN_IDS.split(",")]
+        return sorted(self.admin_ids)
+
+    @cached_property
+    def flutter_api_keys(self) -> FrozenSet[str]:
+        """Все действующие ключи Flutter API"""
+        keys = [self.FLUTTER_API_KEY, *self.FLUTTER_API_KEYS.split(",")]
+        return frozenset(key.strip() for key in keys if key.strip())
+
+    @cached_property
+    def traffic_interfaces(self) -> FrozenSet[str]:
+        """Интерфейсы для учёта трафика (пусто — все, кроме lo)"""
+        return frozenset(name.strip() for name in self.TRAFFIC_INTERFACES.split(",") if name.strip())
 
 
 settings = Settings()
@@ -1,6 +1,7 @@
 from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession, async_sessionmaker
 from config import settings
 from .models import Base
+from services.metrics import instrument_engine
 from loguru import logger
 
 
@@ -10,6 +11,9 @@ engine = create_async_engine(
     connect_args={"check_same_thread": False} if settings.DATABASE_URL.startswith("sqlite") else {},
 )
 
+# Длительность запросов — в метрики
+instrument_engine(engine)
+
 AsyncSessionLocal = async_sessionmaker(
     engine,
     class_=AsyncSession,
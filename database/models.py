@@ -1,5 +1,5 @@
 from datetime import datetime
-from sqlalchemy import BigInteger, String, Integer, DateTime, Boolean, Float, Enum as SQLEnum
+from sqlalchemy import BigInteger, String, Integer, DateTime, Boolean, Float, Text, Enum as SQLEnum, UniqueConstraint, Index
 from sqlalchemy.orm import DeclarativeBase, Mapped, mapped_column
 from enum import Enum
 
@@ -46,6 +46,13 @@ class User(Base):
     last_activity: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
 
 
+# Последние приглашённые реферера (экран реферальной программы)
+Index("ix_users_referrer_created", User.referrer_id, User.created_at.desc())
+# Топ рефереров (лидерборд)
+Index("ix_users_total_referrals", User.total_referrals.desc())
+Index("ix_users_total_earned", User.total_earned.desc())
+
+
 class Subscription(Base):
     __tablename__ = "subscriptions"
 
@@ -56,6 +63,11 @@ class Subscription(Base):
     # Marzban (VLESS + Reality)
     marzban_username: Mapped[str] = mapped_column(String(255), unique=True, index=True)
     subscription_url: Mapped[str] = mapped_column(String(500))
+    node: Mapped[str | None] = mapped_column(String(100), nullable=True, index=True)  # Нода Marzban (NULL — по умолчанию)
+
+    # Shadowsocks (ss-manager): выделенный порт, NULL — порт не выдан или освобождён
+    ss_port: Mapped[int | None] = mapped_column(Integer, unique=True, index=True, nullable=True)
+    ss_password: Mapped[str | None] = mapped_column(String(255), nullable=True)
 
     # Subscription details
     plan_type: Mapped[str] = mapped_column(String(50))  # trial, day, week, month, year
@@ -113,6 +125,10 @@ class Promocode(Base):
 
 class PromocodeUsage(Base):
     __tablename__ = "promocode_usages"
+    __table_args__ = (
+        # Один промокод — одно использование на пользователя
+        UniqueConstraint("promocode_id", "telegram_id", name="uq_promocode_usage_user"),
+    )
 
     id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
     promocode_id: Mapped[int] = mapped_column(Integer, index=True)
@@ -125,6 +141,10 @@ class PromocodeUsage(Base):
 
 class ReferralTransaction(Base):
     __tablename__ = "referral_transactions"
+    __table_args__ = (
+        # Журнал начислений: не больше одного бонуса с платежа
+        UniqueConstraint("payment_id", name="uq_referral_transaction_payment"),
+    )
 
     id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
     referrer_telegram_id: Mapped[int] = mapped_column(BigInteger, index=True)  # Who gets the bonus
@@ -135,3 +155,37 @@ class ReferralTransaction(Base):
     percentage: Mapped[float] = mapped_column(Float)  # Percentage of payment (e.g., 30.0 for 30%)
 
     created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
+
+
+class ReferralTreeEdge(Base):
+    """Дерево рефералов (closure table): связь предок -> потомок на любой глубине"""
+    __tablename__ = "referral_tree"
+    __table_args__ = (
+        # Размер сети по уровням: WHERE ancestor_id = ? AND depth <= ?
+        Index("ix_referral_tree_ancestor_depth", "ancestor_id", "depth"),
+    )
+
+    ancestor_id: Mapped[int] = mapped_column(BigInteger, primary_key=True)
+    descendant_id: Mapped[int] = mapped_column(BigInteger, primary_key=True, index=True)
+    depth: Mapped[int] = mapped_column(Integer)  # 1 — прямой реферал
+
+
+class NodeTraffic(Base):
+    """Трафик ноды за месяц (последний отчёт monitor_traffic с ноды)"""
+    __tablename__ = "node_traffic"
+    __table_args__ = (
+        UniqueConstraint("node", "month", name="uq_node_traffic_month"),
+    )
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
+    node: Mapped[str] = mapped_column(String(100), index=True)
+    month: Mapped[str] = mapped_column(String(7))  # YYYY-MM
+
+    rx_bytes: Mapped[int] = mapped_column(BigInteger, default=0)
+    tx_bytes: Mapped[int] = mapped_column(BigInteger, default=0)
+    rx_rate: Mapped[float] = mapped_column(Float, default=0.0)  # Текущая скорость, байт/с
+    tx_rate: Mapped[float] = mapped_column(Float, default=0.0)
+    limit_gb: Mapped[float] = mapped_column(Float)
+    interfaces: Mapped[str | None] = mapped_column(Text, nullable=True)  # JSON: {интерфейс: [rx_rate, tx_rate]}
+
+    updated_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
@@ -8,6 +8,10 @@ from loguru import logger
 from config import settings
 from database.database import init_db
 from bot.handlers import start, subscription, payment, admin, referral
+from bot.middlewares import MetricsMiddleware, ThrottlingMiddleware
+from bot.keyboards.inline import warm_up_keyboards
+from services.rate_limiter import create_rate_limit_storage
+from services.metrics import start_metrics_server
 
 # Настройка логирования
 logger.add(
@@ -26,6 +30,12 @@ async def main():
     logger.info("Initializing database...")
     await init_db()
 
+    # Метрики Prometheus на отдельном порту
+    start_metrics_server(settings.BOT_METRICS_PORT, settings.METRICS_ADDR)
+
+    # Статические клавиатуры собираем один раз
+    warm_up_keyboards()
+
     # Создание бота и диспетчера
     bot = Bot(
         token=settings.BOT_TOKEN,
@@ -34,6 +44,14 @@ async def main():
     storage = MemoryStorage()
     dp = Dispatcher(storage=storage)
 
+    # Ограничение частоты тяжёлых callback-кнопок
+    throttle_storage = create_rate_limit_storage(settings.THROTTLE_STORAGE, settings.REDIS_URL)
+    dp.callback_query.middleware(ThrottlingMiddleware(throttle_storage))
+
+    # Время и ошибки хендлеров
+    dp.message.middleware(MetricsMiddleware("message"))
+    dp.callback_query.middleware(MetricsMiddleware("callback_query"))
+
     # Регистрация роутеров
     dp.include_router(start.router)
     dp.include_router(subscription.router)
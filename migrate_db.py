@@ -5,6 +5,7 @@
 import asyncio
 import sqlite3
 from database.database import init_db
+from services.referral_service import ReferralService
 from loguru import logger
 
 
@@ -41,12 +42,99 @@ async def migrate():
                 except sqlite3.OperationalError as e:
                     logger.warning(f"Column '{column}' may already exist: {e}")
 
+        # Новые столбцы в таблице subscriptions
+        cursor.execute("PRAGMA table_info(subscriptions)")
+        existing_columns = {row[1] for row in cursor.fetchall()}
+
+        new_subscription_columns = {
+            "ss_port": "INTEGER",
+            "ss_password": "VARCHAR(255)",
+            "node": "VARCHAR(100)",
+        }
+
+        for column, column_type in new_subscription_columns.items():
+            if existing_columns and column not in existing_columns:
+                try:
+                    cursor.execute(f"ALTER TABLE subscriptions ADD COLUMN {column} {column_type}")
+                    logger.info(f"Added column '{column}' to subscriptions table")
+                except sqlite3.OperationalError as e:
+                    logger.warning(f"Column '{column}' may already exist: {e}")
+
         conn.commit()
 
         # Создаем новые таблицы через init_db()
         logger.info("Creating new tables...")
         await init_db()
 
+        # Индексы и ограничения для уже существующих таблиц
+        # (create_all не добавляет их к таблицам, созданным раньше)
+        post_statements = {
+            "uq_promocode_usage_user": (
+                "CREATE UNIQUE INDEX IF NOT EXISTS uq_promocode_usage_user "
+                "ON promocode_usages (promocode_id, telegram_id)"
+            ),
+            "ix_subscriptions_ss_port": (
+                "CREATE UNIQUE INDEX IF NOT EXISTS ix_subscriptions_ss_port ON subscriptions (ss_port)"
+            ),
+            "ix_subscriptions_node": (
+                "CREATE INDEX IF NOT EXISTS ix_subscriptions_node ON subscriptions (node)"
+            ),
+            "uq_referral_transaction_payment": (
+                "CREATE UNIQUE INDEX IF NOT EXISTS uq_referral_transaction_payment "
+                "ON referral_transactions (payment_id)"
+            ),
+            "ix_users_referrer_created": (
+                "CREATE INDEX IF NOT EXISTS ix_users_referrer_created "
+                "ON users (referrer_id, created_at DESC)"
+            ),
+            "ix_users_total_referrals": (
+                "CREATE INDEX IF NOT EXISTS ix_users_total_referrals ON users (total_referrals DESC)"
+            ),
+            "ix_users_total_earned": (
+                "CREATE INDEX IF NOT EXISTS ix_users_total_earned ON users (total_earned DESC)"
+            ),
+            # Счётчики рефералов дальше поддерживаются инкрементально — выравниваем их один раз
+            "backfill_total_referrals": (
+                "UPDATE users SET total_referrals = "
+                "(SELECT COUNT(*) FROM users AS r WHERE r.referrer_id = users.telegram_id)"
+            ),
+            "backfill_total_earned": (
+                "UPDATE users SET total_earned = COALESCE("
+                "(SELECT SUM(t.amount) FROM referral_transactions AS t "
+                "WHERE t.referrer_telegram_id = users.telegram_id), 0)"
+            ),
+            # Дерево рефералов по существующим связям (таблицу создал init_db);
+            # глубина ограничена на случай циклов в старых данных
+            "backfill_referral_tree": (
+                "INSERT OR IGNORE INTO referral_tree (ancestor_id, descendant_id, depth) "
+                "WITH RECURSIVE tree(ancestor_id, descendant_id, depth) AS ("
+                "SELECT referrer_id, telegram_id, 1 FROM users WHERE referrer_id IS NOT NULL "
+                "UNION ALL "
+                "SELECT u.referrer_id, tree.descendant_id, tree.depth + 1 FROM tree "
+                "JOIN users AS u ON u.telegram_id = tree.ancestor_id "
+                "WHERE u.referrer_id IS NOT NULL AND tree.depth < 64"
+                ") SELECT ancestor_id, descendant_id, MIN(depth) FROM tree WHERE ancestor_id != descendant_id "
+                "GROUP BY ancestor_id, descendant_id"
+            ),
+        }
+
+        # Реферальные коды вычисляются из telegram_id — проставляем всем, у кого их нет
+        conn.create_function("make_referral_code", 1, ReferralService.generate_referral_code, deterministic=True)
+        post_statements["backfill_referral_codes"] = (
+            "UPDATE users SET referral_code = make_referral_code(telegram_id) WHERE referral_code IS NULL"
+        )
+
+        for name, statement in post_statements.items():
+            try:
+                cursor.execute(statement)
+                logger.info(f"Applied '{name}'")
+            except sqlite3.IntegrityError as e:
+                logger.warning(f"Can't apply '{name}', duplicate rows in existing data: {e}")
+            except sqlite3.OperationalError as e:
+                logger.warning(f"Can't apply '{name}': {e}")
+
+        conn.commit()
+
         logger.success("✅ Database migration completed successfully!")
 
         conn.close()
@@ -2,56 +2,103 @@
 """
 Скрипт мониторинга трафика VPS сервера
 Отправляет уведомление админу при достижении 50% лимита (500 GB из 1 TB)
+
+Режимы:
+    python monitor_traffic.py           — разовая проверка (cron)
+    python monitor_traffic.py --daemon  — постоянный замер /proc/net/dev со счётчиками за месяц
 """
+import argparse
 import asyncio
+import os
 import sys
+import time
+from collections import deque
+from dataclasses import dataclass
+from datetime import datetime
 from pathlib import Path
 
 # Добавляем путь к проекту
 sys.path.append(str(Path(__file__).parent))
 
+import httpx
 from aiogram import Bot
 from config import settings
 from loguru import logger
 import json
 import subprocess
 
-# Лимит трафика в GB
-TRAFFIC_LIMIT_GB = 1000  # 1 TB
+# Лимит трафика ноды в GB
+TRAFFIC_LIMIT_GB = settings.NODE_TRAFFIC_LIMIT_GB  # по умолчанию 1 TB
 WARNING_THRESHOLD = 0.5  # 50%
 WARNING_THRESHOLD_GB = TRAFFIC_LIMIT_GB * WARNING_THRESHOLD
 
 # Файл для хранения состояния уведомлений
 STATE_FILE = "/var/lib/freedomvpn/traffic_alert_state.json"
 
+# Демон: счётчики за месяц и текущая скорость (читается и разовой проверкой)
+COUNTERS_FILE = "/var/lib/freedomvpn/traffic_counters.json"
+PROC_NET_DEV = "/proc/net/dev"
+BOOT_ID_FILE = "/proc/sys/kernel/random/boot_id"
 
-def get_network_traffic() -> dict:
+SAMPLE_INTERVAL = 5.0  # Секунд между замерами
+RING_BUFFER_SIZE = 720  # Замеров в памяти (час при интервале 5 с)
+PERSIST_INTERVAL = 60.0  # Как часто сохранять счётчики на диск
+CHECK_INTERVAL = 600.0  # Как часто проверять пороги уведомлений
+DAEMON_STALE_AFTER = 300.0  # Счётчики демона старше — не используем
+
+# Прогноз исчерпания лимита
+HISTORY_STEP = 3600.0  # Не чаще одной точки истории в час
+FORECAST_MIN_SPAN = 6 * 3600.0  # Прогнозируем, когда история покрывает хотя бы 6 часов
+FORECAST_ALPHA = 0.3  # Вес последнего интервала в EWMA скорости
+
+
+def read_interface_counters(
+    path: str = PROC_NET_DEV, interfaces: frozenset[str] | None = None
+) -> dict[str, tuple[int, int]]:
     """
-    Получить статистику сетевого трафика за текущий месяц
-    Использует /proc/net/dev для подсчета трафика
+    Накопленные с загрузки счётчики {интерфейс: (rx_bytes, tx_bytes)} без loopback.
+    interfaces — учитывать только эти интерфейсы (по умолчанию TRAFFIC_INTERFACES из настроек).
     """
-    try:
-        # Читаем статистику из /proc/net/dev
-        with open('/proc/net/dev', 'r') as f:
-            lines = f.readlines()
+    if interfaces is None:
+        interfaces = settings.traffic_interfaces
+
+    with open(path, 'r') as f:
+        lines = f.readlines()
 
-        total_rx_bytes = 0
-        total_tx_bytes = 0
+    counters = {}
+    # Пропускаем первые 2 строки (заголовки)
+    for line in lines[2:]:
+        interface, _, data = line.partition(':')
+        interface = interface.strip()
 
-        # Пропускаем первые 2 строки (заголовки)
-        for line in lines[2:]:
-            parts = line.split()
-            interface = parts[0].rstrip(':')
+        # Игнорируем loopback интерфейс и не выбранные в настройках
+        if interface == 'lo' or (interfaces and interface not in interfaces):
+            continue
 
-            # Игнорируем loopback интерфейс
-            if interface == 'lo':
-                continue
+        parts = data.split()
+        counters[interface] = (int(parts[0]), int(parts[8]))  # Received / Transmitted bytes
 
-            rx_bytes = int(parts[1])  # Received bytes
-            tx_bytes = int(parts[9])  # Transmitted bytes
+    return counters
 
-            total_rx_bytes += rx_bytes
-            total_tx_bytes += tx_bytes
+
+def read_boot_id() -> str | None:
+    """Идентификатор текущей загрузки — чтобы отличить перезагрузку от сброса счётчика"""
+    try:
+        with open(BOOT_ID_FILE, 'r') as f:
+            return f.read().strip()
+    except OSError:
+        return None
+
+
+def get_network_traffic() -> dict:
+    """
+    Получить статистику сетевого трафика (накопленную с момента загрузки)
+    Использует /proc/net/dev для подсчета трафика
+    """
+    try:
+        counters = read_interface_counters()
+        total_rx_bytes = sum(rx for rx, _ in counters.values())
+        total_tx_bytes = sum(tx for _, tx in counters.values())
 
         # Конвертируем в GB
         total_rx_gb = total_rx_bytes / (1024 ** 3)
@@ -115,17 +162,300 @@ def get_vnstat_traffic() -> dict:
     return traffic
 
 
+@dataclass(frozen=True, slots=True)
+class TrafficSample:
+    """Один замер демона: скорость за интервал, байт/с"""
+    timestamp: float
+    rx_rate: float
+    tx_rate: float
+    interfaces: dict[str, tuple[float, float]]
+
+
+class TrafficMonitor:
+    """
+    Постоянный замер трафика по /proc/net/dev.
+
+    Счётчики ядра накопительные с момента загрузки, поэтому за месяц суммируются
+    приращения между замерами. Перезагрузка (сменился boot_id) или сброс счётчика
+    интерфейса (значение уменьшилось) — приращением считается само текущее значение.
+    Последние замеры скорости хранятся в кольцевом буфере фиксированного размера.
+    """
+
+    def __init__(
+        self,
+        proc_path: str = PROC_NET_DEV,
+        counters_file: str = COUNTERS_FILE,
+        buffer_size: int = RING_BUFFER_SIZE,
+        interfaces: frozenset[str] | None = None,
+    ):
+        self.proc_path = proc_path
+        self.interfaces = interfaces
+        self.counters_file = counters_file
+        self.samples: deque[TrafficSample] = deque(maxlen=buffer_size)
+
+        self.month = datetime.now().strftime("%Y-%m")
+        self.rx_bytes = 0
+        self.tx_bytes = 0
+
+        self.boot_id = read_boot_id()
+        self._last_raw: dict[str, tuple[int, int]] = {}
+        self._last_time: float | None = None
+        self._rebooted = False
+
+        self.load()
+
+    def load(self):
+        """Восстановить счётчики месяца после перезапуска демона"""
+        try:
+            with open(self.counters_file, 'r') as f:
+                state = json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return
+
+        self.month = state.get("month", self.month)
+        self.rx_bytes = state.get("rx_bytes", 0)
+        self.tx_bytes = state.get("tx_bytes", 0)
+
+        if state.get("boot_id") == self.boot_id:
+            self._last_raw = {name: tuple(raw) for name, raw in state.get("last_raw", {}).items()}
+        else:
+            # Была перезагрузка: всё, что накопили счётчики ядра, пришло уже после неё
+            self._rebooted = True
+
+    def save(self):
+        """Сохранить счётчики (атомарно, через временный файл)"""
+        throughput = self.current_throughput()
+        state = {
+            "month": self.month,
+            "rx_bytes": self.rx_bytes,
+            "tx_bytes": self.tx_bytes,
+            "boot_id": self.boot_id,
+            "last_raw": self._last_raw,
+            "rx_rate": throughput["rx_rate"],
+            "tx_rate": throughput["tx_rate"],
+            "updated_at": time.time(),
+        }
+        Path(self.counters_file).parent.mkdir(parents=True, exist_ok=True)
+        tmp_file = f"{self.counters_file}.tmp"
+        with open(tmp_file, 'w') as f:
+            json.dump(state, f)
+        os.replace(tmp_file, self.counters_file)
+
+    def sample(self, now: float | None = None, today: datetime | None = None) -> TrafficSample | None:
+        """Снять замер. Возвращает скорость за интервал (None для самого первого замера)"""
+        now = time.monotonic() if now is None else now
+        month = (today or datetime.now()).strftime("%Y-%m")
+        raw = read_interface_counters(self.proc_path, self.interfaces)
+
+        if month != self.month:
+            logger.info(f"Traffic month rollover: {self.month} -> {month}")
+            self.month = month
+            self.rx_bytes = 0
+            self.tx_bytes = 0
+
+        deltas = {}
+        for interface, (rx, tx) in raw.items():
+            previous = self._last_raw.get(interface)
+            if previous is None:
+                # После перезагрузки счётчик начался с нуля; новый интерфейс — считаем с текущего
+                previous = (0, 0) if self._rebooted else (rx, tx)
+            prev_rx, prev_tx = previous
+            # Счётчик уменьшился — сброс интерфейса, приращение равно текущему значению
+            delta_rx = rx - prev_rx if rx >= prev_rx else rx
+            delta_tx = tx - prev_tx if tx >= prev_tx else tx
+            deltas[interface] = (delta_rx, delta_tx)
+            self.rx_bytes += delta_rx
+            self.tx_bytes += delta_tx
+
+        self._rebooted = False
+        self._last_raw = raw
+
+        last_time, self._last_time = self._last_time, now
+        if last_time is None or now <= last_time:
+            return None
+
+        elapsed = now - last_time
+        interfaces = {name: (rx / elapsed, tx / elapsed) for name, (rx, tx) in deltas.items()}
+        sample = TrafficSample(
+            timestamp=time.time(),
+            rx_rate=sum(rx for rx, _ in interfaces.values()),
+            tx_rate=sum(tx for _, tx in interfaces.values()),
+            interfaces=interfaces,
+        )
+        self.samples.append(sample)
+        return sample
+
+    def current_throughput(self) -> dict:
+        """Текущая скорость, байт/с (по последнему замеру)"""
+        if not self.samples:
+            return {"rx_rate": 0.0, "tx_rate": 0.0, "interfaces": {}}
+        last = self.samples[-1]
+        return {"rx_rate": last.rx_rate, "tx_rate": last.tx_rate, "interfaces": last.interfaces}
+
+    def monthly_traffic(self) -> dict:
+        """Трафик за текущий месяц в формате get_vnstat_traffic"""
+        return _traffic_dict(self.rx_bytes, self.tx_bytes, "daemon")
+
+    def report_payload(self) -> dict:
+        """Отчёт ноды для webhook-сервера"""
+        throughput = self.current_throughput()
+        return {
+            "month": self.month,
+            "rx_bytes": self.rx_bytes,
+            "tx_bytes": self.tx_bytes,
+            "rx_rate": throughput["rx_rate"],
+            "tx_rate": throughput["tx_rate"],
+            "limit_gb": TRAFFIC_LIMIT_GB,
+            "interfaces": throughput["interfaces"],
+        }
+
+    async def report(self):
+        """Отправить отчёт на webhook-сервер (если задан NODE_REPORT_URL)"""
+        if not settings.NODE_REPORT_URL:
+            return
+
+        url = f"{settings.NODE_REPORT_URL.rstrip('/')}/api/nodes/{settings.NODE_NAME}/traffic"
+        try:
+            async with httpx.AsyncClient(timeout=10) as client:
+                response = await client.post(
+                    url, headers={"X-API-Key": settings.NODE_REPORT_KEY}, json=self.report_payload()
+                )
+                response.raise_for_status()
+        except httpx.HTTPError as e:
+            logger.warning(f"Failed to report node traffic: {e}")
+
+    async def run(self, interval: float = SAMPLE_INTERVAL, check_interval: float = CHECK_INTERVAL):
+        """Основной цикл демона"""
+        logger.info(f"Traffic monitor daemon started (interval {interval}s)")
+        last_persist = last_check = time.monotonic()
+
+        try:
+            while True:
+                try:
+                    self.sample()
+                except (OSError, ValueError, IndexError) as e:
+                    logger.error(f"Failed to sample network traffic: {e}")
+
+                now = time.monotonic()
+                if now - last_persist >= PERSIST_INTERVAL:
+                    self.save()
+                    await self.report()
+                    last_persist = now
+                if now - last_check >= check_interval:
+                    await check_traffic(self.monthly_traffic())
+                    last_check = now
+
+                await asyncio.sleep(interval)
+        finally:
+            self.save()
+
+
+def _traffic_dict(rx_bytes: int, tx_bytes: int, method: str) -> dict:
+    rx_gb = rx_bytes / (1024 ** 3)
+    tx_gb = tx_bytes / (1024 ** 3)
+    return {
+        "rx_gb": round(rx_gb, 2),
+        "tx_gb": round(tx_gb, 2),
+        "total_gb": round(rx_gb + tx_gb, 2),
+        "method": method,
+    }
+
+
+def get_daemon_traffic() -> dict | None:
+    """Трафик за месяц из счётчиков демона, если он запущен и данные свежие"""
+    try:
+        with open(COUNTERS_FILE, 'r') as f:
+            state = json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return None
+
+    if (
+        state.get("month") != datetime.now().strftime("%Y-%m")
+        or time.time() - state.get("updated_at", 0) > DAEMON_STALE_AFTER
+    ):
+        return None
+    return _traffic_dict(state.get("rx_bytes", 0), state.get("tx_bytes", 0), "daemon")
+
+
+@dataclass(frozen=True, slots=True)
+class TrafficForecast:
+    """Прогноз расхода трафика до конца месяца"""
+    rate_gb_per_day: float
+    projected_total_gb: float  # Ожидаемый расход к концу месяца
+    exhaustion_at: datetime | None  # Когда будет исчерпан лимит (None — не в этом месяце)
+
+
+def month_end(now: datetime) -> datetime:
+    """Начало следующего месяца"""
+    if now.month == 12:
+        return datetime(now.year + 1, 1, 1)
+    return datetime(now.year, now.month + 1, 1)
+
+
+def forecast_usage(
+    history: list[list[float]],
+    limit_gb: float,
+    now: datetime,
+    alpha: float = FORECAST_ALPHA,
+) -> TrafficForecast | None:
+    """
+    Спрогнозировать расход до конца месяца по истории [[unix_time, total_gb], ...].
+
+    Скорость — EWMA по интервалам между точками (свежие интервалы весят больше),
+    дальше линейная экстраполяция от последней точки. Интервалы, где расход
+    уменьшился (сменился источник данных), пропускаются.
+    None — истории пока недостаточно.
+    """
+    if len(history) < 2 or history[-1][0] - history[0][0] < FORECAST_MIN_SPAN:
+        return None
+
+    rate = None  # GB/сек
+    for (prev_time, prev_gb), (cur_time, cur_gb) in zip(history, history[1:]):
+        if cur_time <= prev_time or cur_gb < prev_gb:
+            continue
+        interval_rate = (cur_gb - prev_gb) / (cur_time - prev_time)
+        rate = interval_rate if rate is None else alpha * interval_rate + (1 - alpha) * rate
+
+    if rate is None:
+        return None
+
+    last_time, last_gb = history[-1]
+    seconds_left = max(0.0, (month_end(now) - now).total_seconds())
+    projected = last_gb + rate * seconds_left
+
+    exhaustion_at = None
+    if last_gb >= limit_gb:
+        exhaustion_at = now
+    elif rate > 0 and projected >= limit_gb:
+        exhaustion_at = datetime.fromtimestamp(last_time + (limit_gb - last_gb) / rate)
+
+    return TrafficForecast(
+        rate_gb_per_day=rate * 86400,
+        projected_total_gb=projected,
+        exhaustion_at=exhaustion_at,
+    )
+
+
 def load_alert_state() -> dict:
-    """Загрузить состояние уведомлений"""
+    """Загрузить состояние уведомлений (флаги сбрасываются в начале месяца)"""
+    month = datetime.now().strftime("%Y-%m")
     try:
         with open(STATE_FILE, 'r') as f:
-            return json.load(f)
+            state = json.load(f)
+        if state.get("month") == month:
+            return state
+        logger.info(f"Traffic alert state rolled over to {month}")
     except (FileNotFoundError, json.JSONDecodeError):
-        return {
-            "50_percent_sent": False,
-            "75_percent_sent": False,
-            "90_percent_sent": False
-        }
+        pass
+
+    return {
+        "month": month,
+        "50_percent_sent": False,
+        "75_percent_sent": False,
+        "90_percent_sent": False,
+        "forecast_sent": False,
+        "history": [],
+    }
 
 
 def save_alert_state(state: dict):
@@ -138,6 +468,7 @@ def save_alert_state(state: dict):
 async def send_admin_notification(message: str):
     """Отправить уведомление всем админам"""
     bot = Bot(token=settings.BOT_TOKEN)
+    message = f"🖥 Нода: <b>{settings.NODE_NAME}</b>\n" + message
 
     try:
         for admin_id in settings.admin_ids_list:
@@ -153,9 +484,10 @@ async def send_admin_notification(message: str):
         await bot.session.close()
 
 
-async def check_traffic():
+async def check_traffic(traffic: dict | None = None):
     """Проверить использование трафика и отправить уведомление при необходимости"""
-    traffic = get_vnstat_traffic()
+    # Счётчики демона (без запуска vnstat), иначе vnstat / /proc/net/dev
+    traffic = traffic or get_daemon_traffic() or get_vnstat_traffic()
     total_gb = traffic['total_gb']
     rx_gb = traffic['rx_gb']
     tx_gb = traffic['tx_gb']
@@ -172,6 +504,38 @@ async def check_traffic():
     # Проверяем пороги и отправляем уведомления
     notification_sent = False
 
+    # История расхода за месяц для прогноза
+    now = datetime.now()
+    history = state.setdefault("history", [])
+    history_updated = False
+    if not history or now.timestamp() - history[-1][0] >= HISTORY_STEP:
+        history.append([now.timestamp(), total_gb])
+        history_updated = True
+
+    forecast = forecast_usage(history, TRAFFIC_LIMIT_GB, now)
+    if forecast:
+        logger.info(
+            f"Traffic forecast: {forecast.rate_gb_per_day:.1f} GB/day, "
+            f"{forecast.projected_total_gb:.0f} GB by month end"
+        )
+
+    if forecast and forecast.exhaustion_at and usage_percent < 90 and not state.get("forecast_sent"):
+        days_left = (forecast.exhaustion_at - now).total_seconds() / 86400
+        message = f"""
+📈 <b>ПРОГНОЗ: Лимит трафика закончится до конца месяца</b>
+
+📊 Использовано: <b>{total_gb} GB</b> из {TRAFFIC_LIMIT_GB} GB ({usage_percent:.1f}%)
+🚀 Средний расход: {forecast.rate_gb_per_day:.1f} GB/день
+🔮 Прогноз на конец месяца: <b>{forecast.projected_total_gb:.0f} GB</b>
+
+⏳ Лимит будет исчерпан примерно <b>{forecast.exhaustion_at.strftime('%d.%m.%Y %H:%M')}</b> (через {days_left:.1f} дн.)
+
+Есть время принять меры заранее.
+"""
+        await send_admin_notification(message)
+        state["forecast_sent"] = True
+        notification_sent = True
+
     if usage_percent >= 90 and not state.get("90_percent_sent"):
         message = f"""
 🚨 <b>КРИТИЧЕСКОЕ ПРЕДУПРЕЖДЕНИЕ: Трафик почти исчерпан!</b>
@@ -222,11 +586,22 @@ async def check_traffic():
 
     if notification_sent:
         save_alert_state(state)
-        logger.info(f"Alert sent and state saved: {state}")
+        logger.info(f"Alert sent and state saved: { {k: v for k, v in state.items() if k != 'history'} }")
+    elif history_updated:
+        save_alert_state(state)
 
 
 async def main():
     """Главная функция"""
+    parser = argparse.ArgumentParser(description="Мониторинг трафика VPS")
+    parser.add_argument("--daemon", action="store_true", help="Постоянный замер трафика")
+    parser.add_argument("--interval", type=float, default=SAMPLE_INTERVAL, help="Интервал замеров, сек")
+    args = parser.parse_args()
+
+    if args.daemon:
+        await TrafficMonitor().run(interval=args.interval)
+        return
+
     logger.info("Starting traffic monitoring check...")
     await check_traffic()
     logger.info("Traffic monitoring check completed")
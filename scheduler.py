@@ -7,6 +7,7 @@ from loguru import logger
 
 from database.database import AsyncSessionLocal
 from services.subscription_service import SubscriptionService
+from services.metrics import observe_job
 
 
 async def check_expired_subscriptions_task():
@@ -17,8 +18,9 @@ async def check_expired_subscriptions_task():
 
     async with AsyncSessionLocal() as session:
         try:
-            await subscription_service.check_expired_subscriptions(session)
-            await session.commit()
+            with observe_job("check_expired_subscriptions"):
+                await subscription_service.check_expired_subscriptions(session)
+                await session.commit()
             logger.info("Expired subscriptions check completed")
         except Exception as e:
             logger.error(f"Failed to check expired subscriptions: {e}")
@@ -0,0 +1,144 @@
+"""
+Аутентификация API webhook-сервера (Flutter-приложение, ноды) и rate limiting
+
+Ключ передаётся в заголовке X-API-Key (query-параметр api_key — только для старых
+клиентов, пока включён API_ALLOW_QUERY_KEY). Ключи сравниваются за постоянное время.
+Запросы ограничиваются token bucket'ами по IP (до проверки ключа — против перебора)
+и по ключу — через то же хранилище, что и throttling бота (memory или Redis).
+"""
+import hashlib
+import hmac
+import math
+from dataclasses import dataclass
+from typing import Callable, Iterable
+
+from fastapi import HTTPException, Request
+from loguru import logger
+
+from config import settings
+from services.rate_limiter import create_rate_limit_storage
+
+API_KEY_HEADER = "X-API-Key"
+
+
+@dataclass(frozen=True)
+class RateLimit:
+    """Параметры token bucket: capacity запросов подряд, refill_rate запросов в секунду"""
+    capacity: int
+    refill_rate: float
+
+    @property
+    def retry_after(self) -> int:
+        return max(1, math.ceil(1 / self.refill_rate)) if self.refill_rate > 0 else 60
+
+
+class APIKeyAuth:
+    """FastAPI-зависимость: проверка ключа + лимиты по IP и по ключу"""
+
+    def __init__(
+        self,
+        name: str,
+        keys: Callable[[], Iterable[str]],
+        storage,
+        key_limit: RateLimit | None = None,
+        ip_limit: RateLimit | None = None,
+        allow_query_key: bool = False,
+        allow_bearer: bool = False,
+    ):
+        self.name = name
+        self.keys = keys
+        self.storage = storage
+        self.key_limit = key_limit
+        self.ip_limit = ip_limit
+        self.allow_query_key = allow_query_key
+        self.allow_bearer = allow_bearer
+
+    @staticmethod
+    def key_id(key: str) -> str:
+        """Идентификатор ключа для лимитов и логов (сам ключ никуда не пишем)"""
+        return hashlib.sha256(key.encode()).hexdigest()[:16]
+
+    def match(self, key: str | None) -> bool:
+        """Сравнить ключ со всеми допустимыми за постоянное время"""
+        if not key:
+            return False
+        candidate = key.encode()
+        matched = False
+        for valid in self.keys():
+            if valid and hmac.compare_digest(valid.encode(), candidate):
+                matched = True
+        return matched
+
+    async def _check_limit(self, bucket: str, limit: RateLimit | None):
+        if limit is None:
+            return
+        try:
+            allowed = await self.storage.consume(f"api:{self.name}:{bucket}", limit.capacity, limit.refill_rate)
+        except Exception as e:
+            # Хранилище лимитов недоступно — не роняем API
+            logger.warning(f"Rate limit storage error: {e}")
+            return
+        if not allowed:
+            raise HTTPException(
+                status_code=429,
+                detail="Too many requests",
+                headers={"Retry-After": str(limit.retry_after)},
+            )
+
+    async def __call__(self, request: Request) -> str:
+        ip = request.client.host if request.client else "unknown"
+        await self._check_limit(f"ip:{ip}", self.ip_limit)
+
+        key = request.headers.get(API_KEY_HEADER)
+        if key is None and self.allow_bearer:
+            # Authorization: Bearer <key> — так ключ передаёт Prometheus (authorization в scrape_config)
+            scheme, _, token = request.headers.get("authorization", "").partition(" ")
+            if scheme.lower() == "bearer" and token:
+                key = token.strip()
+        if key is None and self.allow_query_key:
+            key = request.query_params.get("api_key")
+        if not self.match(key):
+            raise HTTPException(status_code=403, detail="Invalid or missing API key")
+
+        key_id = self.key_id(key)
+        await self._check_limit(f"key:{key_id}", self.key_limit)
+        return key_id
+
+
+api_rate_limit_storage = create_rate_limit_storage(settings.THROTTLE_STORAGE, settings.REDIS_URL)
+
+# Flutter-приложение и поддержка
+flutter_auth = APIKeyAuth(
+    "flutter",
+    keys=lambda: settings.flutter_api_keys,
+    storage=api_rate_limit_storage,
+    key_limit=RateLimit(settings.API_KEY_RATE_CAPACITY, settings.API_KEY_RATE_PER_SECOND),
+    ip_limit=RateLimit(settings.API_IP_RATE_CAPACITY, settings.API_IP_RATE_PER_SECOND),
+    allow_query_key=settings.API_ALLOW_QUERY_KEY,
+)
+
+# Админские эндпоинты с персональными данными (ключ приложения сюда не подходит)
+admin_auth = APIKeyAuth(
+    "admin",
+    keys=lambda: (settings.ADMIN_API_KEY,),
+    storage=api_rate_limit_storage,
+    ip_limit=RateLimit(settings.API_IP_RATE_CAPACITY, settings.API_IP_RATE_PER_SECOND),
+)
+
+# /metrics webhook-сервера; пусто METRICS_KEY — метрики закрыты
+metrics_auth = APIKeyAuth(
+    "metrics",
+    keys=lambda: (settings.METRICS_KEY,),
+    storage=api_rate_limit_storage,
+    ip_limit=RateLimit(settings.API_IP_RATE_CAPACITY, settings.API_IP_RATE_PER_SECOND),
+    allow_bearer=True,
+)
+
+# Отчёты monitor_traffic с нод и сводка по нодам
+node_auth = APIKeyAuth(
+    "nodes",
+    keys=lambda: (settings.NODE_REPORT_KEY,),
+    storage=api_rate_limit_storage,
+    ip_limit=RateLimit(settings.API_IP_RATE_CAPACITY, settings.API_IP_RATE_PER_SECOND),
+    allow_query_key=settings.API_ALLOW_QUERY_KEY,
+)
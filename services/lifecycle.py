@@ -0,0 +1,82 @@
+"""
+Жизненный цикл воркера webhook-сервера: остановка по SIGTERM и дренаж запросов
+
+uvicorn при SIGTERM перестаёт принимать соединения и ждёт завершения текущих
+запросов (не дольше WEBHOOK_GRACEFUL_TIMEOUT). Здесь — то, чего он не знает:
+длинные SSE-потоки сразу получают сигнал закрыться, /health отвечает 503,
+а webhook'и ЮKassa, которые ещё обрабатываются, дорабатывают до конца.
+"""
+import asyncio
+import signal
+from contextlib import asynccontextmanager
+
+from loguru import logger
+
+
+class WorkerLifecycle:
+    """Флаг остановки и счётчик незавершённых webhook'ов одного воркера"""
+
+    SIGNALS = (signal.SIGTERM, signal.SIGINT)
+
+    def __init__(self):
+        self.draining = asyncio.Event()
+        self.in_flight = 0
+        self._idle = asyncio.Event()
+        self._idle.set()
+        self._previous_handlers: dict = {}
+
+    @asynccontextmanager
+    async def track(self):
+        """Учитывать обработку webhook'а, пока она идёт"""
+        self.in_flight += 1
+        self._idle.clear()
+        try:
+            yield
+        finally:
+            self.in_flight -= 1
+            if self.in_flight == 0:
+                self._idle.set()
+
+    def start_draining(self):
+        if not self.draining.is_set():
+            logger.info(f"Worker is shutting down, {self.in_flight} webhook(s) in flight")
+            self.draining.set()
+
+    def install_signal_handlers(self):
+        """
+        Перехватить SIGTERM/SIGINT поверх обработчиков uvicorn (вызывается при старте приложения).
+        Свой обработчик только выставляет флаг остановки и передаёт сигнал дальше.
+        """
+        loop = asyncio.get_running_loop()
+
+        def handler(sig, frame, previous=None):
+            loop.call_soon_threadsafe(self.start_draining)
+            if callable(previous):
+                previous(sig, frame)
+
+        for sig in self.SIGNALS:
+            try:
+                previous = signal.getsignal(sig)
+                signal.signal(sig, lambda s, f, previous=previous: handler(s, f, previous))
+                self._previous_handlers[sig] = previous
+            except ValueError:
+                # Не главный поток (тесты, встроенный запуск) — остаёмся на обработчиках uvicorn
+                return
+
+    def restore_signal_handlers(self):
+        for sig, previous in self._previous_handlers.items():
+            signal.signal(sig, previous)
+        self._previous_handlers.clear()
+
+    async def wait_idle(self, timeout: float) -> bool:
+        """Дождаться завершения webhook'ов. False — не успели за timeout"""
+        try:
+            await asyncio.wait_for(self._idle.wait(), timeout)
+            return True
+        except asyncio.TimeoutError:
+            logger.warning(f"{self.in_flight} webhook(s) still in flight after {timeout}s")
+            return False
+
+
+# Состояние текущего процесса-воркера
+worker_lifecycle = WorkerLifecycle()
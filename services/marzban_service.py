@@ -2,22 +2,50 @@
 Сервис для работы с Marzban API
 Управление пользователями VLESS + Reality
 """
+import asyncio
 import httpx
+import json
+import re
 import secrets
 import string
+import time
+from dataclasses import dataclass
 from datetime import datetime, timedelta
 from typing import Optional, Dict, Any, List
 from loguru import logger
 from config import settings
+from services.metrics import observe_external
 
 
 class MarzbanService:
     """Сервис для работы с Marzban API"""
 
-    def __init__(self):
-        self.base_url = settings.MARZBAN_API_URL
-        self.username = settings.MARZBAN_USERNAME
-        self.password = settings.MARZBAN_PASSWORD
+    def __init__(
+        self,
+        base_url: Optional[str] = None,
+        username: Optional[str] = None,
+        password: Optional[str] = None,
+        name: Optional[str] = None,
+        host: Optional[str] = None,
+        location: Optional[str] = None,
+        max_users: int = 0,
+        port: int = 443,
+    ):
+        """
+        Args:
+            base_url/username/password: Панель Marzban (по умолчанию из настроек)
+            name: Имя ноды (совпадает с NODE_NAME в monitor_traffic на этой ноде)
+            host/location/port: Адрес, страна и порт VLESS сервера для клиентов
+            max_users: Ёмкость ноды по активным пользователям (0 — без ограничения)
+        """
+        self.base_url = base_url or settings.MARZBAN_API_URL
+        self.username = username or settings.MARZBAN_USERNAME
+        self.password = password or settings.MARZBAN_PASSWORD
+        self.name = name or settings.NODE_NAME
+        self.host = host or settings.VPN_SERVER_HOST
+        self.location = location or settings.SERVER_LOCATION
+        self.max_users = max_users
+        self.port = port
         self._token: Optional[str] = None
         self._token_expires: Optional[datetime] = None
 
@@ -28,17 +56,18 @@ class MarzbanService:
             return self._token
 
         # Получаем новый токен
-        async with httpx.AsyncClient(timeout=30.0) as client:
-            response = await client.post(
-                f"{self.base_url}/api/admin/token",
-                data={
-                    "username": self.username,
-                    "password": self.password
-                },
-                headers={"Content-Type": "application/x-www-form-urlencoded"}
-            )
-            response.raise_for_status()
-            data = response.json()
+        with observe_external("marzban", "POST /api/admin/token", self.name):
+            async with httpx.AsyncClient(timeout=30.0) as client:
+                response = await client.post(
+                    f"{self.base_url}/api/admin/token",
+                    data={
+                        "username": self.username,
+                        "password": self.password
+                    },
+                    headers={"Content-Type": "application/x-www-form-urlencoded"}
+                )
+                response.raise_for_status()
+                data = response.json()
 
             self._token = data["access_token"]
             # Токен действителен 24 часа, обновляем за час до истечения
@@ -56,17 +85,20 @@ class MarzbanService:
     ) -> Dict[str, Any]:
         """Выполнить запрос к Marzban API"""
         token = await self._get_token()
-
-        async with httpx.AsyncClient(timeout=30.0) as client:
-            response = await client.request(
-                method,
-                f"{self.base_url}{endpoint}",
-                json=json_data,
-                params=params,
-                headers={"Authorization": f"Bearer {token}"}
-            )
-            response.raise_for_status()
-            return response.json() if response.text else {}
+        # /api/user/<username> -> /api/user/{username}, чтобы не плодить серии метрик
+        operation = f"{method} {re.sub(r'^/api/user/[^/]+', '/api/user/{username}', endpoint)}"
+
+        with observe_external("marzban", operation, self.name):
+            async with httpx.AsyncClient(timeout=30.0) as client:
+                response = await client.request(
+                    method,
+                    f"{self.base_url}{endpoint}",
+                    json=json_data,
+                    params=params,
+                    headers={"Authorization": f"Bearer {token}"}
+                )
+                response.raise_for_status()
+                return response.json() if response.text else {}
 
     @staticmethod
     def generate_username(telegram_id: int, telegram_username: Optional[str] = None) -> str:
@@ -76,7 +108,6 @@ class MarzbanService:
         Пример: user_123456789_durov
         """
         if telegram_username:
-            import re
             # Очищаем username от спецсимволов, оставляем только буквы, цифры и underscore
             clean_username = re.sub(r'[^a-zA-Z0-9_]', '', telegram_username)
             return f"user_{telegram_id}_{clean_username}"
@@ -174,6 +205,10 @@ class MarzbanService:
             logger.error(f"Failed to get all users: {e}")
             return []
 
+    async def get_system_stats(self) -> Dict[str, Any]:
+        """Статистика панели: активные пользователи, трафик и т.д."""
+        return await self._request("GET", "/api/system")
+
     async def get_user(self, username: str) -> Optional[Dict[str, Any]]:
         """Получить данные пользователя"""
         try:
@@ -267,5 +302,132 @@ class MarzbanService:
         return f"https://api.qrserver.com/v1/create-qr-code/?size=300x300&data={quote(data)}"
 
 
-# Глобальный экземпляр сервиса
-marzban_service = MarzbanService()
+@dataclass
+class NodeLoad:
+    """Загрузка ноды для выбора места под нового пользователя"""
+    users_active: int = 0
+    traffic_ratio: float = 0.0  # Израсходовано / лимит трафика за месяц
+    available: bool = True
+
+
+class MarzbanPool:
+    """
+    Набор нод Marzban и выбор ноды для нового пользователя.
+
+    Нода выбирается по наименьшей загрузке: max(активные / max_users, трафик / лимит).
+    Заполненные и недоступные ноды пропускаются, пока есть другие.
+    Загрузка перечитывается не чаще раза в STATS_TTL секунд (параллельно со всех нод),
+    между обновлениями каждое размещение учитывается локально.
+    С одной нодой статистика не запрашивается вовсе.
+    """
+
+    STATS_TTL = 30.0
+
+    def __init__(self, nodes: List[MarzbanService]):
+        if not nodes:
+            raise ValueError("Marzban pool needs at least one node")
+        self.nodes: Dict[str, MarzbanService] = {node.name: node for node in nodes}
+        self.default = nodes[0]
+        self._load: Dict[str, NodeLoad] = {}
+        self._loaded_at: Optional[float] = None
+        self._lock = asyncio.Lock()
+
+    @classmethod
+    def from_settings(cls) -> "MarzbanPool":
+        """
+        Ноды из MARZBAN_NODES (JSON-список), иначе одна нода из MARZBAN_API_URL.
+        Пример: [{"name": "nl-1", "url": "https://nl.example.com", "host": "1.2.3.4",
+                  "location": "Netherlands", "max_users": 500}]
+        """
+        if not settings.MARZBAN_NODES:
+            return cls([MarzbanService()])
+
+        nodes = [
+            MarzbanService(
+                base_url=node["url"],
+                username=node.get("username"),
+                password=node.get("password"),
+                name=node["name"],
+                host=node.get("host"),
+                location=node.get("location"),
+                max_users=node.get("max_users", 0),
+                port=node.get("port", 443),
+            )
+            for node in json.loads(settings.MARZBAN_NODES)
+        ]
+        return cls(nodes)
+
+    def get(self, name: Optional[str]) -> MarzbanService:
+        """Нода по имени (подписки без ноды — на ноде по умолчанию)"""
+        return self.nodes.get(name, self.default) if name else self.default
+
+    def load(self, name: str) -> NodeLoad:
+        return self._load.setdefault(name, NodeLoad())
+
+    def is_stale(self) -> bool:
+        return self._loaded_at is None or time.monotonic() - self._loaded_at > self.STATS_TTL
+
+    async def refresh_load(self, session=None):
+        """Перечитать загрузку нод (пользователи — из панелей, трафик — из отчётов нод)"""
+        nodes = list(self.nodes.values())
+        results = await asyncio.gather(
+            *(node.get_system_stats() for node in nodes), return_exceptions=True
+        )
+
+        traffic = {}
+        if session is not None:
+            from services.node_traffic_service import node_traffic_service
+            overview = await node_traffic_service.get_overview(session)
+            traffic = {
+                row.node: node_traffic_service.usage_gb(row) / row.limit_gb
+                for row in overview["nodes"] if row.limit_gb
+            }
+
+        for node, stats in zip(nodes, results):
+            load = self.load(node.name)
+            if isinstance(stats, Exception):
+                logger.warning(f"Marzban node '{node.name}' stats unavailable: {stats}")
+                load.available = False
+                continue
+            load.available = True
+            load.users_active = stats.get("users_active", stats.get("total_user", 0)) or 0
+            load.traffic_ratio = traffic.get(node.name, 0.0)
+
+        self._loaded_at = time.monotonic()
+
+    def score(self, node: MarzbanService) -> float:
+        load = self.load(node.name)
+        users_ratio = load.users_active / node.max_users if node.max_users else 0.0
+        return max(users_ratio, load.traffic_ratio)
+
+    async def pick_node(self, session=None) -> MarzbanService:
+        """Выбрать ноду для нового пользователя"""
+        if len(self.nodes) == 1:
+            return self.default
+
+        if self.is_stale():
+            async with self._lock:
+                if self.is_stale():
+                    await self.refresh_load(session)
+
+        nodes = list(self.nodes.values())
+        candidates = (
+            [node for node in nodes if self.load(node.name).available and self.score(node) < 1.0]
+            or [node for node in nodes if self.load(node.name).available]
+            or nodes
+        )
+        node = min(candidates, key=lambda n: (self.score(n), self.load(n.name).users_active))
+
+        # Учитываем размещение до следующего обновления статистики
+        self.load(node.name).users_active += 1
+        return node
+
+    async def get_all_users(self) -> List[Dict[str, Any]]:
+        """Пользователи со всех нод"""
+        results = await asyncio.gather(*(node.get_all_users() for node in self.nodes.values()))
+        return [user for users in results for user in users]
+
+
+# Глобальный пул нод и нода по умолчанию (для одиночного сервера — единственная)
+marzban_pool = MarzbanPool.from_settings()
+marzban_service = marzban_pool.default
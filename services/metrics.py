@@ -0,0 +1,204 @@
+"""
+Метрики Prometheus для бота, webhook-сервера и внешних API
+
+Бот отдаёт их на отдельном порту (BOT_METRICS_PORT), webhook-сервер — на /metrics.
+При нескольких воркерах uvicorn задайте PROMETHEUS_MULTIPROC_DIR (пустой каталог,
+свой для каждого процесса-сервиса) — тогда /metrics собирает значения всех воркеров.
+"""
+import os
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass
+
+from prometheus_client import (
+    CONTENT_TYPE_LATEST,
+    REGISTRY,
+    CollectorRegistry,
+    Counter,
+    Gauge,
+    Histogram,
+    generate_latest,
+    multiprocess,
+    start_http_server,
+)
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import AsyncEngine
+from loguru import logger
+
+from config import settings
+
+# Быстрые операции (БД, обработчики) и медленные (внешние API) — разные корзины
+FAST_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+SLOW_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+# ============== BOT ==============
+
+HANDLER_SECONDS = Histogram(
+    "freedomvpn_bot_handler_seconds", "Время обработки апдейта хендлером",
+    ["event", "handler"], buckets=FAST_BUCKETS + (10.0, 30.0),
+)
+HANDLER_ERRORS = Counter(
+    "freedomvpn_bot_handler_errors_total", "Исключения в хендлерах", ["event", "handler"]
+)
+HANDLERS_IN_PROGRESS = Gauge(
+    "freedomvpn_bot_handlers_in_progress", "Апдейты, которые обрабатываются прямо сейчас",
+    multiprocess_mode="livesum",
+)
+
+# ============== WEBHOOK SERVER ==============
+
+HTTP_SECONDS = Histogram(
+    "freedomvpn_http_request_seconds", "Время ответа webhook-сервера",
+    ["method", "route", "status"], buckets=FAST_BUCKETS,
+)
+WEBHOOKS_IN_FLIGHT = Gauge(
+    "freedomvpn_webhooks_in_flight", "Webhook'и ЮKassa в обработке", multiprocess_mode="livesum"
+)
+SSE_STREAMS = Gauge(
+    "freedomvpn_sse_streams", "Открытые SSE-потоки подписок", multiprocess_mode="livesum"
+)
+
+# ============== EXTERNAL APIS / DB / SCHEDULER ==============
+
+EXTERNAL_SECONDS = Histogram(
+    "freedomvpn_external_request_seconds", "Время запросов к внешним API (Marzban, ЮKassa)",
+    ["service", "target", "operation"], buckets=SLOW_BUCKETS,
+)
+EXTERNAL_ERRORS = Counter(
+    "freedomvpn_external_request_errors_total", "Ошибки запросов к внешним API",
+    ["service", "target", "operation"],
+)
+DB_QUERY_SECONDS = Histogram(
+    "freedomvpn_db_query_seconds", "Время SQL-запросов", ["statement"], buckets=FAST_BUCKETS,
+)
+SCHEDULER_JOB_SECONDS = Histogram(
+    "freedomvpn_scheduler_job_seconds", "Время выполнения задач планировщика", ["job"], buckets=SLOW_BUCKETS,
+)
+SCHEDULER_JOB_FAILURES = Counter(
+    "freedomvpn_scheduler_job_failures_total", "Упавшие задачи планировщика", ["job"]
+)
+
+SQL_STATEMENTS = {"SELECT", "INSERT", "UPDATE", "DELETE", "WITH"}
+
+
+@dataclass
+class QueryStats:
+    """Сколько запросов к БД сделал один апдейт / HTTP-запрос / задача и сколько они заняли"""
+    scope: str
+    queries: int = 0
+    seconds: float = 0.0
+
+
+# Счётчик текущего апдейта или запроса; дочерние задачи видят тот же объект
+_query_stats: ContextVar[QueryStats | None] = ContextVar("query_stats", default=None)
+
+
+@contextmanager
+def track_queries(scope: str):
+    """
+    Считать запросы к БД внутри блока (scope — имя хендлера, маршрута или задачи).
+    На выходе пишет итог в лог: debug, а при QUERY_COUNT_WARN и больше — warning (похоже на N+1).
+    """
+    stats = QueryStats(scope)
+    token = _query_stats.set(stats)
+    try:
+        yield stats
+    finally:
+        _query_stats.reset(token)
+        if stats.queries:
+            # Владелец блока мог уточнить scope по ходу (маршрут известен только после запроса)
+            db_ms = round(stats.seconds * 1000, 1)
+            log = logger.bind(scope=stats.scope, db_queries=stats.queries, db_ms=db_ms)
+            if stats.queries >= settings.QUERY_COUNT_WARN:
+                log.warning(f"{stats.scope}: {stats.queries} DB queries, {db_ms} ms (possible N+1)")
+            else:
+                log.debug(f"{stats.scope}: {stats.queries} DB queries, {db_ms} ms")
+
+
+@contextmanager
+def observe_external(service: str, operation: str, target: str = ""):
+    """Замерить вызов внешнего API; исключение считается ошибкой и пробрасывается дальше"""
+    start = time.perf_counter()
+    try:
+        yield
+    except Exception:
+        EXTERNAL_ERRORS.labels(service, target, operation).inc()
+        raise
+    finally:
+        EXTERNAL_SECONDS.labels(service, target, operation).observe(time.perf_counter() - start)
+
+
+@contextmanager
+def observe_job(job: str):
+    """Замерить задачу планировщика (и посчитать её запросы к БД)"""
+    start = time.perf_counter()
+    try:
+        with track_queries(f"job:{job}"):
+            yield
+    except Exception:
+        SCHEDULER_JOB_FAILURES.labels(job).inc()
+        raise
+    finally:
+        SCHEDULER_JOB_SECONDS.labels(job).observe(time.perf_counter() - start)
+
+
+def statement_kind(statement: str) -> str:
+    """Тип SQL-запроса для метки (SELECT/INSERT/...; остальное — OTHER)"""
+    kind = statement.lstrip().split(None, 1)[0].upper() if statement.strip() else ""
+    return kind if kind in SQL_STATEMENTS else "OTHER"
+
+
+def instrument_engine(engine: AsyncEngine):
+    """
+    Замерять каждый SQL-запрос движка (события курсора SQLAlchemy): гистограмма,
+    счётчик текущего апдейта/запроса и лог запросов дольше SLOW_QUERY_MS.
+    """
+
+    @event.listens_for(engine.sync_engine, "before_cursor_execute")
+    def _before(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("query_start", []).append(time.perf_counter())
+
+    @event.listens_for(engine.sync_engine, "after_cursor_execute")
+    def _after(conn, cursor, statement, parameters, context, executemany):
+        elapsed = time.perf_counter() - conn.info["query_start"].pop()
+        DB_QUERY_SECONDS.labels(statement_kind(statement)).observe(elapsed)
+
+        stats = _query_stats.get()
+        if stats is not None:
+            stats.queries += 1
+            stats.seconds += elapsed
+
+        if elapsed * 1000 >= settings.SLOW_QUERY_MS:
+            scope = stats.scope if stats is not None else "-"
+            logger.bind(scope=scope, db_ms=round(elapsed * 1000, 1)).warning(
+                f"Slow query ({elapsed * 1000:.0f} ms) in {scope}: {' '.join(statement.split())[:500]}"
+            )
+
+
+def multiprocess_enabled() -> bool:
+    return bool(os.environ.get("PROMETHEUS_MULTIPROC_DIR"))
+
+
+def render_metrics() -> tuple[bytes, str]:
+    """Текущие метрики в текстовом формате Prometheus (со всех воркеров в multiprocess-режиме)"""
+    if multiprocess_enabled():
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = REGISTRY
+    return generate_latest(registry), CONTENT_TYPE_LATEST
+
+
+def mark_worker_dead(pid: int):
+    """Убрать live-gauge завершившегося воркера (multiprocess-режим)"""
+    if multiprocess_enabled():
+        multiprocess.mark_process_dead(pid)
+
+
+def start_metrics_server(port: int, addr: str = "127.0.0.1"):
+    """HTTP-сервер метрик для процесса бота (0 — выключен)"""
+    if not port:
+        return
+    start_http_server(port, addr=addr)
+    logger.info(f"Metrics server listening on {addr}:{port}")
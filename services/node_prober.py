@@ -0,0 +1,135 @@
+"""
+Фоновая проверка доступности нод (TCP до VLESS-порта и панель Marzban)
+"""
+import asyncio
+import time
+from dataclasses import dataclass
+from datetime import datetime
+from typing import List, Optional
+from loguru import logger
+
+from services.marzban_service import MarzbanPool, MarzbanService, marzban_pool
+from config import settings
+
+
+@dataclass
+class NodeHealth:
+    """Последнее известное состояние ноды"""
+    name: str
+    host: str
+    port: int
+    location: str
+    latency_ms: Optional[float] = None  # EWMA времени TCP-подключения
+    users_active: int = 0
+    panel_ok: bool = True
+    available: bool = True
+    failures: int = 0  # Неудачных TCP-проверок подряд
+    checked_at: Optional[datetime] = None
+
+
+class NodeProber:
+    """
+    Периодически меряет время TCP-подключения к VLESS-порту каждой ноды
+    и проверяет панель Marzban. Задержка сглаживается EWMA, нода считается
+    недоступной после FAILURES_TO_DOWN неудач подряд (чтобы не мигать от одной потери).
+    /api/servers отдаётся из снимка в памяти — без проверок на каждый запрос.
+    """
+
+    TIMEOUT = 3.0
+    ALPHA = 0.3  # Вес последнего замера в EWMA
+    FAILURES_TO_DOWN = 2
+
+    def __init__(self, pool: MarzbanPool, interval: float = 30.0):
+        self.pool = pool
+        self.interval = interval
+        self._health: dict[str, NodeHealth] = {}
+        self._task: Optional[asyncio.Task] = None
+
+    def health(self, node: MarzbanService) -> NodeHealth:
+        if node.name not in self._health:
+            self._health[node.name] = NodeHealth(
+                name=node.name, host=node.host, port=node.port, location=node.location
+            )
+        return self._health[node.name]
+
+    async def measure_tcp(self, host: str, port: int) -> Optional[float]:
+        """Время TCP-подключения в мс; None — не подключились"""
+        started = time.perf_counter()
+        try:
+            _, writer = await asyncio.wait_for(asyncio.open_connection(host, port), self.TIMEOUT)
+        except (OSError, asyncio.TimeoutError):
+            return None
+        latency = (time.perf_counter() - started) * 1000
+        writer.close()
+        try:
+            await writer.wait_closed()
+        except OSError:
+            pass
+        return latency
+
+    async def probe(self, node: MarzbanService):
+        """Проверить одну ноду"""
+        health = self.health(node)
+        latency, stats = await asyncio.gather(
+            self.measure_tcp(node.host, node.port),
+            asyncio.wait_for(node.get_system_stats(), self.TIMEOUT),
+            return_exceptions=True,
+        )
+
+        if isinstance(latency, float):
+            health.latency_ms = (
+                latency if health.latency_ms is None
+                else self.ALPHA * latency + (1 - self.ALPHA) * health.latency_ms
+            )
+            health.failures = 0
+            health.available = True
+        else:
+            health.failures += 1
+            if health.failures >= self.FAILURES_TO_DOWN and health.available:
+                health.available = False
+                logger.warning(f"Node '{node.name}' ({node.host}:{node.port}) is unreachable")
+
+        health.panel_ok = isinstance(stats, dict)
+        if health.panel_ok:
+            health.users_active = stats.get("users_active", stats.get("total_user", 0)) or 0
+
+        health.checked_at = datetime.utcnow()
+
+    async def probe_all(self):
+        """Проверить все ноды параллельно"""
+        await asyncio.gather(*(self.probe(node) for node in self.pool.nodes.values()))
+
+    def snapshot(self) -> List[NodeHealth]:
+        """Ноды: доступные первыми, затем по задержке и загрузке"""
+        nodes = [self.health(node) for node in self.pool.nodes.values()]
+        return sorted(nodes, key=lambda h: (
+            not h.available,
+            h.latency_ms if h.latency_ms is not None else float("inf"),
+            h.users_active,
+        ))
+
+    async def run(self):
+        """Основной цикл проверки"""
+        while True:
+            try:
+                await self.probe_all()
+            except Exception as e:
+                logger.error(f"Node probe failed: {e}")
+            await asyncio.sleep(self.interval)
+
+    def start(self):
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self.run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+
+# Глобальный prober
+node_prober = NodeProber(marzban_pool, interval=settings.NODE_PROBE_INTERVAL)
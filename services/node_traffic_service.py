@@ -0,0 +1,82 @@
+"""
+Сервис учёта трафика нод (отчёты monitor_traffic с каждой ноды)
+"""
+import json
+from datetime import datetime
+from sqlalchemy import select
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+from database.models import NodeTraffic
+from loguru import logger
+
+
+class NodeTrafficService:
+    """Сервис трафика нод"""
+
+    @staticmethod
+    def usage_gb(row: NodeTraffic) -> float:
+        return (row.rx_bytes + row.tx_bytes) / (1024 ** 3)
+
+    async def save_report(
+        self,
+        session: AsyncSession,
+        node: str,
+        month: str,
+        rx_bytes: int,
+        tx_bytes: int,
+        limit_gb: float,
+        rx_rate: float = 0.0,
+        tx_rate: float = 0.0,
+        interfaces: dict | None = None,
+    ) -> NodeTraffic:
+        """Сохранить отчёт ноды (одна строка на ноду и месяц, перезаписывается)"""
+        values = {
+            "rx_bytes": rx_bytes,
+            "tx_bytes": tx_bytes,
+            "rx_rate": rx_rate,
+            "tx_rate": tx_rate,
+            "limit_gb": limit_gb,
+            "interfaces": json.dumps(interfaces or {}),
+            "updated_at": datetime.utcnow(),
+        }
+
+        for _ in range(2):
+            result = await session.execute(
+                select(NodeTraffic).where(NodeTraffic.node == node, NodeTraffic.month == month)
+            )
+            row = result.scalar_one_or_none()
+            if row is not None:
+                for key, value in values.items():
+                    setattr(row, key, value)
+                return row
+
+            try:
+                async with session.begin_nested():
+                    row = NodeTraffic(node=node, month=month, **values)
+                    session.add(row)
+                logger.info(f"First traffic report from node '{node}' for {month}")
+                return row
+            except IntegrityError:
+                # Параллельный отчёт той же ноды успел создать строку — обновляем её
+                continue
+
+        raise RuntimeError(f"Can't save traffic report for node '{node}'")
+
+    async def get_overview(self, session: AsyncSession, month: str | None = None) -> dict:
+        """Сводка по всем нодам за месяц"""
+        month = month or datetime.now().strftime("%Y-%m")
+        result = await session.execute(
+            select(NodeTraffic).where(NodeTraffic.month == month).order_by(NodeTraffic.node)
+        )
+        nodes = result.scalars().all()
+
+        return {
+            "month": month,
+            "nodes": nodes,
+            "total_gb": sum(self.usage_gb(node) for node in nodes),
+            "limit_gb": sum(node.limit_gb for node in nodes),
+        }
+
+
+# Singleton instance
+node_traffic_service = NodeTrafficService()
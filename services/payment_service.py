@@ -3,6 +3,7 @@ from sqlalchemy import select
 from sqlalchemy.ext.asyncio import AsyncSession
 from database.models import Payment, PaymentStatus
 from config import settings
+from services.metrics import observe_external
 from loguru import logger
 import uuid
 
@@ -84,19 +85,20 @@ class PaymentService:
                 metadata["telegram_username"] = telegram_username
 
             # Создаём платёж в ЮKassa
-            yukassa_payment = YooPayment.create({
-                "amount": {
-                    "value": f"{amount}.00",
-                    "currency": "RUB"
-                },
-                "confirmation": {
-                    "type": "redirect",
-                    "return_url": return_url or "https://t.me/freeddomm_bot"
-                },
-                "capture": True,
-                "description": description,
-                "metadata": metadata
-            }, idempotence_key)
+            with observe_external("yookassa", "payment.create"):
+                yukassa_payment = YooPayment.create({
+                    "amount": {
+                        "value": f"{amount}.00",
+                        "currency": "RUB"
+                    },
+                    "confirmation": {
+                        "type": "redirect",
+                        "return_url": return_url or "https://t.me/freeddomm_bot"
+                    },
+                    "capture": True,
+                    "description": description,
+                    "metadata": metadata
+                }, idempotence_key)
 
             # Сохраняем платёж в БД
             payment = Payment(
@@ -134,7 +136,8 @@ class PaymentService:
     ) -> str:
         """Проверить статус платежа в ЮKassa"""
         try:
-            yukassa_payment = YooPayment.find_one(yukassa_payment_id)
+            with observe_external("yookassa", "payment.find_one"):
+                yukassa_payment = YooPayment.find_one(yukassa_payment_id)
             payment = await self.get_payment_by_yukassa_id(session, yukassa_payment_id)
 
             if payment and yukassa_payment.status != payment.status:
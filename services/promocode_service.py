@@ -1,13 +1,100 @@
 """
 Сервис для работы с промокодами
 """
+import asyncio
+import time
+from dataclasses import dataclass, replace
 from datetime import datetime
-from sqlalchemy import select, and_
+from sqlalchemy import select, update, and_, or_
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.ext.asyncio import AsyncSession
 from database.models import Promocode, PromocodeUsage
 from loguru import logger
 
 
+@dataclass(frozen=True, slots=True)
+class PromocodeSnapshot:
+    """Снимок активного промокода в каталоге (поля совпадают с моделью)"""
+    id: int
+    code: str
+    discount_type: str
+    discount_value: float
+    max_uses: int | None
+    current_uses: int
+    expires_at: datetime | None
+    applicable_plans: str | None
+
+    @classmethod
+    def from_model(cls, promocode: Promocode) -> "PromocodeSnapshot":
+        return cls(
+            id=promocode.id,
+            code=promocode.code,
+            discount_type=promocode.discount_type,
+            discount_value=promocode.discount_value,
+            max_uses=promocode.max_uses,
+            current_uses=promocode.current_uses or 0,
+            expires_at=promocode.expires_at,
+            applicable_plans=promocode.applicable_plans,
+        )
+
+
+class PromocodeCatalog:
+    """
+    Кэш активных промокодов в памяти.
+
+    Неизвестные коды (в т.ч. перебор) отсекаются поиском по словарю без запроса к БД.
+    Каталог перечитывается при создании промокода и не реже раза в REFRESH_INTERVAL секунд.
+    Счётчик current_uses здесь приблизительный: лимит окончательно проверяет
+    условный UPDATE в apply_promocode.
+    """
+
+    REFRESH_INTERVAL = 60.0
+
+    def __init__(self):
+        self._by_code: dict[str, PromocodeSnapshot] = {}
+        self._loaded_at: float | None = None
+        self._lock = asyncio.Lock()
+
+    def is_stale(self) -> bool:
+        return self._loaded_at is None or time.monotonic() - self._loaded_at > self.REFRESH_INTERVAL
+
+    async def refresh(self, session: AsyncSession):
+        """Перечитать все активные промокоды"""
+        result = await session.execute(select(Promocode).where(Promocode.is_active == True))
+        self._by_code = {
+            promocode.code: PromocodeSnapshot.from_model(promocode)
+            for promocode in result.scalars().all()
+        }
+        self._loaded_at = time.monotonic()
+        logger.debug(f"Promocode catalog refreshed: {len(self._by_code)} active codes")
+
+    async def ensure_fresh(self, session: AsyncSession):
+        """Перечитать каталог, если он устарел"""
+        if not self.is_stale():
+            return
+        async with self._lock:
+            if self.is_stale():
+                await self.refresh(session)
+
+    def get(self, code: str) -> PromocodeSnapshot | None:
+        return self._by_code.get(code.upper())
+
+    def add(self, snapshot: PromocodeSnapshot):
+        self._by_code[snapshot.code] = snapshot
+
+    def record_use(self, code: str):
+        snapshot = self._by_code.get(code)
+        if snapshot is not None:
+            self._by_code[code] = replace(snapshot, current_uses=snapshot.current_uses + 1)
+
+    def invalidate(self):
+        self._loaded_at = None
+
+
+# Глобальный каталог промокодов
+promocode_catalog = PromocodeCatalog()
+
+
 class PromocodeService:
     """Сервис промокодов"""
 
@@ -16,11 +103,9 @@ class PromocodeService:
     ) -> dict:
         """Проверить промокод на валидность"""
 
-        # Получаем промокод
-        result = await session.execute(
-            select(Promocode).where(and_(Promocode.code == code.upper(), Promocode.is_active == True))
-        )
-        promocode = result.scalar_one_or_none()
+        # Получаем промокод из каталога (несуществующие коды отсекаются без запроса к БД)
+        await promocode_catalog.ensure_fresh(session)
+        promocode = promocode_catalog.get(code)
 
         if not promocode:
             return {"valid": False, "error": "Промокод не найден"}
@@ -66,12 +151,19 @@ class PromocodeService:
     async def apply_promocode(
         self,
         session: AsyncSession,
-        promocode: Promocode,
+        promocode: Promocode | PromocodeSnapshot,
         telegram_id: int,
         original_amount: float,
         payment_id: int | None = None,
     ) -> dict:
-        """Применить промокод и вернуть результат"""
+        """
+        Применить (погасить) промокод и вернуть результат.
+
+        Погашение атомарное: запись использования и условный
+        UPDATE current_uses выполняются в одной транзакции (savepoint),
+        поэтому лимит нельзя превысить даже при одновременных запросах.
+        Коммит — на стороне вызывающего кода.
+        """
 
         discount_amount = 0.0
         final_amount = original_amount
@@ -92,19 +184,41 @@ class PromocodeService:
             bonus_days = int(promocode.discount_value)
             discount_amount = 0.0
 
-        # Записываем использование промокода
-        usage = PromocodeUsage(
-            promocode_id=promocode.id,
-            telegram_id=telegram_id,
-            payment_id=payment_id,
-            discount_amount=discount_amount,
+        savepoint = await session.begin_nested()
+
+        # Записываем использование промокода (уникально по промокоду и пользователю)
+        try:
+            session.add(PromocodeUsage(
+                promocode_id=promocode.id,
+                telegram_id=telegram_id,
+                payment_id=payment_id,
+                discount_amount=discount_amount,
+            ))
+            await session.flush()
+        except IntegrityError:
+            await savepoint.rollback()
+            return {"applied": False, "error": "Вы уже использовали этот промокод"}
+
+        # Увеличиваем счетчик только если лимит ещё не исчерпан
+        now = datetime.utcnow()
+        result = await session.execute(
+            update(Promocode)
+            .where(
+                Promocode.id == promocode.id,
+                Promocode.is_active == True,
+                or_(Promocode.max_uses.is_(None), Promocode.current_uses < Promocode.max_uses),
+                or_(Promocode.expires_at.is_(None), Promocode.expires_at > now),
+            )
+            .values(current_uses=Promocode.current_uses + 1)
+            .execution_options(synchronize_session=False)
         )
-        session.add(usage)
 
-        # Увеличиваем счетчик использований
-        promocode.current_uses += 1
+        if result.rowcount == 0:
+            await savepoint.rollback()
+            return {"applied": False, "error": "Промокод исчерпан"}
 
-        await session.commit()
+        await savepoint.commit()
+        promocode_catalog.record_use(promocode.code)
 
         logger.info(
             f"Promocode '{promocode.code}' applied for user {telegram_id}: "
@@ -112,6 +226,7 @@ class PromocodeService:
         )
 
         return {
+            "applied": True,
             "original_amount": original_amount,
             "discount_amount": discount_amount,
             "final_amount": final_amount,
@@ -142,6 +257,7 @@ class PromocodeService:
 
         session.add(promocode)
         await session.commit()
+        promocode_catalog.add(PromocodeSnapshot.from_model(promocode))
 
         logger.info(f"Created promocode '{code}' with {discount_type}={discount_value}")
         return promocode
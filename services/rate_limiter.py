@@ -0,0 +1,145 @@
+"""
+Хранилища для rate limiting: token bucket + короткие блокировки (in-flight)
+
+Memory-хранилище работает в пределах одного процесса,
+Redis-хранилище — общее для всех воркеров.
+"""
+import asyncio
+import time
+import uuid
+from typing import Dict, Tuple
+
+from loguru import logger
+
+
+class MemoryRateLimitStorage:
+    """Token bucket и блокировки в памяти процесса"""
+
+    # Как часто чистить простаивающие (полные) корзины
+    SWEEP_EVERY = 1000
+
+    def __init__(self):
+        self._buckets: Dict[str, Tuple[float, float, float]] = {}  # key -> (tokens, ts, full_after)
+        self._locks: Dict[str, float] = {}  # key -> expires_at
+        self._ops = 0
+
+    async def consume(self, key: str, capacity: int, refill_rate: float) -> bool:
+        """Взять один токен из корзины. False — лимит исчерпан"""
+        now = time.monotonic()
+        tokens, ts, _ = self._buckets.get(key, (float(capacity), now, now))
+        tokens = min(float(capacity), tokens + (now - ts) * refill_rate)
+
+        allowed = tokens >= 1.0
+        if allowed:
+            tokens -= 1.0
+
+        # Момент, когда корзина снова станет полной — после него запись можно удалить
+        full_after = now + (capacity - tokens) / refill_rate if refill_rate > 0 else float("inf")
+        self._buckets[key] = (tokens, now, full_after)
+
+        self._ops += 1
+        if self._ops % self.SWEEP_EVERY == 0:
+            self._sweep(now)
+
+        return allowed
+
+    async def acquire(self, key: str, ttl: float) -> bool:
+        """Захватить блокировку на ttl секунд. False — уже захвачена"""
+        now = time.monotonic()
+        expires_at = self._locks.get(key)
+        if expires_at is not None and expires_at > now:
+            return False
+        self._locks[key] = now + ttl
+        return True
+
+    async def release(self, key: str):
+        """Освободить блокировку"""
+        self._locks.pop(key, None)
+
+    async def wait_released(self, key: str, timeout: float, poll_interval: float = 0.05):
+        """Дождаться освобождения блокировки (не дольше timeout)"""
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            expires_at = self._locks.get(key)
+            if expires_at is None or expires_at <= time.monotonic():
+                return
+            await asyncio.sleep(poll_interval)
+
+    def _sweep(self, now: float):
+        self._buckets = {k: v for k, v in self._buckets.items() if v[2] > now}
+        self._locks = {k: v for k, v in self._locks.items() if v > now}
+
+
+class RedisRateLimitStorage:
+    """Token bucket и блокировки в Redis (общие для всех воркеров)"""
+
+    # Атомарный token bucket: пополнение + списание одним скриптом
+    CONSUME_SCRIPT = """
+local capacity = tonumber(ARGV[1])
+local rate = tonumber(ARGV[2])
+local now = tonumber(ARGV[3])
+local ttl = tonumber(ARGV[4])
+local bucket = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+local tokens = tonumber(bucket[1]) or capacity
+local ts = tonumber(bucket[2]) or now
+tokens = math.min(capacity, tokens + (now - ts) * rate)
+local allowed = 0
+if tokens >= 1 then
+    tokens = tokens - 1
+    allowed = 1
+end
+redis.call('HSET', KEYS[1], 'tokens', tokens, 'ts', now)
+redis.call('PEXPIRE', KEYS[1], ttl)
+return allowed
+"""
+
+    # Снимаем блокировку только если она наша
+    RELEASE_SCRIPT = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('DEL', KEYS[1])
+end
+return 0
+"""
+
+    def __init__(self, redis_url: str, prefix: str = "ratelimit:"):
+        from redis.asyncio import Redis
+
+        self._redis = Redis.from_url(redis_url)
+        self._prefix = prefix
+        self._owner = uuid.uuid4().hex
+        self._consume = self._redis.register_script(self.CONSUME_SCRIPT)
+        self._release = self._redis.register_script(self.RELEASE_SCRIPT)
+
+    async def consume(self, key: str, capacity: int, refill_rate: float) -> bool:
+        ttl_ms = int(capacity / refill_rate * 1000) + 1000 if refill_rate > 0 else 3600 * 1000
+        allowed = await self._consume(
+            keys=[self._prefix + key],
+            args=[capacity, refill_rate, time.time(), ttl_ms],
+        )
+        return bool(allowed)
+
+    async def acquire(self, key: str, ttl: float) -> bool:
+        return bool(await self._redis.set(self._prefix + key, self._owner, nx=True, px=int(ttl * 1000)))
+
+    async def release(self, key: str):
+        await self._release(keys=[self._prefix + key], args=[self._owner])
+
+    async def wait_released(self, key: str, timeout: float, poll_interval: float = 0.1):
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            if not await self._redis.exists(self._prefix + key):
+                return
+            await asyncio.sleep(poll_interval)
+
+    async def close(self):
+        await self._redis.aclose()
+
+
+def create_rate_limit_storage(backend: str, redis_url: str | None = None):
+    """Создать хранилище по имени бэкенда ("memory" или "redis")"""
+    if backend == "redis":
+        try:
+            return RedisRateLimitStorage(redis_url)
+        except ImportError:
+            logger.warning("redis package is not installed, falling back to in-memory rate limiting")
+    return MemoryRateLimitStorage()
@@ -1,60 +1,109 @@
 """
 Сервис для работы с реферальной системой
 """
-import random
-import string
-from sqlalchemy import select, and_, func
+import asyncio
+import time
+from collections import defaultdict
+from dataclasses import dataclass
+from sqlalchemy import BigInteger, select, update, insert, and_, func, bindparam, literal
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.ext.asyncio import AsyncSession
-from database.models import User, ReferralTransaction, Payment, PaymentStatus
+from sqlalchemy.orm import aliased
+from database.models import User, ReferralTransaction, ReferralTreeEdge, Payment, PaymentStatus
+from config import settings
 from loguru import logger
 
 
+REFERRAL_CODE_PREFIX = "ref_"
+
+# Параметры биекции id <-> код. Не менять: на них завязаны все выданные ссылки
+_CODE_ALPHABET = "0123456789abcdefghijklmnopqrstuvwxyz"
+_CODE_MASK = (1 << 64) - 1
+_CODE_XOR_KEY = 0x3C6EF372FE94F82B
+_CODE_MULTIPLIER = 0x9E3779B97F4A7C15  # нечётный — обратим по модулю 2^64
+_CODE_MULTIPLIER_INVERSE = pow(_CODE_MULTIPLIER, -1, 1 << 64)
+_CODE_MAX_LENGTH = 13  # 2^64 в base36
+_MAX_TELEGRAM_ID = 1 << 52  # Реальные id заметно меньше; остальное — подобранные коды
+
+
+@dataclass(frozen=True, slots=True)
+class ReferralAccrual:
+    """Платёж, с которого нужно начислить реферальный бонус"""
+    payment_id: int
+    telegram_id: int  # Кто заплатил
+    amount: float
+
+
 class ReferralService:
     """Сервис реферальной системы"""
 
-    REFERRAL_PERCENTAGE = 30.0  # 30% от платежа рефералу
+    REFERRAL_PERCENTAGE = settings.REFERRAL_PERCENT * 100  # % от платежа рефереру
 
     @staticmethod
     def generate_referral_code(telegram_id: int) -> str:
-        """Генерировать уникальный реферальный код"""
-        # Формат: ref_[6 случайных символов]_[последние 4 цифры telegram_id]
-        random_part = ''.join(random.choices(string.ascii_lowercase + string.digits, k=6))
-        id_part = str(telegram_id)[-4:]
-        return f"ref_{random_part}_{id_part}"
+        """
+        Реферальный код из telegram_id: ref_ + base36 от биекции на 64-битных числах.
+
+        Разные id всегда дают разные коды, поэтому проверять уникальность в БД не нужно,
+        а код декодируется обратно в telegram_id без поиска по строке.
+        """
+        value = ((telegram_id ^ _CODE_XOR_KEY) * _CODE_MULTIPLIER) & _CODE_MASK
+        digits = []
+        while True:
+            value, digit = divmod(value, 36)
+            digits.append(_CODE_ALPHABET[digit])
+            if not value:
+                break
+        return REFERRAL_CODE_PREFIX + "".join(reversed(digits))
+
+    @staticmethod
+    def decode_referral_code(referral_code: str) -> int | None:
+        """telegram_id из кода generate_referral_code; None — код другого формата или мусор"""
+        body = referral_code[len(REFERRAL_CODE_PREFIX):]
+        if (
+            not referral_code.startswith(REFERRAL_CODE_PREFIX)
+            or not body
+            or len(body) > _CODE_MAX_LENGTH
+            or any(char not in _CODE_ALPHABET for char in body)
+        ):
+            return None
+
+        value = int(body, 36)
+        if value > _CODE_MASK:
+            return None
+
+        telegram_id = ((value * _CODE_MULTIPLIER_INVERSE) & _CODE_MASK) ^ _CODE_XOR_KEY
+        if not 0 < telegram_id < _MAX_TELEGRAM_ID:
+            return None
+        # Только каноническая запись (без ведущих нулей)
+        if ReferralService.generate_referral_code(telegram_id) != referral_code:
+            return None
+        return telegram_id
 
     async def create_or_get_referral_code(
         self, session: AsyncSession, telegram_id: int
     ) -> str:
         """Создать или получить реферальный код пользователя"""
-        result = await session.execute(
-            select(User).where(User.telegram_id == telegram_id)
-        )
-        user = result.scalar_one_or_none()
+        row = (
+            await session.execute(
+                select(User.referral_code).where(User.telegram_id == telegram_id)
+            )
+        ).one_or_none()
 
-        if not user:
+        if row is None:
             return ""
 
-        if user.referral_code:
-            return user.referral_code
+        if row.referral_code:
+            # В т.ч. старые случайные коды — по ним уже ходят ссылки
+            return row.referral_code
 
-        # Генерируем новый код
         referral_code = self.generate_referral_code(telegram_id)
-
-        # Проверяем уникальность
-        while True:
-            result = await session.execute(
-                select(User).where(User.referral_code == referral_code)
-            )
-            existing = result.scalar_one_or_none()
-
-            if not existing:
-                break
-
-            # Генерируем новый код если такой уже есть
-            referral_code = self.generate_referral_code(telegram_id)
-
-        # Сохраняем код
-        user.referral_code = referral_code
+        await session.execute(
+            update(User)
+            .where(User.telegram_id == telegram_id)
+            .values(referral_code=referral_code)
+            .execution_options(synchronize_session=False)
+        )
         await session.commit()
 
         logger.info(f"Created referral code '{referral_code}' for user {telegram_id}")
@@ -64,6 +113,14 @@ class ReferralService:
         self, session: AsyncSession, referral_code: str
     ) -> User | None:
         """Получить пользователя по реферальному коду"""
+        telegram_id = self.decode_referral_code(referral_code)
+        if telegram_id is not None:
+            result = await session.execute(
+                select(User).where(User.telegram_id == telegram_id)
+            )
+            return result.scalar_one_or_none()
+
+        # Старый формат (ref_[случайные символы]_[цифры id]) — поиск по строке
         result = await session.execute(
             select(User).where(User.referral_code == referral_code)
         )
@@ -86,12 +143,89 @@ class ReferralService:
             # Пользователь не найден или реферер уже установлен
             return False
 
+        if await self.is_descendant(session, telegram_id, referrer_id):
+            # Реферер сам приглашён этим пользователем (прямо или через цепочку) — цикл
+            return False
+
         user.referrer_id = referrer_id
+        await self.register_referral(session, referrer_id, telegram_id)
         await session.commit()
 
+        # Инкремент топа видит только новых пользователей (users.id > курсора) — перестраиваем
+        referral_leaderboard.invalidate()
+
         logger.info(f"Set referrer {referrer_id} for user {telegram_id}")
         return True
 
+    async def register_referral(self, session: AsyncSession, referrer_id: int, telegram_id: int):
+        """
+        Учесть нового приглашённого: счётчик реферера (без пересчёта COUNT)
+        и рёбра дерева рефералов. У пользователя уже может быть своя сеть (set_referrer
+        для существующего пользователя), поэтому связываются все пары
+        (реферер и его предки) × (пользователь и его сеть) с глубиной a.depth + d.depth + 1.
+        """
+        await session.execute(
+            update(User)
+            .where(User.telegram_id == referrer_id)
+            .values(total_referrals=func.coalesce(User.total_referrals, 0) + 1)
+            .execution_options(synchronize_session=False)
+        )
+
+        ancestors = (
+            select(ReferralTreeEdge.ancestor_id, ReferralTreeEdge.depth)
+            .where(ReferralTreeEdge.descendant_id == referrer_id)
+            .union_all(select(literal(referrer_id, BigInteger), literal(0)))
+            .subquery("a")
+        )
+        descendants = (
+            select(ReferralTreeEdge.descendant_id, ReferralTreeEdge.depth)
+            .where(ReferralTreeEdge.ancestor_id == telegram_id)
+            .union_all(select(literal(telegram_id, BigInteger), literal(0)))
+            .subquery("d")
+        )
+        await session.execute(
+            insert(ReferralTreeEdge).from_select(
+                ["ancestor_id", "descendant_id", "depth"],
+                select(
+                    ancestors.c.ancestor_id,
+                    descendants.c.descendant_id,
+                    ancestors.c.depth + descendants.c.depth + 1,
+                ).select_from(ancestors.join(descendants, literal(True))),
+            )
+        )
+
+    async def is_descendant(self, session: AsyncSession, ancestor_id: int, telegram_id: int) -> bool:
+        """Входит ли пользователь в сеть ancestor_id (на любой глубине)"""
+        result = await session.scalar(
+            select(ReferralTreeEdge.depth).where(
+                ReferralTreeEdge.ancestor_id == ancestor_id,
+                ReferralTreeEdge.descendant_id == telegram_id,
+            )
+        )
+        return result is not None
+
+    async def get_network_sizes(
+        self, session: AsyncSession, telegram_ids: list[int], max_depth: int | None = None
+    ) -> dict[int, int]:
+        """
+        Размер реферальной сети (все уровни или до max_depth включительно).
+        Один запрос по индексу (ancestor_id, depth) на всю пачку пользователей.
+        """
+        if not telegram_ids:
+            return {}
+
+        query = (
+            select(ReferralTreeEdge.ancestor_id, func.count())
+            .where(ReferralTreeEdge.ancestor_id.in_(telegram_ids))
+            .group_by(ReferralTreeEdge.ancestor_id)
+        )
+        if max_depth is not None:
+            query = query.where(ReferralTreeEdge.depth <= max_depth)
+
+        result = await session.execute(query)
+        sizes = dict(result.all())
+        return {telegram_id: sizes.get(telegram_id, 0) for telegram_id in telegram_ids}
+
     async def process_referral_payment(
         self,
         session: AsyncSession,
@@ -100,93 +234,259 @@ class ReferralService:
         amount: float,
     ) -> float:
         """Обработать реферальный платеж и начислить бонус рефереру"""
-
-        # Получаем пользователя
+        accrued = await self.accrue_batch(
+            session, [ReferralAccrual(payment_id=payment_id, telegram_id=telegram_id, amount=amount)]
+        )
+        return accrued.get(payment_id, 0.0)
+
+    async def accrue_batch(
+        self, session: AsyncSession, accruals: list[ReferralAccrual]
+    ) -> dict[int, float]:
+        """
+        Начислить реферальные бонусы пачкой платежей.
+
+        Журнал referral_transactions — единственный источник начислений:
+        на каждый платёж пишется не больше одной строки (уникальный payment_id),
+        поэтому повторная обработка того же платежа ничего не начисляет.
+        Баланс и total_earned меняются атомарным UPDATE ... SET balance = balance + x,
+        без чтения-изменения-записи. Коммит — на стороне вызывающего кода.
+
+        Returns:
+            {payment_id: начисленный бонус} для реально начисленных платежей
+        """
+        if not accruals:
+            return {}
+
+        # Рефереры плательщиков (только существующие) — одним запросом
+        referrer = aliased(User)
         result = await session.execute(
-            select(User).where(User.telegram_id == telegram_id)
+            select(User.telegram_id, User.referrer_id)
+            .join(referrer, referrer.telegram_id == User.referrer_id)
+            .where(User.telegram_id.in_({a.telegram_id for a in accruals}))
         )
-        user = result.scalar_one_or_none()
-
-        if not user or not user.referrer_id:
-            return 0.0
-
-        # Рассчитываем бонус
-        bonus_amount = amount * (self.REFERRAL_PERCENTAGE / 100.0)
+        referrers = dict(result.all())
 
-        # Получаем реферера
+        # Уже начисленные платежи — одним запросом
         result = await session.execute(
-            select(User).where(User.telegram_id == user.referrer_id)
+            select(ReferralTransaction.payment_id)
+            .where(ReferralTransaction.payment_id.in_({a.payment_id for a in accruals}))
         )
-        referrer = result.scalar_one_or_none()
-
-        if not referrer:
-            logger.warning(f"Referrer {user.referrer_id} not found for user {telegram_id}")
-            return 0.0
-
-        # Начисляем бонус рефереру
-        referrer.balance += bonus_amount
-        referrer.total_earned += bonus_amount
-        referrer.total_referrals = (
+        processed = set(result.scalars().all())
+
+        transactions = []
+        deltas: dict[int, float] = defaultdict(float)
+        accrued: dict[int, float] = {}
+
+        for accrual in accruals:
+            referrer_id = referrers.get(accrual.telegram_id)
+            if not referrer_id or referrer_id == accrual.telegram_id or accrual.payment_id in processed:
+                continue
+            processed.add(accrual.payment_id)
+
+            bonus_amount = round(accrual.amount * self.REFERRAL_PERCENTAGE / 100.0, 2)
+            transactions.append({
+                "referrer_telegram_id": referrer_id,
+                "referred_telegram_id": accrual.telegram_id,
+                "payment_id": accrual.payment_id,
+                "amount": bonus_amount,
+                "percentage": self.REFERRAL_PERCENTAGE,
+            })
+            deltas[referrer_id] += bonus_amount
+            accrued[accrual.payment_id] = bonus_amount
+
+        if not transactions:
+            return {}
+
+        users = User.__table__
+        savepoint = await session.begin_nested()
+        try:
+            await session.execute(insert(ReferralTransaction), transactions)
             await session.execute(
-                select(func.count(User.id)).where(User.referrer_id == user.referrer_id)
+                update(users)
+                .where(users.c.telegram_id == bindparam("b_telegram_id"))
+                .values(
+                    balance=func.coalesce(users.c.balance, 0) + bindparam("delta"),
+                    total_earned=func.coalesce(users.c.total_earned, 0) + bindparam("delta"),
+                ),
+                [{"b_telegram_id": referrer_id, "delta": delta} for referrer_id, delta in deltas.items()],
+            )
+            await savepoint.commit()
+        except IntegrityError:
+            # Платёж параллельно начислил другой процесс — разбираем пачку поштучно
+            await savepoint.rollback()
+            if len(accruals) == 1:
+                return {}
+            accrued = {}
+            for accrual in accruals:
+                accrued.update(await self.accrue_batch(session, [accrual]))
+            return accrued
+
+        for transaction in transactions:
+            logger.info(
+                f"Referral bonus {transaction['amount']}₽ ({self.REFERRAL_PERCENTAGE}%) "
+                f"credited to {transaction['referrer_telegram_id']} from payment {transaction['payment_id']}"
             )
-        ).scalar() or 0
-
-        # Создаем запись транзакции
-        transaction = ReferralTransaction(
-            referrer_telegram_id=user.referrer_id,
-            referred_telegram_id=telegram_id,
-            payment_id=payment_id,
-            amount=bonus_amount,
-            percentage=self.REFERRAL_PERCENTAGE,
-        )
-        session.add(transaction)
-
-        await session.commit()
-
-        logger.info(
-            f"Referral bonus {bonus_amount}₽ ({self.REFERRAL_PERCENTAGE}%) "
-            f"credited to {user.referrer_id} from payment {payment_id}"
-        )
 
-        return bonus_amount
+        return accrued
 
     async def get_referral_stats(
         self, session: AsyncSession, telegram_id: int
     ) -> dict:
-        """Получить статистику рефералов"""
-
-        # Количество рефералов
-        referrals_count = (
-            await session.execute(
-                select(func.count(User.id)).where(User.referrer_id == telegram_id)
-            )
-        ).scalar() or 0
+        """
+        Получить статистику рефералов.
 
-        # Общий заработок
-        total_earned = (
+        Счётчики берутся из users (поддерживаются инкрементально),
+        последние рефералы — по индексу (referrer_id, created_at DESC).
+        """
+        row = (
             await session.execute(
-                select(func.sum(ReferralTransaction.amount)).where(
-                    ReferralTransaction.referrer_telegram_id == telegram_id
-                )
+                select(User.total_referrals, User.total_earned, User.balance)
+                .where(User.telegram_id == telegram_id)
             )
-        ).scalar() or 0.0
+        ).one_or_none()
 
         # Последние 5 рефералов
         result = await session.execute(
-            select(User)
+            select(User.first_name, User.created_at)
             .where(User.referrer_id == telegram_id)
             .order_by(User.created_at.desc())
             .limit(5)
         )
-        recent_referrals = result.scalars().all()
+        recent_referrals = result.all()
 
         return {
-            "referrals_count": referrals_count,
-            "total_earned": total_earned,
+            "referrals_count": (row.total_referrals if row else 0) or 0,
+            "total_earned": (row.total_earned if row else 0.0) or 0.0,
+            "balance": (row.balance if row else 0.0) or 0.0,
             "recent_referrals": recent_referrals,
         }
 
 
+@dataclass(frozen=True, slots=True)
+class LeaderboardEntry:
+    """Строка лидерборда рефереров"""
+    telegram_id: int
+    username: str | None
+    first_name: str | None
+    total_referrals: int
+    total_earned: float
+
+
+class ReferralLeaderboard:
+    """
+    Предрассчитанный топ рефереров по числу приглашённых и по заработку.
+
+    Первый раз топ строится двумя запросами по индексам на total_referrals / total_earned.
+    Дальше раз в REFRESH_INTERVAL перечитываются только рефереры, у которых с прошлого
+    раза появились новые приглашённые (users.id > курсора) или начисления
+    (referral_transactions.id > курсора). Оба счётчика только растут, поэтому
+    пользователь вне топа может попасть в него только будучи «затронутым» —
+    достаточно хранить объединение двух топов. Раз в FULL_REFRESH_INTERVAL топ
+    строится заново (ловит правки счётчиков в обход регистрации и журнала).
+    """
+
+    REFRESH_INTERVAL = 60.0
+    FULL_REFRESH_INTERVAL = 3600.0
+
+    def __init__(self, size: int = 10):
+        self.size = size
+        self._entries: dict[int, LeaderboardEntry] = {}
+        self._last_user_id = 0
+        self._last_transaction_id = 0
+        self._refreshed_at: float | None = None
+        self._rebuilt_at: float | None = None
+        self._lock = asyncio.Lock()
+
+    @staticmethod
+    def _columns():
+        return select(
+            User.telegram_id,
+            User.username,
+            User.first_name,
+            func.coalesce(User.total_referrals, 0),
+            func.coalesce(User.total_earned, 0.0),
+        )
+
+    def is_stale(self) -> bool:
+        return self._refreshed_at is None or time.monotonic() - self._refreshed_at > self.REFRESH_INTERVAL
+
+    async def rebuild(self, session: AsyncSession):
+        """Построить топ с нуля"""
+        # Курсоры фиксируем до чтения топа: всё, что придёт позже, подхватит инкремент
+        self._last_user_id = await session.scalar(select(func.max(User.id))) or 0
+        self._last_transaction_id = await session.scalar(select(func.max(ReferralTransaction.id))) or 0
+
+        rows = []
+        for column in (User.total_referrals, User.total_earned):
+            result = await session.execute(
+                self._columns().where(column > 0).order_by(column.desc()).limit(self.size)
+            )
+            rows.extend(result.all())
+
+        self._entries = {row[0]: LeaderboardEntry(*row) for row in rows}
+        self._refreshed_at = self._rebuilt_at = time.monotonic()
+        logger.debug(f"Referral leaderboard rebuilt: {len(self._entries)} entries")
+
+    async def refresh(self, session: AsyncSession):
+        """Дочитать рефереров, затронутых с прошлого обновления"""
+        if self._rebuilt_at is None or time.monotonic() - self._rebuilt_at > self.FULL_REFRESH_INTERVAL:
+            await self.rebuild(session)
+            return
+
+        touched: set[int] = set()
+
+        result = await session.execute(
+            select(User.id, User.referrer_id).where(User.id > self._last_user_id)
+        )
+        for user_id, referrer_id in result.all():
+            self._last_user_id = max(self._last_user_id, user_id)
+            if referrer_id:
+                touched.add(referrer_id)
+
+        result = await session.execute(
+            select(ReferralTransaction.id, ReferralTransaction.referrer_telegram_id)
+            .where(ReferralTransaction.id > self._last_transaction_id)
+        )
+        for transaction_id, referrer_id in result.all():
+            self._last_transaction_id = max(self._last_transaction_id, transaction_id)
+            touched.add(referrer_id)
+
+        if touched:
+            result = await session.execute(self._columns().where(User.telegram_id.in_(touched)))
+            for row in result.all():
+                self._entries[row[0]] = LeaderboardEntry(*row)
+            self._trim()
+
+        self._refreshed_at = time.monotonic()
+
+    async def ensure_fresh(self, session: AsyncSession):
+        """Обновить топ, если он устарел"""
+        if not self.is_stale():
+            return
+        async with self._lock:
+            if self.is_stale():
+                await self.refresh(session)
+
+    def _trim(self):
+        keep = {entry.telegram_id for entry in self.top_by_referrals()}
+        keep |= {entry.telegram_id for entry in self.top_by_earnings()}
+        self._entries = {telegram_id: self._entries[telegram_id] for telegram_id in keep}
+
+    def top_by_referrals(self, limit: int | None = None) -> list[LeaderboardEntry]:
+        entries = [e for e in self._entries.values() if e.total_referrals > 0]
+        entries.sort(key=lambda e: (-e.total_referrals, -e.total_earned, e.telegram_id))
+        return entries[:limit or self.size]
+
+    def top_by_earnings(self, limit: int | None = None) -> list[LeaderboardEntry]:
+        entries = [e for e in self._entries.values() if e.total_earned > 0]
+        entries.sort(key=lambda e: (-e.total_earned, -e.total_referrals, e.telegram_id))
+        return entries[:limit or self.size]
+
+    def invalidate(self):
+        self._refreshed_at = None
+        self._rebuilt_at = None
+
+
 # Singleton instance
 referral_service = ReferralService()
+referral_leaderboard = ReferralLeaderboard(size=settings.REFERRAL_LEADERBOARD_SIZE)
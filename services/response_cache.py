@@ -0,0 +1,113 @@
+"""
+Кэш ответов API для Flutter-приложения (ETag / 304)
+"""
+import hashlib
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Hashable, Optional
+
+import orjson
+
+from config import settings
+
+
+@dataclass(frozen=True, slots=True)
+class CachedResponse:
+    """Готовый ответ: тело, уже сериализованный JSON и его ETag"""
+    body: dict
+    content: bytes
+    etag: str
+    expires_at: float
+    telegram_id: Optional[int] = None
+
+
+class ResponseCache:
+    """
+    LRU-кэш ответов с TTL и сбросом по пользователю.
+
+    Внутри процесса webhook-сервера кэш сбрасывается сразу при изменении подписки
+    (invalidate_user). Изменения из процесса бота видны не позже чем через ttl секунд.
+    JSON сериализуется один раз при записи — попадания в кэш отдают готовые байты.
+    ETag — хэш этих байт: пока подписка (срок, статус, ссылки) не меняется,
+    он тот же, и клиент получает 304 без тела.
+    """
+
+    def __init__(self, maxsize: int = 10000, ttl: float = 30.0):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._items: OrderedDict[Hashable, CachedResponse] = OrderedDict()
+        self._keys_by_user: dict[int, set[Hashable]] = {}
+
+    @staticmethod
+    def encode(body: dict) -> bytes:
+        return orjson.dumps(body, option=orjson.OPT_SORT_KEYS)
+
+    @staticmethod
+    def make_etag(content: bytes) -> str:
+        return f'"{hashlib.blake2b(content, digest_size=12).hexdigest()}"'
+
+    def get(self, key: Hashable) -> Optional[CachedResponse]:
+        cached = self._items.get(key)
+        if cached is None:
+            return None
+        if cached.expires_at < time.monotonic():
+            self._remove(key)
+            return None
+        self._items.move_to_end(key)
+        return cached
+
+    def put(self, key: Hashable, body: dict, telegram_id: Optional[int] = None) -> CachedResponse:
+        content = self.encode(body)
+        cached = CachedResponse(
+            body=body,
+            content=content,
+            etag=self.make_etag(content),
+            expires_at=time.monotonic() + self.ttl,
+            telegram_id=telegram_id,
+        )
+        self._remove(key)
+        self._items[key] = cached
+        if telegram_id is not None:
+            self._keys_by_user.setdefault(telegram_id, set()).add(key)
+        while len(self._items) > self.maxsize:
+            self._remove(next(iter(self._items)))
+        return cached
+
+    def _remove(self, key: Hashable):
+        """Удалить запись вместе с её ключом в индексе по пользователю"""
+        cached = self._items.pop(key, None)
+        if cached is None or cached.telegram_id is None:
+            return
+        keys = self._keys_by_user.get(cached.telegram_id)
+        if keys is not None:
+            keys.discard(key)
+            if not keys:
+                del self._keys_by_user[cached.telegram_id]
+
+    def invalidate_user(self, telegram_id: int):
+        """Сбросить все ответы пользователя (после оплаты, продления, отмены)"""
+        for key in self._keys_by_user.pop(telegram_id, ()):
+            self._items.pop(key, None)
+
+    def clear(self):
+        self._items.clear()
+        self._keys_by_user.clear()
+
+    def __len__(self) -> int:
+        return len(self._items)
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """Совпадает ли If-None-Match с ETag (учитывает список значений, W/ и *)"""
+    if not if_none_match:
+        return False
+    for value in if_none_match.split(","):
+        value = value.strip()
+        if value == "*" or value.removeprefix("W/") == etag:
+            return True
+    return False
+
+
+# Глобальный кэш ответов о подписках
+subscription_cache = ResponseCache(maxsize=settings.USER_CACHE_SIZE, ttl=settings.API_CACHE_TTL)
@@ -0,0 +1,137 @@
+"""
+Уведомления об изменении подписок внутри процесса webhook-сервера (pub/sub для SSE)
+и их рассылка между воркерами
+"""
+import asyncio
+from contextlib import contextmanager
+from typing import Callable, Iterator
+
+from loguru import logger
+
+
+class SubscriptionEvents:
+    """
+    Подписчики ждут изменений подписки конкретного пользователя.
+
+    Событие — только сигнал «подписка изменилась»: актуальный статус каждый
+    подписчик читает сам (через кэш ответов). Очередь на подписчика размером 1:
+    несколько изменений подряд схлопываются в одно уведомление.
+    """
+
+    def __init__(self):
+        self._waiters: dict[int, set[asyncio.Queue]] = {}
+
+    @contextmanager
+    def subscribe(self, telegram_id: int) -> Iterator[asyncio.Queue]:
+        queue: asyncio.Queue = asyncio.Queue(maxsize=1)
+        self._waiters.setdefault(telegram_id, set()).add(queue)
+        try:
+            yield queue
+        finally:
+            waiters = self._waiters.get(telegram_id)
+            if waiters is not None:
+                waiters.discard(queue)
+                if not waiters:
+                    del self._waiters[telegram_id]
+
+    def publish(self, telegram_id: int) -> int:
+        """Разбудить всех, кто ждёт изменений подписки пользователя. Возвращает их число"""
+        waiters = self._waiters.get(telegram_id, ())
+        for queue in waiters:
+            if queue.empty():
+                queue.put_nowait(telegram_id)
+        if waiters:
+            logger.debug(f"Subscription change for {telegram_id} sent to {len(waiters)} listener(s)")
+        return len(waiters)
+
+    def listeners(self, telegram_id: int | None = None) -> int:
+        """Сколько соединений ждут событий (всего или для одного пользователя)"""
+        if telegram_id is not None:
+            return len(self._waiters.get(telegram_id, ()))
+        return sum(len(waiters) for waiters in self._waiters.values())
+
+
+class MemorySubscriptionRelay:
+    """Изменение видно только текущему процессу (один воркер)"""
+
+    def __init__(self):
+        self._handler: Callable[[int], None] | None = None
+
+    def start(self, handler: Callable[[int], None]):
+        self._handler = handler
+
+    async def publish(self, telegram_id: int):
+        if self._handler is not None:
+            self._handler(telegram_id)
+
+    async def stop(self):
+        self._handler = None
+
+
+class RedisSubscriptionRelay:
+    """
+    Рассылка изменений подписок всем воркерам через Redis pub/sub.
+
+    Каждый воркер (и тот, что принял webhook) получает сообщение и сам вызывает
+    handler — сбрасывает кэш и будит SSE. Если Redis недоступен, изменение
+    применяется хотя бы в текущем воркере.
+    """
+
+    def __init__(self, redis_url: str, channel: str = "subscription_changes"):
+        from redis.asyncio import Redis
+
+        self._redis = Redis.from_url(redis_url)
+        self.channel = channel
+        self._handler: Callable[[int], None] | None = None
+        self._task: asyncio.Task | None = None
+
+    def start(self, handler: Callable[[int], None]):
+        self._handler = handler
+        self._task = asyncio.create_task(self._listen())
+
+    async def publish(self, telegram_id: int):
+        try:
+            await self._redis.publish(self.channel, telegram_id)
+        except Exception as e:
+            logger.warning(f"Subscription change relay: publish failed ({e}), applying locally")
+            if self._handler is not None:
+                self._handler(telegram_id)
+
+    async def _listen(self):
+        while True:
+            try:
+                async with self._redis.pubsub() as pubsub:
+                    await pubsub.subscribe(self.channel)
+                    async for message in pubsub.listen():
+                        if message["type"] == "message":
+                            self._handler(int(message["data"]))
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                # Пока подписки нет, изменения доходят по TTL кэша и тикам SSE
+                logger.warning(f"Subscription change relay: {e}, reconnecting")
+                await asyncio.sleep(1)
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self._redis.aclose()
+
+
+def create_subscription_relay(backend: str, redis_url: str | None = None):
+    """Создать рассылку изменений по имени бэкенда ("memory" или "redis")"""
+    if backend == "redis":
+        try:
+            return RedisSubscriptionRelay(redis_url)
+        except ImportError:
+            logger.warning("redis package is not installed, subscription changes stay within one worker")
+    return MemorySubscriptionRelay()
+
+
+# Глобальная шина событий подписок
+subscription_events = SubscriptionEvents()
@@ -1,13 +1,25 @@
 from datetime import datetime, timedelta
 
-from sqlalchemy import select, and_
+from sqlalchemy import Row, select, and_, or_
 from sqlalchemy.ext.asyncio import AsyncSession
 from database.models import Subscription, SubscriptionStatus
-from services.marzban_service import marzban_service
+from services.marzban_service import marzban_pool
 from loguru import logger
 
 
-from typing import Optional
+from typing import Iterable, Optional
+
+# Колонки подписки для ответов API — читаются без сборки ORM-объектов
+STATUS_COLUMNS = (
+    Subscription.id,
+    Subscription.telegram_id,
+    Subscription.marzban_username,
+    Subscription.subscription_url,
+    Subscription.node,
+    Subscription.plan_type,
+    Subscription.expires_at,
+)
+
 
 class SubscriptionService:
     """Сервис для работы с подписками (VLESS + Reality через Marzban)"""
@@ -42,9 +54,10 @@ class SubscriptionService:
     ) -> Subscription:
         """Создать новую подписку через Marzban (VLESS + Reality)"""
 
-        # Создаём пользователя в Marzban
+        # Создаём пользователя в Marzban на наименее загруженной ноде
+        node = await marzban_pool.pick_node(session)
         try:
-            marzban_user = await marzban_service.create_user(
+            marzban_user = await node.create_user(
                 telegram_id=telegram_id,
                 plan_type=plan_type,
                 first_name=first_name,
@@ -53,7 +66,7 @@ class SubscriptionService:
             marzban_username = marzban_user.get("username")
             subscription_url = marzban_user.get("subscription_url", "")
 
-            logger.info(f"Marzban user created: {marzban_username} for telegram_id={telegram_id}")
+            logger.info(f"Marzban user created: {marzban_username} for telegram_id={telegram_id} on node '{node.name}'")
 
         except Exception as e:
             logger.error(f"Failed to create Marzban user for {telegram_id}: {e}")
@@ -65,6 +78,7 @@ class SubscriptionService:
             user_id=telegram_id,
             marzban_username=marzban_username,
             subscription_url=subscription_url,
+            node=node.name,
             plan_type=plan_type,
             expires_at=self.calculate_expiry_date(plan_type),
             status=SubscriptionStatus.ACTIVE,
@@ -93,6 +107,72 @@ class SubscriptionService:
         )
         return result.scalar_one_or_none()
 
+    async def get_active_status(
+        self, session: AsyncSession, telegram_id: int
+    ) -> Row | None:
+        """Активная подписка пользователя в виде строки STATUS_COLUMNS (для API)"""
+        result = await session.execute(
+            select(*STATUS_COLUMNS)
+            .where(
+                and_(
+                    Subscription.telegram_id == telegram_id,
+                    Subscription.status == SubscriptionStatus.ACTIVE,
+                    Subscription.expires_at > datetime.utcnow()
+                )
+            )
+            .order_by(Subscription.expires_at.desc())
+            .limit(1)
+        )
+        return result.first()
+
+    async def get_status_by_username(
+        self, session: AsyncSession, marzban_username: str
+    ) -> Row | None:
+        """Подписка со статусом ACTIVE по marzban username (срок не проверяется) — строка STATUS_COLUMNS"""
+        result = await session.execute(
+            select(*STATUS_COLUMNS)
+            .where(
+                Subscription.marzban_username == marzban_username,
+                Subscription.status == SubscriptionStatus.ACTIVE
+            )
+            .limit(1)
+        )
+        return result.first()
+
+    async def get_active_subscriptions(
+        self,
+        session: AsyncSession,
+        telegram_ids: Iterable[int] = (),
+        marzban_usernames: Iterable[str] = (),
+    ) -> list[Row]:
+        """
+        Активные подписки сразу для многих пользователей — одним запросом с IN
+        (строки STATUS_COLUMNS). Если у пользователя их несколько, первой идёт
+        самая поздняя по сроку.
+        """
+        telegram_ids = set(telegram_ids)
+        marzban_usernames = set(marzban_usernames)
+        conditions = []
+        if telegram_ids:
+            conditions.append(Subscription.telegram_id.in_(telegram_ids))
+        if marzban_usernames:
+            conditions.append(Subscription.marzban_username.in_(marzban_usernames))
+        if not conditions:
+            return []
+
+        result = await session.execute(
+            select(*STATUS_COLUMNS)
+            .where(
+                and_(
+                    or_(*conditions),
+                    Subscription.status == SubscriptionStatus.ACTIVE,
+                    Subscription.expires_at > datetime.utcnow()
+                )
+            )
+            .order_by(Subscription.expires_at.desc())
+        )
+        return list(result.all())
+
     async def has_used_trial(
         self, session: AsyncSession, telegram_id: int
     ) -> bool:
@@ -120,7 +200,7 @@ class SubscriptionService:
         # Продлеваем в Marzban
         if subscription.marzban_username:
             try:
-                await marzban_service.extend_user(subscription.marzban_username, plan_type, first_name)
+                await marzban_pool.get(subscription.node).extend_user(subscription.marzban_username, plan_type, first_name)
             except Exception as e:
                 logger.error(f"Failed to extend Marzban user: {e}")
                 raise
@@ -156,7 +236,7 @@ class SubscriptionService:
         # Удаляем пользователя из Marzban
         if subscription.marzban_username:
             try:
-                await marzban_service.delete_user(subscription.marzban_username)
+                await marzban_pool.get(subscription.node).delete_user(subscription.marzban_username)
             except Exception as e:
                 logger.error(f"Failed to delete Marzban user: {e}")
 
@@ -173,7 +253,7 @@ class SubscriptionService:
             return {"error": "No Marzban username found"}
 
         try:
-            user_links = await marzban_service.get_user_links(subscription.marzban_username)
+            user_links = await marzban_pool.get(subscription.node).get_user_links(subscription.marzban_username)
             return {
                 "subscription_url": user_links.get("subscription_url", ""),
                 "links": user_links.get("links", []),
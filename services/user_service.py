@@ -1,9 +1,67 @@
-from sqlalchemy import select
+from collections import OrderedDict
+from dataclasses import dataclass
+
+from sqlalchemy import select, update
 from sqlalchemy.ext.asyncio import AsyncSession
 from database.models import User
+from services.referral_service import ReferralService, referral_service
+from config import settings
 from loguru import logger
 
 
+@dataclass(frozen=True, slots=True)
+class UserProfile:
+    """Снимок профильных полей пользователя (то, что приходит из Telegram)"""
+    telegram_id: int
+    username: str | None
+    first_name: str | None
+    last_name: str | None
+    is_admin: bool = False
+
+    @classmethod
+    def from_user(cls, user: User) -> "UserProfile":
+        return cls(
+            telegram_id=user.telegram_id,
+            username=user.username,
+            first_name=user.first_name,
+            last_name=user.last_name,
+            is_admin=bool(user.is_admin),
+        )
+
+
+class UserProfileCache:
+    """Ограниченный LRU-кэш профилей пользователей (write-through)"""
+
+    def __init__(self, maxsize: int = 10000):
+        self.maxsize = maxsize
+        self._items: OrderedDict[int, UserProfile] = OrderedDict()
+
+    def get(self, telegram_id: int) -> UserProfile | None:
+        profile = self._items.get(telegram_id)
+        if profile is not None:
+            self._items.move_to_end(telegram_id)
+        return profile
+
+    def put(self, profile: UserProfile):
+        self._items[profile.telegram_id] = profile
+        self._items.move_to_end(profile.telegram_id)
+        while len(self._items) > self.maxsize:
+            self._items.popitem(last=False)
+
+    def invalidate(self, telegram_id: int):
+        self._items.pop(telegram_id, None)
+
+    def clear(self):
+        self._items.clear()
+
+    def __len__(self) -> int:
+        return len(self._items)
+
+
+# Глобальный кэш профилей
+user_cache = UserProfileCache(maxsize=settings.USER_CACHE_SIZE)
+
+
 class UserService:
     """Сервис для работы с пользователями"""
 
@@ -29,18 +87,79 @@ class UserService:
                 first_name=first_name,
                 last_name=last_name,
                 referrer_id=referrer_id,
+                referral_code=ReferralService.generate_referral_code(telegram_id),
             )
             session.add(user)
             await session.flush()
+            if referrer_id:
+                await referral_service.register_referral(session, referrer_id, telegram_id)
             logger.info(f"New user created: {telegram_id} (@{username}), referrer: {referrer_id}")
-        else:
-            # Обновляем данные пользователя
+        elif (user.username, user.first_name, user.last_name) != (username, first_name, last_name):
+            # Обновляем данные пользователя только если они изменились
             user.username = username
             user.first_name = first_name
             user.last_name = last_name
 
+        user_cache.put(UserProfile.from_user(user))
         return user
 
+    @staticmethod
+    async def sync_profile(
+        session: AsyncSession,
+        telegram_id: int,
+        username: str | None = None,
+        first_name: str | None = None,
+        last_name: str | None = None,
+        referrer_id: int | None = None,
+        is_admin: bool = False,
+    ) -> UserProfile:
+        """
+        Синхронизировать профиль пользователя с данными из Telegram.
+
+        Если профиль в кэше совпадает с пришедшими данными — в БД не ходим вообще.
+        Запись в БД происходит только при реальном изменении полей.
+        Флаг is_admin только выставляется (как и раньше в /start), но не снимается.
+        """
+        cached = user_cache.get(telegram_id)
+        if cached is not None:
+            wanted = UserProfile(
+                telegram_id=telegram_id,
+                username=username,
+                first_name=first_name,
+                last_name=last_name,
+                is_admin=cached.is_admin or is_admin,
+            )
+            if wanted == cached:
+                return cached
+
+            await session.execute(
+                update(User)
+                .where(User.telegram_id == telegram_id)
+                .values(
+                    username=username,
+                    first_name=first_name,
+                    last_name=last_name,
+                    is_admin=wanted.is_admin,
+                )
+            )
+            user_cache.put(wanted)
+            return wanted
+
+        user = await UserService.get_or_create_user(
+            session,
+            telegram_id=telegram_id,
+            username=username,
+            first_name=first_name,
+            last_name=last_name,
+            referrer_id=referrer_id,
+        )
+        if is_admin and not user.is_admin:
+            user.is_admin = True
+
+        profile = UserProfile.from_user(user)
+        user_cache.put(profile)
+        return profile
+
     @staticmethod
     async def get_user_by_telegram_id(
         session: AsyncSession, telegram_id: int
@@ -51,30 +170,31 @@ class UserService:
         )
         return result.scalar_one_or_none()
 
+    @staticmethod
+    def is_admin_id(telegram_id: int) -> bool:
+        """Проверить по конфигу, является ли пользователь администратором (без БД)"""
+        return telegram_id in settings.admin_ids
+
     @staticmethod
     async def is_admin(session: AsyncSession, telegram_id: int) -> bool:
         """Проверить, является ли пользователь администратором"""
+        if UserService.is_admin_id(telegram_id):
+            return True
+
+        cached = user_cache.get(telegram_id)
+        if cached is not None:
+            return cached.is_admin
+
         user = await UserService.get_user_by_telegram_id(session, telegram_id)
         return user.is_admin if user else False
 
     @staticmethod
-    async def accrue_referral_bonus(session: AsyncSession, user_id: int, amount: float):
-        """Начислить реферальный бонус пригласившему"""
-        from config import settings
-        
-        user = await UserService.get_user_by_telegram_id(session, user_id)
-        if not user or not user.referrer_id:
-            return
-
-        referrer = await UserService.get_user_by_telegram_id(session, user.referrer_id)
-        if not referrer:
-            return
-
-        bonus = amount * settings.REFERRAL_PERCENT
-        referrer.balance += bonus
-        session.add(referrer)
-        
-        logger.info(f"Referral bonus {bonus} accrued to {referrer.telegram_id} for user {user_id}")
-        
-        # Можно отправить уведомление рефереру, но нужен bot экземпляр
-        # Это лучше делать в handler слое
+    async def debit_balance(session: AsyncSession, telegram_id: int, amount: float) -> bool:
+        """Атомарно списать сумму с баланса. False — недостаточно средств"""
+        result = await session.execute(
+            update(User)
+            .where(User.telegram_id == telegram_id, User.balance >= amount)
+            .values(balance=User.balance - amount)
+            .execution_options(synchronize_session=False)
+        )
+        return result.rowcount == 1
@@ -2,53 +2,133 @@
 Shadowsocks API для управления пользователями
 Использует ss-manager для динамического управления портами
 """
+import argparse
 import asyncio
 import json
-import socket
-from typing import Dict, Optional
-from pathlib import Path
+import secrets
+import time
+from array import array
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Callable, Dict, Iterable, Optional
 from loguru import logger
 from config import settings
 
 
+class _ManagerProtocol(asyncio.DatagramProtocol):
+    """Приём ответов ss-manager на постоянном UDP-сокете"""
+
+    def __init__(self, manager: "ShadowsocksManager"):
+        self.manager = manager
+        self.transport: asyncio.DatagramTransport | None = None
+
+    def connection_made(self, transport: asyncio.DatagramTransport):
+        self.transport = transport
+
+    def _is_current(self) -> bool:
+        # События уже закрытого (пересозданного) сокета игнорируем
+        return self.transport is not None and self.manager._transport is self.transport
+
+    def datagram_received(self, data: bytes, addr):
+        if self._is_current():
+            self.manager._on_response(data)
+
+    def error_received(self, exc: Exception):
+        # Например ICMP port unreachable — ss-manager не запущен
+        if self._is_current():
+            self.manager._reset(exc)
+
+    def connection_lost(self, exc: Exception | None):
+        if self._is_current():
+            self.manager._reset(exc or ConnectionResetError("SS-Manager socket closed"))
+
+
 class ShadowsocksManager:
-    """Менеджер для управления Shadowsocks через ss-manager"""
+    """
+    Менеджер для управления Shadowsocks через ss-manager.
+
+    Команды идут через один постоянный UDP-сокет и могут выполняться параллельно
+    (не больше max_in_flight одновременно). ss-manager отвечает на команды по очереди
+    и без идентификаторов, поэтому ответ сопоставляется с самым старым ожидающим
+    запросом (FIFO). Если ответ не пришёл за timeout, очередь уже нельзя
+    сопоставить достоверно: сокет пересоздаётся, а остальные ожидающие команды
+    завершаются ошибкой (возвращают None).
+    """
 
-    def __init__(self, manager_address: str = "127.0.0.1:6001"):
+    def __init__(self, manager_address: str = "127.0.0.1:6001", timeout: float = 5.0, max_in_flight: int = 32):
         """
         Args:
             manager_address: Адрес ss-manager в формате "host:port"
+            timeout: Таймаут ожидания ответа на команду, секунд
+            max_in_flight: Сколько команд может ждать ответа одновременно
         """
         host, port = manager_address.split(":")
         self.manager_host = host
         self.manager_port = int(port)
-        self.timeout = 5
-
-    async def send_command(self, command: Dict) -> Optional[Dict]:
+        self.timeout = timeout
+
+        self._transport: asyncio.DatagramTransport | None = None
+        self._pending: deque[asyncio.Future] = deque()
+        self._connect_lock = asyncio.Lock()
+        self._slots = asyncio.Semaphore(max_in_flight)
+
+    async def _get_transport(self) -> asyncio.DatagramTransport:
+        """Постоянный сокет до ss-manager (создаётся при первой команде)"""
+        if self._transport is not None:
+            return self._transport
+        async with self._connect_lock:
+            if self._transport is None:
+                loop = asyncio.get_running_loop()
+                self._transport, _ = await loop.create_datagram_endpoint(
+                    lambda: _ManagerProtocol(self),
+                    remote_addr=(self.manager_host, self.manager_port),
+                )
+        return self._transport
+
+    def _on_response(self, data: bytes):
+        if not self._pending:
+            logger.warning(f"SS-Manager unexpected response: {data[:200]!r}")
+            return
+        future = self._pending.popleft()
+        if not future.done():
+            future.set_result(data)
+
+    def _reset(self, exc: Exception):
+        """Закрыть сокет и завершить ошибкой все ожидающие команды"""
+        transport, self._transport = self._transport, None
+        pending, self._pending = self._pending, deque()
+        for future in pending:
+            if not future.done():
+                future.set_exception(exc)
+        if transport is not None:
+            transport.close()
+
+    async def send_command(self, command: Dict, timeout: float | None = None) -> Optional[Dict]:
         """Отправить команду ss-manager"""
-        try:
-            # Создаем UDP socket
-            sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
-            sock.settimeout(self.timeout)
-
-            # Отправляем команду
-            message = json.dumps(command).encode('utf-8')
-            sock.sendto(message, (self.manager_host, self.manager_port))
-
-            # Получаем ответ
-            data, _ = sock.recvfrom(4096)
-            sock.close()
-
-            response = json.loads(data.decode('utf-8'))
-            logger.debug(f"SS-Manager response: {response}")
-            return response
-
-        except socket.timeout:
-            logger.error("SS-Manager timeout")
-            return None
-        except Exception as e:
-            logger.error(f"SS-Manager error: {e}")
-            return None
+        async with self._slots:
+            try:
+                payload = json.dumps(command).encode('utf-8')
+                transport = await self._get_transport()
+
+                # Ожидание ставим в очередь только после успешной отправки:
+                # лишний future сдвинул бы сопоставление ответов по порядку
+                transport.sendto(payload)
+                future = asyncio.get_running_loop().create_future()
+                self._pending.append(future)
+
+                data = await asyncio.wait_for(future, timeout or self.timeout)
+
+                response = json.loads(data.decode('utf-8'))
+                logger.debug(f"SS-Manager response: {response}")
+                return response
+
+            except asyncio.TimeoutError:
+                logger.error("SS-Manager timeout")
+                self._reset(ConnectionResetError("SS-Manager response lost"))
+                return None
+            except Exception as e:
+                logger.error(f"SS-Manager error: {e}")
+                return None
 
     async def add_port(self, port: int, password: str) -> bool:
         """Добавить новый порт с паролем"""
@@ -77,9 +157,20 @@ class ShadowsocksManager:
         logger.error(f"Failed to remove port {port}: {response}")
         return False
 
-    async def ping(self) -> bool:
+    async def add_ports(self, ports: Dict[int, str]) -> Dict[int, bool]:
+        """Добавить пачку портов {port: password}, команды отправляются без ожидания друг друга"""
+        results = await asyncio.gather(*(self.add_port(port, password) for port, password in ports.items()))
+        return dict(zip(ports, results))
+
+    async def remove_ports(self, ports: Iterable[int]) -> Dict[int, bool]:
+        """Удалить пачку портов, команды отправляются без ожидания друг друга"""
+        ports = list(ports)
+        results = await asyncio.gather(*(self.remove_port(port) for port in ports))
+        return dict(zip(ports, results))
+
+    async def ping(self, timeout: float | None = None) -> bool:
         """Проверить доступность ss-manager"""
-        response = await self.send_command({"ping": None})
+        response = await self.send_command({"ping": None}, timeout=timeout)
         return response is not None and response.get("stat") == "ok"
 
     async def list_ports(self) -> Optional[Dict]:
@@ -87,6 +178,21 @@ class ShadowsocksManager:
         response = await self.send_command({"list": None})
         return response if response else None
 
+    async def get_ports(self) -> Optional[Dict[int, str]]:
+        """Открытые порты ss-manager {port: password}; None — ss-manager не ответил"""
+        response = await self.list_ports()
+        if response is None:
+            return None
+        return {
+            int(port): password
+            for port, password in response.items()
+            if str(port).isdigit()  # служебные поля ответа (stat) пропускаем
+        }
+
+    async def close(self):
+        """Закрыть сокет (при остановке приложения)"""
+        self._reset(ConnectionResetError("SS-Manager client closed"))
+
 
 # Глобальный экземпляр менеджера
 ss_manager = ShadowsocksManager()
@@ -131,42 +237,292 @@ async def create_user_config(port: int, password: str, method: str = "chacha20-i
 
 async def delete_user_config(port: int) -> bool:
     """Удалить конфигурацию пользователя"""
-    return await ss_manager.remove_port(port)
+    removed = await ss_manager.remove_port(port)
+    if removed:
+        release_port(port)
+    return removed
 
 
-async def get_available_port() -> int:
+class PortAllocator:
     """
-    Получить свободный порт для нового пользователя
-    Начинаем с 10000 и ищем свободный
+    Аллокатор портов ss-manager.
+
+    Занятость хранится в bytearray (байт на порт, ~50 КБ на весь диапазон),
+    свободные порты — в стеке array('H'). allocate/release — O(1) без обхода диапазона.
+    Порт из стека, который успели занять через reserve(), пропускается при выдаче.
+    Всё синхронно, поэтому внутри одного event loop выдача атомарна; между процессами
+    порт окончательно закрепляет уникальный индекс subscriptions.ss_port.
     """
+
+    def __init__(self, start: int = 10000, end: int = 60000):
+        self.start = start
+        self.end = end  # не включительно
+        self._used = bytearray(end - start)
+        self._free = array("H")
+        self._free_count = 0
+        self.ready = False
+
+    def rebuild(self, used_ports: Iterable[int]):
+        """Перестроить состояние по занятым портам (из БД)"""
+        self._used = bytearray(self.end - self.start)
+        for port in used_ports:
+            if port is not None and self.start <= port < self.end:
+                self._used[port - self.start] = 1
+
+        # Стек: наверху — меньшие порты, чтобы выдача шла по возрастанию, как раньше
+        self._free = array("H", (
+            offset for offset in range(self.end - self.start - 1, -1, -1) if not self._used[offset]
+        ))
+        self._free_count = len(self._free)
+        self.ready = True
+
+    def allocate(self) -> int:
+        """Выдать свободный порт"""
+        while self._free:
+            offset = self._free.pop()
+            if not self._used[offset]:
+                self._used[offset] = 1
+                self._free_count -= 1
+                return self.start + offset
+
+        raise Exception("No available ports")
+
+    def reserve(self, port: int) -> bool:
+        """Пометить конкретный порт занятым. False — уже занят"""
+        offset = port - self.start
+        if not 0 <= offset < len(self._used) or self._used[offset]:
+            return False
+        self._used[offset] = 1
+        self._free_count -= 1
+        return True
+
+    def release(self, port: int):
+        """Вернуть порт в пул"""
+        offset = port - self.start
+        if 0 <= offset < len(self._used) and self._used[offset]:
+            self._used[offset] = 0
+            self._free.append(offset)
+            self._free_count += 1
+
+    def __contains__(self, port: int) -> bool:
+        offset = port - self.start
+        return 0 <= offset < len(self._used) and bool(self._used[offset])
+
+    @property
+    def free_count(self) -> int:
+        return self._free_count
+
+
+# Глобальный аллокатор портов
+port_allocator = PortAllocator()
+_port_allocator_lock = asyncio.Lock()
+
+
+async def _load_used_ports() -> list[int]:
     from database.database import AsyncSessionLocal
     from database.models import Subscription
     from sqlalchemy import select
 
     async with AsyncSessionLocal() as session:
-        # Получаем все используемые порты
         result = await session.execute(
-            select(Subscription.ss_port)
+            select(Subscription.ss_port).where(Subscription.ss_port.is_not(None))
         )
-        used_ports = {row[0] for row in result.fetchall()}
+        return list(result.scalars().all())
 
-    # Ищем свободный порт в диапазоне 10000-60000
-    for port in range(10000, 60000):
-        if port not in used_ports:
-            return port
 
-    raise Exception("No available ports")
+async def rebuild_port_allocator():
+    """Загрузить занятые порты из БД (при старте)"""
+    async with _port_allocator_lock:
+        port_allocator.rebuild(await _load_used_ports())
+
+    logger.info(f"Port allocator ready: {port_allocator.free_count} free ports")
+
+
+async def get_available_port() -> int:
+    """
+    Получить свободный порт для нового пользователя (диапазон 10000-60000).
+    Порт сразу помечается занятым; если он не понадобился — вернуть через release_port.
+    Для подписок использовать provision_subscription — он сохраняет порт в БД.
+    """
+    if not port_allocator.ready:
+        async with _port_allocator_lock:
+            if not port_allocator.ready:
+                port_allocator.rebuild(await _load_used_ports())
+    return port_allocator.allocate()
+
+
+def release_port(port: int):
+    """Вернуть порт в пул (после удаления пользователя или неудачного создания)"""
+    port_allocator.release(port)
+
+
+async def provision_subscription(session, subscription, method: str = "chacha20-ietf-poly1305") -> Dict:
+    """
+    Выдать подписке порт и пароль и открыть порт в ss-manager.
+
+    Порт и пароль сразу записываются в subscriptions (ss_port/ss_password) — это
+    источник истины для sync_ss_manager. Коммит — на вызывающем.
+    """
+    from sqlalchemy.exc import IntegrityError
+
+    port = await get_available_port()
+    password = secrets.token_urlsafe(16)
+    try:
+        async with session.begin_nested():
+            subscription.ss_port = port
+            subscription.ss_password = password
+            await session.flush()
+        return await create_user_config(port, password, method)
+    except Exception as e:
+        subscription.ss_port = None
+        subscription.ss_password = None
+        if isinstance(e, IntegrityError):
+            # Порт уже записан в БД другим процессом — аллокатор отстал, пересобрать при следующей выдаче
+            port_allocator.ready = False
+        else:
+            release_port(port)
+        raise
+
+
+async def deprovision_subscription(session, subscription) -> bool:
+    """Закрыть порт подписки в ss-manager и освободить его в БД"""
+    if subscription.ss_port is None:
+        return True
+    removed = await delete_user_config(subscription.ss_port)
+    subscription.ss_port = None
+    subscription.ss_password = None
+    await session.flush()
+    return removed
+
+
+@dataclass
+class SyncReport:
+    """Итог синхронизации ss-manager с БД"""
+    total: int = 0  # Сколько команд нужно было отправить
+    to_remove: list[int] = field(default_factory=list)
+    to_add: list[int] = field(default_factory=list)
+    stale: list[int] = field(default_factory=list)  # Открыты, но активной подписки нет (удаляются только с prune)
+    dry_run: bool = False
+    added: list[int] = field(default_factory=list)
+    removed: list[int] = field(default_factory=list)
+    failed: list[int] = field(default_factory=list)
+    elapsed: float = 0.0
+
+    @property
+    def done(self) -> int:
+        return len(self.added) + len(self.removed) + len(self.failed)
+
+
+async def _load_active_ports() -> Dict[int, str]:
+    from datetime import datetime
+    from database.database import AsyncSessionLocal
+    from database.models import Subscription, SubscriptionStatus
+    from sqlalchemy import select
+
+    async with AsyncSessionLocal() as session:
+        result = await session.execute(
+            select(Subscription.ss_port, Subscription.ss_password).where(
+                Subscription.status == SubscriptionStatus.ACTIVE,
+                Subscription.expires_at > datetime.utcnow(),
+                Subscription.ss_port.is_not(None),
+                Subscription.ss_password.is_not(None),
+            )
+        )
+        return dict(result.all())
+
+
+async def sync_ss_manager(
+    manager: ShadowsocksManager | None = None,
+    batch_size: int = 200,
+    progress: Callable[[SyncReport], None] | None = None,
+    prune: bool = False,
+    dry_run: bool = False,
+) -> SyncReport | None:
+    """
+    Привести порты ss-manager в соответствие с активными подписками.
+
+    Сравнивает list с БД и отправляет только разницу: добавляет недостающие порты
+    и порты со сменившимся паролем (через remove + add). Порты без активной подписки
+    удаляются только при prune=True — и никогда, если в БД нет ни одной активной
+    подписки (пустая или чужая база не должна закрыть порты всем пользователям).
+    dry_run — только посчитать и вернуть план, ничего не отправляя.
+    Команды внутри пачки идут параллельно (ограничено max_in_flight менеджера),
+    после каждой пачки вызывается progress.
+
+    Returns:
+        SyncReport или None, если ss-manager не ответил на list
+    """
+    manager = manager or ss_manager
+    started = time.monotonic()
+
+    current = await manager.get_ports()
+    if current is None:
+        logger.error("SS-Manager sync: can't get port list")
+        return None
+    wanted = await _load_active_ports()
+
+    stale = [port for port in current if port not in wanted]
+    changed = [port for port in current if port in wanted and current[port] != wanted[port]]
+    to_add = {port: password for port, password in wanted.items() if current.get(port) != password}
+
+    if prune and stale and not wanted:
+        logger.error(f"SS-Manager sync: no active subscriptions in DB, refusing to prune {len(stale)} open ports")
+        prune = False
+    to_remove = changed + stale if prune else changed
+
+    report = SyncReport(
+        total=len(to_remove) + len(to_add),
+        to_remove=to_remove,
+        to_add=list(to_add),
+        stale=stale,
+        dry_run=dry_run,
+    )
+    logger.info(
+        f"SS-Manager sync{' (dry run)' if dry_run else ''}: {len(current)} open, {len(wanted)} active, "
+        f"{len(to_remove)} to remove, {len(to_add)} to add, {len(stale)} stale"
+        f"{'' if prune else ' (kept, no prune)'}"
+    )
+    if dry_run:
+        return report
+
+    # Сначала удаления: порт со сменившимся паролем должен освободиться до повторного add
+    for i in range(0, len(to_remove), batch_size):
+        results = await manager.remove_ports(to_remove[i:i + batch_size])
+        for port, ok in results.items():
+            (report.removed if ok else report.failed).append(port)
+        if progress:
+            progress(report)
+
+    add_items = list(to_add.items())
+    for i in range(0, len(add_items), batch_size):
+        results = await manager.add_ports(dict(add_items[i:i + batch_size]))
+        for port, ok in results.items():
+            (report.added if ok else report.failed).append(port)
+        if progress:
+            progress(report)
+
+    report.elapsed = time.monotonic() - started
+    logger.info(
+        f"SS-Manager sync done in {report.elapsed:.1f}s: "
+        f"+{len(report.added)} -{len(report.removed)}, failed {len(report.failed)}"
+    )
+    return report
 
 
 async def init_ss_manager():
     """Инициализация ss-manager"""
     logger.info("Checking ss-manager availability...")
 
+    # Занятые порты — из БД, дальше выдача без сканирования диапазона
+    await rebuild_port_allocator()
+
     # Проверяем доступность ss-manager
     retries = 5
     for i in range(retries):
-        if await ss_manager.ping():
+        if await ss_manager.ping(timeout=2):
             logger.info("SS-Manager is ready")
+            # После рестарта ss-manager порты пропадают — восстанавливаем из БД
+            await sync_ss_manager()
             return True
 
         logger.warning(f"SS-Manager not ready, retry {i+1}/{retries}")
@@ -174,3 +530,20 @@ async def init_ss_manager():
 
     logger.error("SS-Manager is not available")
     return False
+
+
+if __name__ == "__main__":
+    # Ручная синхронизация после перезапуска ноды: python shadowsocks_api.py [--dry-run] [--prune]
+    parser = argparse.ArgumentParser(description="Синхронизировать порты ss-manager с активными подписками")
+    parser.add_argument("--dry-run", action="store_true", help="только показать, что будет сделано")
+    parser.add_argument("--prune", action="store_true", help="закрыть порты без активной подписки")
+    args = parser.parse_args()
+
+    def print_progress(report: SyncReport):
+        logger.info(f"SS-Manager sync progress: {report.done}/{report.total}")
+
+    result = asyncio.run(sync_ss_manager(progress=print_progress, prune=args.prune, dry_run=args.dry_run))
+    if result is not None and result.dry_run:
+        logger.info(f"Would remove: {result.to_remove}")
+        logger.info(f"Would add: {result.to_add}")
+        logger.info(f"Stale (open without active subscription): {result.stale}")
@@ -84,8 +84,14 @@ async def test_admin(test_session):
 @pytest.fixture
 def mock_marzban():
     """Mock MarzbanService for testing without real API calls"""
-    # Patch where marzban_service is imported/used, not where it's defined
-    with patch("services.subscription_service.marzban_service") as mock:
+    # Patch where marzban_pool is imported/used, not where it's defined;
+    # every node of the pool is the same mock
+    with patch("services.subscription_service.marzban_pool") as pool:
+        mock = MagicMock()
+        mock.name = "main"
+        pool.pick_node = AsyncMock(return_value=mock)
+        pool.get = MagicMock(return_value=mock)
+
         # Mock create_user response
         mock.create_user = AsyncMock(return_value={
             "username": "FreedomVPN_test_abc1",
@@ -0,0 +1,108 @@
+# Tests for API key auth and rate limiting of the webhook server
+import httpx
+import pytest
+from fastapi import Depends, FastAPI
+
+from services.api_auth import APIKeyAuth, RateLimit
+from services.rate_limiter import MemoryRateLimitStorage
+
+
+def make_client(**kwargs) -> httpx.AsyncClient:
+    auth = APIKeyAuth(
+        "test",
+        keys=lambda: ("key-one", "key-two"),
+        storage=MemoryRateLimitStorage(),
+        **kwargs,
+    )
+    app = FastAPI()
+
+    @app.get("/ping", dependencies=[Depends(auth)])
+    async def ping():
+        return {"ok": True}
+
+    return httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test")
+
+
+class TestAPIKeyAuth:
+    """Test suite for APIKeyAuth"""
+
+    @pytest.mark.asyncio
+    async def test_header_keys(self):
+        """Any configured key is accepted from the header"""
+        async with make_client() as client:
+            assert (await client.get("/ping", headers={"X-API-Key": "key-one"})).status_code == 200
+            assert (await client.get("/ping", headers={"X-API-Key": "key-two"})).status_code == 200
+            assert (await client.get("/ping", headers={"X-API-Key": "key-three"})).status_code == 403
+            assert (await client.get("/ping")).status_code == 403
+
+    @pytest.mark.asyncio
+    async def test_query_key_fallback(self):
+        """Query key works only when the fallback is enabled"""
+        async with make_client() as client:
+            assert (await client.get("/ping", params={"api_key": "key-one"})).status_code == 403
+        async with make_client(allow_query_key=True) as client:
+            assert (await client.get("/ping", params={"api_key": "key-one"})).status_code == 200
+
+    def test_empty_key_never_matches(self):
+        auth = APIKeyAuth("test", keys=lambda: ("",), storage=MemoryRateLimitStorage())
+
+        assert auth.match("") is False
+        assert auth.match(None) is False
+
+    @pytest.mark.asyncio
+    async def test_key_rate_limit(self):
+        """Key bucket is shared by all requests with that key"""
+        async with make_client(key_limit=RateLimit(capacity=2, refill_rate=0.1)) as client:
+            headers = {"X-API-Key": "key-one"}
+            statuses = [(await client.get("/ping", headers=headers)).status_code for _ in range(3)]
+            other = await client.get("/ping", headers={"X-API-Key": "key-two"})
+
+        assert statuses == [200, 200, 429]
+        assert other.status_code == 200
+
+    @pytest.mark.asyncio
+    async def test_ip_rate_limit_before_auth(self):
+        """Bad keys still spend the IP bucket"""
+        async with make_client(ip_limit=RateLimit(capacity=2, refill_rate=0.1)) as client:
+            await client.get("/ping", headers={"X-API-Key": "wrong"})
+            await client.get("/ping", headers={"X-API-Key": "wrong"})
+            response = await client.get("/ping", headers={"X-API-Key": "key-one"})
+
+        assert response.status_code == 429
+        assert response.headers["Retry-After"] == "10"
+
+
+class TestRestrictedEndpoints:
+    """Admin and internal endpoints need their own keys, not the Flutter app key"""
+
+    @pytest.mark.asyncio
+    async def test_leaderboard_requires_admin_key(self, monkeypatch):
+        from config import settings
+        import webhook
+
+        monkeypatch.setattr(settings, "ADMIN_API_KEY", "admin-key")
+        monkeypatch.setitem(settings.__dict__, "flutter_api_keys", frozenset({"app-key"}))
+
+        transport = httpx.ASGITransport(app=webhook.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            response = await client.get("/api/referrals/leaderboard", headers={"X-API-Key": "app-key"})
+
+        assert response.status_code == 403
+        assert webhook.admin_auth.match("admin-key") is True
+
+    @pytest.mark.asyncio
+    async def test_metrics_requires_key(self, monkeypatch):
+        """/metrics is closed without METRICS_KEY and accepts it as a bearer token"""
+        from config import settings
+        import webhook
+
+        transport = httpx.ASGITransport(app=webhook.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            assert (await client.get("/metrics")).status_code == 403
+
+            monkeypatch.setattr(settings, "METRICS_KEY", "scrape-key")
+            assert (await client.get("/metrics")).status_code == 403
+            response = await client.get("/metrics", headers={"Authorization": "Bearer scrape-key"})
+
+        assert response.status_code == 200
+        assert b"freedomvpn_" in response.content
@@ -0,0 +1,48 @@
+# Tests for webhook worker lifecycle (drain on shutdown)
+import asyncio
+import os
+import signal
+
+import pytest
+
+from services.lifecycle import WorkerLifecycle
+
+
+class TestWorkerLifecycle:
+    """Test suite for WorkerLifecycle"""
+
+    @pytest.mark.asyncio
+    async def test_wait_idle_waits_for_in_flight(self):
+        """Shutdown waits until tracked webhooks are done"""
+        lifecycle = WorkerLifecycle()
+        release = asyncio.Event()
+
+        async def webhook():
+            async with lifecycle.track():
+                await release.wait()
+
+        task = asyncio.create_task(webhook())
+        await asyncio.sleep(0)
+        assert lifecycle.in_flight == 1
+        assert await lifecycle.wait_idle(0.05) is False
+
+        release.set()
+        assert await lifecycle.wait_idle(1) is True
+        await task
+        assert lifecycle.in_flight == 0
+
+    @pytest.mark.asyncio
+    async def test_sigterm_starts_draining(self):
+        """SIGTERM sets the draining flag and reaches the previous handler"""
+        received = []
+        original = signal.signal(signal.SIGTERM, lambda s, f: received.append(s))
+        lifecycle = WorkerLifecycle()
+        try:
+            lifecycle.install_signal_handlers()
+            os.kill(os.getpid(), signal.SIGTERM)
+            await asyncio.wait_for(lifecycle.draining.wait(), timeout=1)
+        finally:
+            lifecycle.restore_signal_handlers()
+            signal.signal(signal.SIGTERM, original)
+
+        assert received == [signal.SIGTERM]
@@ -4,7 +4,7 @@ from datetime import datetime, timedelta
 from unittest.mock import AsyncMock, patch, MagicMock
 import httpx
 
-from services.marzban_service import MarzbanService
+from services.marzban_service import MarzbanService, MarzbanPool
 
 
 class TestMarzbanService:
@@ -201,3 +201,54 @@ class TestMarzbanService:
         
         assert "api.qrserver.com" in result
         assert "vless" in result
+
+
+class TestMarzbanPool:
+    """Test suite for MarzbanPool placement"""
+
+    def node(self, name, users_active=0, max_users=0, fail=False):
+        node = MarzbanService(base_url=f"https://{name}.example.com", name=name, max_users=max_users)
+        if fail:
+            node.get_system_stats = AsyncMock(side_effect=httpx.ConnectError("down"))
+        else:
+            node.get_system_stats = AsyncMock(return_value={"users_active": users_active})
+        return node
+
+    @pytest.mark.asyncio
+    async def test_single_node_skips_stats(self):
+        """With one node no stats are requested"""
+        node = self.node("main")
+        pool = MarzbanPool([node])
+
+        assert await pool.pick_node() is node
+        node.get_system_stats.assert_not_called()
+
+    @pytest.mark.asyncio
+    async def test_pick_least_loaded(self):
+        """Node with the lowest fill ratio wins, placements are counted locally"""
+        big = self.node("big", users_active=300, max_users=1000)
+        small = self.node("small", users_active=50, max_users=100)
+        pool = MarzbanPool([small, big])
+
+        assert await pool.pick_node() is big
+        assert pool.load("big").users_active == 301
+        big.get_system_stats.assert_called_once()
+
+    @pytest.mark.asyncio
+    async def test_skip_full_and_unavailable(self):
+        """Full and unreachable nodes are used only as a last resort"""
+        full = self.node("full", users_active=100, max_users=100)
+        down = self.node("down", fail=True)
+        busy = self.node("busy", users_active=90, max_users=100)
+        pool = MarzbanPool([full, down, busy])
+
+        assert await pool.pick_node() is busy
+
+    def test_get_unknown_node_falls_back_to_default(self):
+        """Subscriptions without a node live on the default node"""
+        first, second = self.node("first"), self.node("second")
+        pool = MarzbanPool([first, second])
+
+        assert pool.get(None) is first
+        assert pool.get("second") is second
+        assert pool.get("removed") is first
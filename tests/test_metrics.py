@@ -0,0 +1,132 @@
+# Tests for Prometheus metrics helpers
+from types import SimpleNamespace
+
+import pytest
+from prometheus_client import REGISTRY
+
+from bot.middlewares import MetricsMiddleware
+from services.metrics import observe_external, render_metrics, statement_kind, track_queries
+
+
+def sample(name: str, **labels) -> float:
+    return REGISTRY.get_sample_value(name, labels) or 0.0
+
+
+class TestMetrics:
+    """Test suite for metrics helpers"""
+
+    def test_observe_external_counts_errors(self):
+        """Failed calls are timed and counted as errors"""
+        labels = {"service": "test", "target": "node", "operation": "GET /x"}
+        errors = sample("freedomvpn_external_request_errors_total", **labels)
+        calls = sample("freedomvpn_external_request_seconds_count", **labels)
+
+        with observe_external("test", "GET /x", "node"):
+            pass
+        with pytest.raises(RuntimeError):
+            with observe_external("test", "GET /x", "node"):
+                raise RuntimeError("boom")
+
+        assert sample("freedomvpn_external_request_seconds_count", **labels) == calls + 2
+        assert sample("freedomvpn_external_request_errors_total", **labels) == errors + 1
+
+    @pytest.mark.parametrize("statement, kind", [
+        ("SELECT 1", "SELECT"),
+        ("  insert into users values (1)", "INSERT"),
+        ("WITH RECURSIVE t AS (SELECT 1) SELECT * FROM t", "WITH"),
+        ("PRAGMA table_info(users)", "OTHER"),
+        ("", "OTHER"),
+    ])
+    def test_statement_kind(self, statement, kind):
+        assert statement_kind(statement) == kind
+
+    @pytest.mark.asyncio
+    async def test_db_queries_observed(self):
+        """Queries through the app engine are timed"""
+        from sqlalchemy import text
+        from database.database import engine
+
+        before = sample("freedomvpn_db_query_seconds_count", statement="SELECT")
+        async with engine.connect() as conn:
+            await conn.execute(text("SELECT 1"))
+
+        assert sample("freedomvpn_db_query_seconds_count", statement="SELECT") == before + 1
+
+    @pytest.mark.asyncio
+    async def test_track_queries(self, monkeypatch):
+        """Queries are counted per scope and slow ones are logged with the scope name"""
+        from loguru import logger
+        from sqlalchemy import text
+        from config import settings
+        from database.database import engine
+
+        messages = []
+        sink = logger.add(messages.append, level="WARNING", format="{message}")
+        monkeypatch.setattr(settings, "SLOW_QUERY_MS", 0.0)
+        try:
+            with track_queries("message:cmd_start") as stats:
+                async with engine.connect() as conn:
+                    await conn.execute(text("SELECT 1"))
+                    await conn.execute(text("SELECT 2"))
+            async with engine.connect() as conn:
+                await conn.execute(text("SELECT 3"))
+        finally:
+            logger.remove(sink)
+
+        assert stats.queries == 2
+        assert stats.seconds > 0
+        assert any("in message:cmd_start: SELECT 1" in m for m in messages)
+        assert any("in -: SELECT 3" in m for m in messages)
+
+    @pytest.mark.asyncio
+    async def test_webhook_logs_route_template(self, monkeypatch):
+        """Per-request query count is logged under the route template, not the raw URL"""
+        import httpx
+        from loguru import logger
+        from config import settings
+        from database.database import init_db
+        from services.response_cache import subscription_cache
+        import webhook
+
+        await init_db()
+        subscription_cache.clear()
+        monkeypatch.setitem(settings.__dict__, "flutter_api_keys", frozenset({"app-key"}))
+
+        messages = []
+        sink = logger.add(messages.append, level="DEBUG", format="{message}", filter=lambda r: "db_queries" in r["extra"])
+        try:
+            transport = httpx.ASGITransport(app=webhook.app)
+            async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+                response = await client.get("/api/subscription/424242", headers={"X-API-Key": "app-key"})
+        finally:
+            logger.remove(sink)
+            subscription_cache.clear()
+
+        assert response.status_code == 200
+        assert any(m.startswith("GET /api/subscription/{telegram_id}: ") for m in messages)
+        assert not any("424242" in m for m in messages)
+
+    @pytest.mark.asyncio
+    async def test_handler_middleware(self):
+        """Handler name comes from the resolved handler, errors are counted"""
+        async def show_status():
+            pass
+
+        async def ok(event, data):
+            return "ok"
+
+        async def failing(event, data):
+            raise ValueError
+
+        middleware = MetricsMiddleware("callback_query")
+        data = {"handler": SimpleNamespace(callback=show_status)}
+        labels = {"event": "callback_query", "handler": "show_status"}
+        errors = sample("freedomvpn_bot_handler_errors_total", **labels)
+
+        assert await middleware(ok, object(), data) == "ok"
+        with pytest.raises(ValueError):
+            await middleware(failing, object(), data)
+
+        assert sample("freedomvpn_bot_handler_seconds_count", **labels) >= 2
+        assert sample("freedomvpn_bot_handler_errors_total", **labels) == errors + 1
+        assert b"freedomvpn_bot_handler_seconds" in render_metrics()[0]
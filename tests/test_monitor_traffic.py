@@ -0,0 +1,172 @@
+# Tests for the traffic monitor daemon
+import pytest
+from datetime import datetime
+
+import monitor_traffic
+from monitor_traffic import TrafficMonitor, read_interface_counters
+
+
+PROC_HEADER = (
+    "Inter-|   Receive                                                |  Transmit\n"
+    " face |bytes    packets errs drop fifo frame compressed multicast|bytes    packets errs drop fifo colls carrier compressed\n"
+)
+
+
+def write_proc(path, counters: dict):
+    lines = [PROC_HEADER]
+    for interface, (rx, tx) in counters.items():
+        lines.append(f"{interface:>6}: {rx} 0 0 0 0 0 0 0 {tx} 0 0 0 0 0 0 0\n")
+    path.write_text("".join(lines))
+
+
+class TestTrafficMonitor:
+    """Test suite for TrafficMonitor"""
+
+    @pytest.fixture
+    def proc(self, tmp_path):
+        return tmp_path / "net_dev"
+
+    @pytest.fixture
+    def monitor_factory(self, tmp_path, proc, monkeypatch):
+        boot = {"id": "boot-1"}
+        monkeypatch.setattr(monitor_traffic, "read_boot_id", lambda: boot["id"])
+
+        def create():
+            return TrafficMonitor(proc_path=str(proc), counters_file=str(tmp_path / "counters.json"), buffer_size=3)
+
+        create.boot = boot
+        return create
+
+    def test_read_interface_counters(self, proc):
+        """Loopback is skipped, rx/tx are taken from the right columns"""
+        write_proc(proc, {"lo": (5, 5), "eth0": (100, 200)})
+
+        assert read_interface_counters(str(proc)) == {"eth0": (100, 200)}
+
+    def test_interface_filter(self, proc):
+        """Only configured interfaces are counted"""
+        write_proc(proc, {"eth0": (100, 200), "wg0": (1, 2), "docker0": (3, 4)})
+
+        assert read_interface_counters(str(proc), frozenset({"eth0", "wg0"})) == {
+            "eth0": (100, 200),
+            "wg0": (1, 2),
+        }
+
+    def test_rates_and_ring_buffer(self, proc, monitor_factory):
+        """Rates are computed per interval, only the last samples are kept"""
+        monitor = monitor_factory()
+        write_proc(proc, {"eth0": (1000, 0)})
+        assert monitor.sample(now=0) is None
+
+        for step in range(1, 6):
+            write_proc(proc, {"eth0": (1000 + step * 500, step * 100)})
+            monitor.sample(now=step * 10)
+
+        assert len(monitor.samples) == 3
+        assert monitor.current_throughput()["rx_rate"] == 50.0
+        assert monitor.current_throughput()["tx_rate"] == 10.0
+        # Трафик до старта демона в месяц не попадает
+        assert (monitor.rx_bytes, monitor.tx_bytes) == (2500, 500)
+
+    def test_counter_reset(self, proc, monitor_factory):
+        """Counter going down is treated as a reset, not a negative delta"""
+        monitor = monitor_factory()
+        write_proc(proc, {"eth0": (1000, 1000)})
+        monitor.sample(now=0)
+        write_proc(proc, {"eth0": (300, 200)})
+        monitor.sample(now=10)
+
+        assert (monitor.rx_bytes, monitor.tx_bytes) == (300, 200)
+
+    def test_reboot_persisted(self, proc, monitor_factory):
+        """Monthly totals survive a daemon restart and a reboot"""
+        monitor = monitor_factory()
+        write_proc(proc, {"eth0": (1000, 0)})
+        monitor.sample(now=0)
+        write_proc(proc, {"eth0": (5000, 0)})
+        monitor.sample(now=10)
+        monitor.save()
+
+        # Перезапуск демона без перезагрузки: продолжаем с сохранённых сырых счётчиков
+        restarted = monitor_factory()
+        write_proc(proc, {"eth0": (6000, 0)})
+        restarted.sample(now=0)
+        assert restarted.rx_bytes == 5000
+        restarted.save()
+
+        # Перезагрузка: счётчики ядра начались с нуля
+        monitor_factory.boot["id"] = "boot-2"
+        rebooted = monitor_factory()
+        write_proc(proc, {"eth0": (700, 0)})
+        rebooted.sample(now=0)
+        assert rebooted.rx_bytes == 5700
+
+    def test_month_rollover(self, proc, monitor_factory):
+        """Totals start from zero in a new month"""
+        monitor = monitor_factory()
+        write_proc(proc, {"eth0": (0, 0)})
+        monitor.sample(now=0, today=datetime(2026, 1, 31))
+        write_proc(proc, {"eth0": (100, 0)})
+        monitor.sample(now=10, today=datetime(2026, 1, 31))
+        write_proc(proc, {"eth0": (150, 0)})
+        monitor.sample(now=20, today=datetime(2026, 2, 1))
+
+        assert monitor.month == "2026-02"
+        assert monitor.rx_bytes == 50
+
+
+class TestTrafficForecast:
+    """Test suite for forecast_usage"""
+
+    def history(self, start: datetime, points: list[tuple[float, float]]):
+        return [[start.timestamp() + hours * 3600, gb] for hours, gb in points]
+
+    def test_not_enough_history(self):
+        """No forecast from a single point or a short span"""
+        now = datetime(2026, 3, 10)
+        assert monitor_traffic.forecast_usage(self.history(now, [(0, 10)]), 1000, now) is None
+        assert monitor_traffic.forecast_usage(self.history(now, [(0, 10), (1, 20)]), 1000, now) is None
+
+    def test_projected_exhaustion(self):
+        """Steady 100 GB/day from the 1st exhausts 1 TB on day 11"""
+        start = datetime(2026, 3, 1)
+        history = self.history(start, [(hours, hours * 100 / 24) for hours in range(0, 49, 12)])
+        now = datetime(2026, 3, 3)
+
+        forecast = monitor_traffic.forecast_usage(history, 1000, now)
+
+        assert forecast.rate_gb_per_day == pytest.approx(100)
+        assert forecast.projected_total_gb == pytest.approx(3100)
+        assert forecast.exhaustion_at == datetime(2026, 3, 11)
+
+    def test_within_limit(self):
+        """Low usage gives no exhaustion date"""
+        start = datetime(2026, 3, 1)
+        history = self.history(start, [(0, 0), (12, 1), (24, 2)])
+
+        forecast = monitor_traffic.forecast_usage(history, 1000, datetime(2026, 3, 2))
+
+        assert forecast.exhaustion_at is None
+        assert forecast.projected_total_gb < 1000
+
+    def test_ewma_follows_recent_rate(self):
+        """Recent acceleration weighs more than the early slow period"""
+        start = datetime(2026, 3, 1)
+        history = self.history(start, [(0, 0), (12, 1), (24, 2), (36, 100), (48, 200)])
+
+        forecast = monitor_traffic.forecast_usage(history, 1000, datetime(2026, 3, 3))
+
+        assert forecast.rate_gb_per_day > 100
+        assert forecast.exhaustion_at is not None
+
+    def test_alert_state_rolls_over(self, tmp_path, monkeypatch):
+        """Alert flags from a previous month are dropped"""
+        state_file = tmp_path / "alert_state.json"
+        state_file.write_text('{"month": "2000-01", "90_percent_sent": true, "history": [[0, 1]]}')
+        monkeypatch.setattr(monitor_traffic, "STATE_FILE", str(state_file))
+
+        state = monitor_traffic.load_alert_state()
+
+        assert state["90_percent_sent"] is False
+        assert state["history"] == []
+        assert state["month"] == datetime.now().strftime("%Y-%m")
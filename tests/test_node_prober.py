@@ -0,0 +1,74 @@
+# Tests for NodeProber
+import asyncio
+import pytest
+from unittest.mock import AsyncMock
+
+from services.marzban_service import MarzbanService, MarzbanPool
+from services.node_prober import NodeProber
+
+
+class TestNodeProber:
+    """Test suite for NodeProber"""
+
+    @pytest.fixture
+    async def open_port(self):
+        server = await asyncio.start_server(lambda r, w: w.close(), "127.0.0.1", 0)
+        yield server.sockets[0].getsockname()[1]
+        server.close()
+        await server.wait_closed()
+
+    @pytest.fixture
+    async def closed_port(self):
+        server = await asyncio.start_server(lambda r, w: w.close(), "127.0.0.1", 0)
+        port = server.sockets[0].getsockname()[1]
+        server.close()
+        await server.wait_closed()
+        return port
+
+    def node(self, name, port, users_active=0):
+        node = MarzbanService(base_url=f"https://{name}.example.com", name=name, host="127.0.0.1", port=port)
+        node.get_system_stats = AsyncMock(return_value={"users_active": users_active})
+        return node
+
+    @pytest.mark.asyncio
+    async def test_snapshot_sorted(self, open_port, closed_port):
+        """Reachable nodes come first, unreachable ones are marked after repeated failures"""
+        down = self.node("down", closed_port)
+        up = self.node("up", open_port, users_active=7)
+        prober = NodeProber(MarzbanPool([down, up]))
+
+        await prober.probe_all()
+        assert prober.health(down).available is True  # одна неудача — ещё не падение
+
+        await prober.probe_all()
+        snapshot = prober.snapshot()
+
+        assert [h.name for h in snapshot] == ["up", "down"]
+        assert snapshot[0].latency_ms is not None
+        assert snapshot[0].users_active == 7
+        assert snapshot[1].available is False
+
+    @pytest.mark.asyncio
+    async def test_latency_ewma(self, open_port):
+        """Latency is smoothed, a single spike moves it only partially"""
+        node = self.node("up", open_port)
+        prober = NodeProber(MarzbanPool([node]))
+        samples = iter([10.0, 110.0])
+        prober.measure_tcp = AsyncMock(side_effect=lambda host, port: next(samples))
+
+        await prober.probe(node)
+        await prober.probe(node)
+
+        assert prober.health(node).latency_ms == pytest.approx(10 + prober.ALPHA * 100)
+
+    @pytest.mark.asyncio
+    async def test_panel_failure(self, open_port):
+        """Panel errors don't make a reachable node unavailable"""
+        node = self.node("up", open_port)
+        node.get_system_stats = AsyncMock(side_effect=RuntimeError("panel down"))
+        prober = NodeProber(MarzbanPool([node]))
+
+        await prober.probe(node)
+
+        assert prober.health(node).panel_ok is False
+        assert prober.health(node).available is True
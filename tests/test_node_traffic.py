@@ -0,0 +1,42 @@
+# Tests for NodeTrafficService
+import pytest
+
+from services.node_traffic_service import NodeTrafficService
+
+GB = 1024 ** 3
+
+
+class TestNodeTrafficService:
+    """Test suite for NodeTrafficService"""
+
+    @pytest.fixture
+    def service(self):
+        return NodeTrafficService()
+
+    @pytest.mark.asyncio
+    async def test_report_overwrites_month_row(self, service, test_session):
+        """Repeated reports update the node's row for the month"""
+        await service.save_report(test_session, "nl-1", "2026-03", 1 * GB, 1 * GB, limit_gb=1000)
+        await service.save_report(
+            test_session, "nl-1", "2026-03", 5 * GB, 3 * GB, limit_gb=1000,
+            rx_rate=100.0, interfaces={"eth0": [100.0, 0.0]},
+        )
+
+        overview = await service.get_overview(test_session, "2026-03")
+
+        assert len(overview["nodes"]) == 1
+        assert overview["total_gb"] == pytest.approx(8)
+        assert overview["nodes"][0].rx_rate == 100.0
+
+    @pytest.mark.asyncio
+    async def test_overview_aggregates_nodes(self, service, test_session):
+        """Overview sums usage and limits across nodes of one month"""
+        await service.save_report(test_session, "nl-1", "2026-03", 10 * GB, 0, limit_gb=1000)
+        await service.save_report(test_session, "de-1", "2026-03", 0, 20 * GB, limit_gb=500)
+        await service.save_report(test_session, "nl-1", "2026-02", 99 * GB, 0, limit_gb=1000)
+
+        overview = await service.get_overview(test_session, "2026-03")
+
+        assert [node.node for node in overview["nodes"]] == ["de-1", "nl-1"]
+        assert overview["total_gb"] == pytest.approx(30)
+        assert overview["limit_gb"] == 1500
@@ -0,0 +1,129 @@
+# Tests for PromocodeService
+import pytest
+from datetime import datetime, timedelta
+from sqlalchemy import select, func, event
+
+from services.promocode_service import PromocodeService, promocode_catalog
+from database.models import Promocode, PromocodeUsage
+
+
+class TestPromocodeService:
+    """Test suite for PromocodeService"""
+
+    @pytest.fixture
+    def service(self):
+        return PromocodeService()
+
+    @pytest.fixture(autouse=True)
+    def reset_catalog(self):
+        """Catalog is global, each test has its own database"""
+        promocode_catalog.invalidate()
+        yield
+        promocode_catalog.invalidate()
+
+    @pytest.fixture
+    async def limited_promocode(self, test_session):
+        """Promocode with a single use left"""
+        promocode = Promocode(
+            code="FLASH1",
+            discount_type="bonus_days",
+            discount_value=7,
+            max_uses=1,
+            current_uses=0,
+        )
+        test_session.add(promocode)
+        await test_session.flush()
+        return promocode
+
+    # ============== APPLY PROMOCODE ==============
+
+    @pytest.mark.asyncio
+    async def test_apply_promocode_success(self, service, test_session, limited_promocode):
+        """Redemption records usage and increments the counter"""
+        result = await service.apply_promocode(test_session, limited_promocode, 111, 0)
+
+        assert result["applied"] is True
+        assert result["bonus_days"] == 7
+
+        current_uses = await test_session.scalar(
+            select(Promocode.current_uses).where(Promocode.id == limited_promocode.id)
+        )
+        assert current_uses == 1
+
+    @pytest.mark.asyncio
+    async def test_apply_promocode_limit(self, service, test_session, limited_promocode):
+        """Second user can't redeem an exhausted promocode"""
+        first = await service.apply_promocode(test_session, limited_promocode, 111, 0)
+        second = await service.apply_promocode(test_session, limited_promocode, 222, 0)
+
+        assert first["applied"] is True
+        assert second["applied"] is False
+        assert second["error"] == "Промокод исчерпан"
+
+        usages = await test_session.scalar(
+            select(func.count(PromocodeUsage.id)).where(PromocodeUsage.promocode_id == limited_promocode.id)
+        )
+        assert usages == 1
+
+    @pytest.mark.asyncio
+    async def test_apply_promocode_twice_same_user(self, service, test_session):
+        """Same user can't redeem the same promocode twice"""
+        promocode = Promocode(code="MULTI", discount_type="percent", discount_value=10)
+        test_session.add(promocode)
+        await test_session.flush()
+
+        first = await service.apply_promocode(test_session, promocode, 111, 100)
+        second = await service.apply_promocode(test_session, promocode, 111, 100)
+
+        assert first["applied"] is True
+        assert first["final_amount"] == 90
+        assert second["applied"] is False
+        assert second["error"] == "Вы уже использовали этот промокод"
+
+    @pytest.mark.asyncio
+    async def test_apply_promocode_expired(self, service, test_session):
+        """Expired promocode is not redeemed"""
+        promocode = Promocode(
+            code="OLD",
+            discount_type="fixed",
+            discount_value=50,
+            expires_at=datetime.utcnow() - timedelta(days=1),
+        )
+        test_session.add(promocode)
+        await test_session.flush()
+
+        result = await service.apply_promocode(test_session, promocode, 111, 100)
+
+        assert result["applied"] is False
+
+    # ============== VALIDATE PROMOCODE (CATALOG) ==============
+
+    @pytest.mark.asyncio
+    async def test_validate_unknown_code_skips_db(self, service, test_session, test_engine, limited_promocode):
+        """Unknown code is rejected from the catalog without querying the database"""
+        await service.validate_promocode(test_session, "FLASH1", 111, "any")  # загрузка каталога
+
+        executed = []
+
+        def before_execute(conn, cursor, statement, parameters, context, executemany):
+            executed.append(statement)
+
+        event.listen(test_engine.sync_engine, "before_cursor_execute", before_execute)
+        try:
+            result = await service.validate_promocode(test_session, "NOSUCHCODE", 111, "any")
+        finally:
+            event.remove(test_engine.sync_engine, "before_cursor_execute", before_execute)
+
+        assert result == {"valid": False, "error": "Промокод не найден"}
+        assert executed == []
+
+    @pytest.mark.asyncio
+    async def test_validate_created_code(self, service, test_session):
+        """Newly created promocode is visible without waiting for a refresh"""
+        await promocode_catalog.refresh(test_session)
+        await service.create_promocode(test_session, "new50", "percent", 50)
+
+        result = await service.validate_promocode(test_session, "NEW50", 111, "any")
+
+        assert result["valid"] is True
+        assert result["discount_value"] == 50
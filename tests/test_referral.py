@@ -0,0 +1,227 @@
+# Tests for ReferralService
+import pytest
+from sqlalchemy import select
+
+from services.referral_service import ReferralService, ReferralAccrual, ReferralLeaderboard, referral_leaderboard
+from services.user_service import UserService, user_cache
+from database.models import User, ReferralTransaction, ReferralTreeEdge
+
+
+class TestReferralService:
+    """Test suite for ReferralService"""
+
+    @pytest.fixture
+    def service(self):
+        return ReferralService()
+
+    @pytest.fixture(autouse=True)
+    def clear_user_cache(self):
+        user_cache.clear()
+        yield
+        user_cache.clear()
+
+    # ============== REFERRAL CODES ==============
+
+    def test_referral_code_roundtrip(self, service):
+        """Code decodes back to the same telegram_id"""
+        for telegram_id in (1, 123456789, 7_000_000_000, 2**52 - 1):
+            code = service.generate_referral_code(telegram_id)
+            assert code.startswith("ref_")
+            assert service.decode_referral_code(code) == telegram_id
+
+    def test_referral_code_unique(self, service):
+        """Neighbouring ids get unrelated codes"""
+        codes = {service.generate_referral_code(telegram_id) for telegram_id in range(1, 10001)}
+        assert len(codes) == 10000
+
+    def test_decode_foreign_code(self, service):
+        """Legacy and malformed codes are not decoded"""
+        assert service.decode_referral_code("ref_abc123_1234") is None
+        assert service.decode_referral_code("ref_") is None
+        assert service.decode_referral_code("promo") is None
+        assert service.decode_referral_code("ref_zzzzzzzzzzzzzzzz") is None
+
+    @pytest.mark.asyncio
+    async def test_get_user_by_referral_code(self, service, test_session, test_user):
+        """Lookup works for generated codes and for legacy stored codes"""
+        user = await UserService.get_or_create_user(test_session, 1001, first_name="A")
+
+        assert user.referral_code == service.generate_referral_code(1001)
+        assert (await service.get_user_by_referral_code(test_session, user.referral_code)).telegram_id == 1001
+        assert (await service.get_user_by_referral_code(test_session, "TEST123")).telegram_id == test_user.telegram_id
+        assert await service.create_or_get_referral_code(test_session, test_user.telegram_id) == "TEST123"
+
+    # ============== REFERRAL COUNTERS ==============
+
+    @pytest.mark.asyncio
+    async def test_new_referred_user_increments_counter(self, service, test_session, test_user):
+        """Creating a user with a referrer bumps referrer's total_referrals"""
+        await UserService.get_or_create_user(test_session, 1001, first_name="A", referrer_id=test_user.telegram_id)
+        await UserService.get_or_create_user(test_session, 1002, first_name="B", referrer_id=test_user.telegram_id)
+        # Повторный /start не должен считаться новым рефералом
+        await UserService.get_or_create_user(test_session, 1001, first_name="A", referrer_id=test_user.telegram_id)
+
+        total = await test_session.scalar(
+            select(User.total_referrals).where(User.telegram_id == test_user.telegram_id)
+        )
+        assert total == 2
+
+    @pytest.mark.asyncio
+    async def test_set_referrer_increments_counter(self, service, test_session, test_user):
+        """set_referrer bumps referrer's counter once"""
+        await UserService.get_or_create_user(test_session, 1001, first_name="A")
+
+        assert await service.set_referrer(test_session, 1001, test_user.telegram_id) is True
+        assert await service.set_referrer(test_session, 1001, test_user.telegram_id) is False
+
+        total = await test_session.scalar(
+            select(User.total_referrals).where(User.telegram_id == test_user.telegram_id)
+        )
+        assert total == 1
+
+    @pytest.mark.asyncio
+    async def test_referral_stats(self, service, test_session, test_user):
+        """Dashboard reads counters from users and lists recent referrals"""
+        await UserService.get_or_create_user(test_session, 1001, first_name="A", referrer_id=test_user.telegram_id)
+        await UserService.get_or_create_user(test_session, 1002, first_name="B", referrer_id=test_user.telegram_id)
+
+        stats = await service.get_referral_stats(test_session, test_user.telegram_id)
+
+        assert stats["referrals_count"] == 2
+        assert stats["total_earned"] == 0
+        assert stats["balance"] == 0
+        assert {ref.first_name for ref in stats["recent_referrals"]} == {"A", "B"}
+
+    @pytest.mark.asyncio
+    async def test_referral_stats_unknown_user(self, service, test_session):
+        """Unknown user gets empty stats"""
+        stats = await service.get_referral_stats(test_session, 42)
+
+        assert stats["referrals_count"] == 0
+        assert stats["recent_referrals"] == []
+
+    # ============== REFERRAL LEDGER ==============
+
+    @pytest.fixture
+    async def referred_user(self, test_session, test_user):
+        """User invited by test_user"""
+        return await UserService.get_or_create_user(
+            test_session, 1001, first_name="A", referrer_id=test_user.telegram_id
+        )
+
+    @pytest.mark.asyncio
+    async def test_process_referral_payment(self, service, test_session, test_user, referred_user):
+        """Bonus is written to the ledger and added to balance and total_earned"""
+        bonus = await service.process_referral_payment(test_session, 1, referred_user.telegram_id, 100.0)
+
+        assert bonus == pytest.approx(100.0 * service.REFERRAL_PERCENTAGE / 100)
+        row = (await test_session.execute(
+            select(User.balance, User.total_earned).where(User.telegram_id == test_user.telegram_id)
+        )).one()
+        assert row.balance == pytest.approx(bonus)
+        assert row.total_earned == pytest.approx(bonus)
+
+    @pytest.mark.asyncio
+    async def test_process_referral_payment_idempotent(self, service, test_session, test_user, referred_user):
+        """Same payment is never accrued twice"""
+        first = await service.process_referral_payment(test_session, 1, referred_user.telegram_id, 100.0)
+        second = await service.process_referral_payment(test_session, 1, referred_user.telegram_id, 100.0)
+
+        assert first > 0
+        assert second == 0.0
+        balance = await test_session.scalar(select(User.balance).where(User.telegram_id == test_user.telegram_id))
+        assert balance == pytest.approx(first)
+
+    @pytest.mark.asyncio
+    async def test_process_referral_payment_no_referrer(self, service, test_session, test_user):
+        """User without referrer gets nothing accrued"""
+        bonus = await service.process_referral_payment(test_session, 1, test_user.telegram_id, 100.0)
+
+        assert bonus == 0.0
+
+    @pytest.mark.asyncio
+    async def test_accrue_batch(self, service, test_session, test_user, referred_user):
+        """Batch accrual sums deltas per referrer and skips duplicates"""
+        await UserService.get_or_create_user(test_session, 1002, first_name="B", referrer_id=test_user.telegram_id)
+
+        accrued = await service.accrue_batch(test_session, [
+            ReferralAccrual(payment_id=1, telegram_id=1001, amount=100.0),
+            ReferralAccrual(payment_id=2, telegram_id=1002, amount=200.0),
+            ReferralAccrual(payment_id=2, telegram_id=1002, amount=200.0),
+            ReferralAccrual(payment_id=3, telegram_id=test_user.telegram_id, amount=300.0),
+        ])
+
+        assert set(accrued) == {1, 2}
+        transactions = (await test_session.execute(select(ReferralTransaction))).scalars().all()
+        assert len(transactions) == 2
+        balance = await test_session.scalar(select(User.balance).where(User.telegram_id == test_user.telegram_id))
+        assert balance == pytest.approx(sum(accrued.values()))
+
+    # ============== REFERRAL TREE ==============
+
+    @pytest.mark.asyncio
+    async def test_network_sizes(self, service, test_session, test_user):
+        """Tree edges are added for every ancestor of the referrer"""
+        await UserService.get_or_create_user(test_session, 1001, first_name="A", referrer_id=test_user.telegram_id)
+        await UserService.get_or_create_user(test_session, 1002, first_name="B", referrer_id=1001)
+        await UserService.get_or_create_user(test_session, 1003, first_name="C", referrer_id=1002)
+
+        sizes = await service.get_network_sizes(test_session, [test_user.telegram_id, 1001, 1003])
+        direct = await service.get_network_sizes(test_session, [test_user.telegram_id], max_depth=1)
+
+        assert sizes == {test_user.telegram_id: 3, 1001: 2, 1003: 0}
+        assert direct == {test_user.telegram_id: 1}
+        assert await service.is_descendant(test_session, test_user.telegram_id, 1003) is True
+
+    @pytest.mark.asyncio
+    async def test_set_referrer_rejects_cycle(self, service, test_session, test_user):
+        """User can't pick someone from their own network as a referrer"""
+        await UserService.get_or_create_user(test_session, 1001, first_name="A", referrer_id=test_user.telegram_id)
+
+        assert await service.set_referrer(test_session, test_user.telegram_id, 1001) is False
+
+    @pytest.mark.asyncio
+    async def test_set_referrer_attaches_existing_network(self, service, test_session, test_user):
+        """Existing invitees of the user join the new referrer's network, so cycles stay blocked"""
+        await UserService.get_or_create_user(test_session, 1001, first_name="A")
+        await UserService.get_or_create_user(test_session, 1002, first_name="B", referrer_id=1001)
+        await UserService.get_or_create_user(test_session, 1003, first_name="C", referrer_id=1002)
+        referral_leaderboard._rebuilt_at = 0.0
+        await service.set_referrer(test_session, 1001, test_user.telegram_id)
+
+        assert referral_leaderboard.is_stale()
+        sizes = await service.get_network_sizes(test_session, [test_user.telegram_id])
+        edge = await test_session.scalar(
+            select(ReferralTreeEdge.depth).where(
+                ReferralTreeEdge.ancestor_id == test_user.telegram_id, ReferralTreeEdge.descendant_id == 1003
+            )
+        )
+
+        assert sizes == {test_user.telegram_id: 3}
+        assert edge == 3
+        assert await service.is_descendant(test_session, test_user.telegram_id, 1003) is True
+        assert await service.set_referrer(test_session, test_user.telegram_id, 1003) is False
+
+    # ============== LEADERBOARD ==============
+
+    @pytest.mark.asyncio
+    async def test_leaderboard_incremental(self, service, test_session, test_user):
+        """Leaderboard picks up new referrals and accruals without a rebuild"""
+        leaderboard = ReferralLeaderboard(size=1)
+        await UserService.get_or_create_user(test_session, 1001, first_name="A", referrer_id=test_user.telegram_id)
+        await test_session.flush()
+        await leaderboard.refresh(test_session)
+
+        assert [e.telegram_id for e in leaderboard.top_by_referrals()] == [test_user.telegram_id]
+        assert leaderboard.top_by_earnings() == []
+
+        # 1001 обгоняет по приглашённым и получает бонус
+        await UserService.get_or_create_user(test_session, 1002, first_name="B", referrer_id=1001)
+        await UserService.get_or_create_user(test_session, 1003, first_name="C", referrer_id=1001)
+        await service.process_referral_payment(test_session, 1, 1002, 100.0)
+        await test_session.flush()
+        await leaderboard.refresh(test_session)
+
+        top = leaderboard.top_by_referrals()
+        assert [(e.telegram_id, e.total_referrals) for e in top] == [(1001, 2)]
+        assert [e.telegram_id for e in leaderboard.top_by_earnings()] == [1001]
@@ -0,0 +1,80 @@
+# Tests for the Flutter API response cache
+import time
+
+import pytest
+
+from services.response_cache import ResponseCache, etag_matches
+
+
+class TestResponseCache:
+    """Test suite for ResponseCache"""
+
+    def test_hit_and_etag(self):
+        """Same body gives the same ETag, different body a new one"""
+        cache = ResponseCache(maxsize=10, ttl=30)
+        first = cache.put(("status", 1), {"active": True, "days_left": 5}, telegram_id=1)
+
+        assert cache.get(("status", 1)) is first
+        assert cache.put(("status", 1), {"days_left": 5, "active": True}, telegram_id=1).etag == first.etag
+        assert cache.put(("status", 1), {"active": True, "days_left": 4}, telegram_id=1).etag != first.etag
+
+    def test_ttl_expiry(self, monkeypatch):
+        """Expired entries are dropped on read"""
+        cache = ResponseCache(maxsize=10, ttl=30)
+        cache.put(("status", 1), {"active": False})
+
+        now = time.monotonic()
+        monkeypatch.setattr(time, "monotonic", lambda: now + 31)
+
+        assert cache.get(("status", 1)) is None
+        assert len(cache) == 0
+
+    def test_user_index_pruned(self, monkeypatch):
+        """Evicted and expired entries leave the per-user index"""
+        cache = ResponseCache(maxsize=2, ttl=30)
+        for telegram_id in range(1, 6):
+            cache.put(("status", telegram_id), {"active": False}, telegram_id=telegram_id)
+
+        assert set(cache._keys_by_user) == {4, 5}
+
+        now = time.monotonic()
+        monkeypatch.setattr(time, "monotonic", lambda: now + 31)
+        cache.get(("status", 4))
+
+        assert set(cache._keys_by_user) == {5}
+
+    def test_invalidate_user(self):
+        """All responses of a user are dropped together"""
+        cache = ResponseCache(maxsize=10, ttl=30)
+        cache.put(("status", 1), {"active": True}, telegram_id=1)
+        cache.put(("vless", 1), {"vless_link": "vless://x"}, telegram_id=1)
+        cache.put(("status", 2), {"active": True}, telegram_id=2)
+
+        cache.invalidate_user(1)
+
+        assert cache.get(("status", 1)) is None
+        assert cache.get(("vless", 1)) is None
+        assert cache.get(("status", 2)) is not None
+
+    def test_lru_eviction(self):
+        """Least recently used entry is evicted first"""
+        cache = ResponseCache(maxsize=2, ttl=30)
+        cache.put("a", {"n": 1})
+        cache.put("b", {"n": 2})
+        cache.get("a")
+        cache.put("c", {"n": 3})
+
+        assert cache.get("b") is None
+        assert cache.get("a") is not None
+        assert len(cache) == 2
+
+    @pytest.mark.parametrize("header, expected", [
+        (None, False),
+        ('"abc"', True),
+        ('W/"abc"', True),
+        ('"x", "abc"', True),
+        ("*", True),
+        ('"abd"', False),
+    ])
+    def test_etag_matches(self, header, expected):
+        assert etag_matches(header, '"abc"') is expected
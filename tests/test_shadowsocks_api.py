@@ -0,0 +1,268 @@
+# Tests for the ss-manager UDP client
+import asyncio
+import json
+import pytest
+from types import SimpleNamespace
+
+import shadowsocks_api
+from shadowsocks_api import ShadowsocksManager, PortAllocator, sync_ss_manager
+
+
+class FakeSSManager(asyncio.DatagramProtocol):
+    """ss-manager stub: answers commands in order, optionally drops some"""
+
+    def __init__(self, drop: set[str] | None = None, delay: float = 0.0):
+        self.drop = drop or set()
+        self.delay = delay
+        self.commands = []
+        self.ports = {}
+
+    def connection_made(self, transport):
+        self.transport = transport
+
+    def datagram_received(self, data, addr):
+        command = json.loads(data)
+        self.commands.append(command)
+        name, args = next(iter(command.items()))
+        if name in self.drop:
+            return
+        if name == "add":
+            self.ports[args["server_port"]] = args["password"]
+        elif name == "remove":
+            self.ports.pop(args["server_port"], None)
+
+        if name == "list":
+            response = json.dumps({str(port): password for port, password in self.ports.items()}).encode()
+        else:
+            response = json.dumps({"stat": "ok"}).encode()
+        asyncio.get_running_loop().call_later(self.delay, self.transport.sendto, response, addr)
+
+
+class TestShadowsocksManager:
+    """Test suite for ShadowsocksManager"""
+
+    @pytest.fixture
+    async def fake_server(self):
+        servers = []
+
+        async def start(**kwargs):
+            loop = asyncio.get_running_loop()
+            transport, protocol = await loop.create_datagram_endpoint(
+                lambda: FakeSSManager(**kwargs), local_addr=("127.0.0.1", 0)
+            )
+            servers.append(transport)
+            host, port = transport.get_extra_info("sockname")
+            return protocol, f"{host}:{port}"
+
+        yield start
+
+        for transport in servers:
+            transport.close()
+
+    @pytest.mark.asyncio
+    async def test_ping(self, fake_server):
+        """Ping goes through the persistent socket"""
+        _, address = await fake_server()
+        manager = ShadowsocksManager(address, timeout=1)
+
+        assert await manager.ping() is True
+        assert await manager.ping() is True
+        await manager.close()
+
+    @pytest.mark.asyncio
+    async def test_pipelined_commands(self, fake_server):
+        """Concurrent add/remove commands are all answered"""
+        server, address = await fake_server(delay=0.01)
+        manager = ShadowsocksManager(address, timeout=1)
+
+        added = await manager.add_ports({port: f"pass{port}" for port in range(10000, 10020)})
+        removed = await manager.remove_ports(range(10000, 10010))
+
+        assert all(added.values()) and len(added) == 20
+        assert all(removed.values()) and len(removed) == 10
+        assert len(server.commands) == 30
+        await manager.close()
+
+    @pytest.mark.asyncio
+    async def test_timeout_does_not_block_loop(self, fake_server):
+        """Lost response times out without freezing other tasks"""
+        _, address = await fake_server(drop={"ping"})
+        manager = ShadowsocksManager(address, timeout=0.2)
+        ticks = 0
+
+        async def ticker():
+            nonlocal ticks
+            while True:
+                ticks += 1
+                await asyncio.sleep(0.01)
+
+        task = asyncio.create_task(ticker())
+        try:
+            assert await manager.ping() is False
+        finally:
+            task.cancel()
+
+        assert ticks > 5
+        # После сброса сокета клиент снова работает
+        assert await manager.add_port(10000, "secret") is True
+        await manager.close()
+
+    @pytest.mark.asyncio
+    async def test_failed_send_keeps_replies_in_order(self, fake_server):
+        """A command that can't be encoded leaves no orphaned waiter behind"""
+        _, address = await fake_server()
+        manager = ShadowsocksManager(address, timeout=1)
+        await manager.ping()
+
+        assert await manager.send_command({"add": {"server_port": 10000, "password": object()}}) is None
+        assert len(manager._pending) == 0
+        assert await manager.add_port(10001, "secret") is True
+        await manager.close()
+
+    @pytest.fixture
+    def active_ports(self, monkeypatch):
+        wanted = {}
+
+        async def load_active_ports():
+            return wanted
+
+        monkeypatch.setattr(shadowsocks_api, "_load_active_ports", load_active_ports)
+        return wanted
+
+    @pytest.mark.asyncio
+    async def test_sync_from_database(self, fake_server, active_ports):
+        """Sync sends only the difference and keeps unknown ports by default"""
+        server, address = await fake_server()
+        server.ports = {10000: "keep", 10001: "stale", 10002: "old-password"}
+        active_ports.update({10000: "keep", 10002: "new-password", 10003: "missing", 10004: "missing2"})
+        manager = ShadowsocksManager(address, timeout=1)
+        progress = []
+
+        report = await sync_ss_manager(manager, batch_size=2, progress=lambda r: progress.append(r.done))
+
+        assert server.ports == {**active_ports, 10001: "stale"}
+        assert report.stale == [10001]
+        assert report.removed == [10002]
+        assert sorted(report.added) == [10002, 10003, 10004]
+        assert report.failed == []
+        assert progress == [1, 3, 4]
+        await manager.close()
+
+    @pytest.mark.asyncio
+    async def test_sync_prune(self, fake_server, active_ports):
+        """With prune ports without an active subscription are closed"""
+        server, address = await fake_server()
+        server.ports = {10000: "keep", 10001: "stale"}
+        active_ports.update({10000: "keep"})
+        manager = ShadowsocksManager(address, timeout=1)
+
+        report = await sync_ss_manager(manager, prune=True)
+
+        assert server.ports == {10000: "keep"}
+        assert report.removed == [10001]
+        await manager.close()
+
+    @pytest.mark.asyncio
+    async def test_sync_never_prunes_everything(self, fake_server, active_ports):
+        """Empty database doesn't close every open port even with prune"""
+        server, address = await fake_server()
+        server.ports = {10000: "a", 10001: "b"}
+        manager = ShadowsocksManager(address, timeout=1)
+
+        report = await sync_ss_manager(manager, prune=True)
+
+        assert server.ports == {10000: "a", 10001: "b"}
+        assert report.removed == []
+        assert sorted(report.stale) == [10000, 10001]
+        await manager.close()
+
+    @pytest.mark.asyncio
+    async def test_sync_dry_run(self, fake_server, active_ports):
+        """Dry run reports the plan and sends nothing but list"""
+        server, address = await fake_server()
+        server.ports = {10000: "old", 10001: "stale"}
+        active_ports.update({10000: "new", 10002: "missing"})
+        manager = ShadowsocksManager(address, timeout=1)
+
+        report = await sync_ss_manager(manager, prune=True, dry_run=True)
+
+        assert report.dry_run is True
+        assert report.to_remove == [10000, 10001]
+        assert report.to_add == [10000, 10002]
+        assert report.done == 0
+        assert server.ports == {10000: "old", 10001: "stale"}
+        assert [next(iter(command)) for command in server.commands] == ["list"]
+        await manager.close()
+
+    @pytest.mark.asyncio
+    async def test_provision_persists_port(self, fake_server, monkeypatch, test_session, test_subscription):
+        """Issued port and password are stored on the subscription"""
+        server, address = await fake_server()
+        monkeypatch.setattr(shadowsocks_api, "settings", SimpleNamespace(SS_SERVER_HOST="203.0.113.1"))
+        monkeypatch.setattr(shadowsocks_api, "ss_manager", ShadowsocksManager(address, timeout=1))
+        monkeypatch.setattr(shadowsocks_api, "port_allocator", PortAllocator(10000, 10010))
+        shadowsocks_api.port_allocator.rebuild([])
+
+        result = await shadowsocks_api.provision_subscription(test_session, test_subscription)
+
+        assert test_subscription.ss_port == 10000
+        assert server.ports == {10000: test_subscription.ss_password}
+        assert result["config"]["server_port"] == 10000
+
+        assert await shadowsocks_api.deprovision_subscription(test_session, test_subscription) is True
+        assert test_subscription.ss_port is None
+        assert server.ports == {}
+        assert 10000 not in shadowsocks_api.port_allocator
+        await shadowsocks_api.ss_manager.close()
+
+    @pytest.mark.asyncio
+    async def test_provision_failure_releases_port(self, fake_server, monkeypatch, test_session, test_subscription):
+        """Port is returned to the pool and cleared when ss-manager rejects it"""
+        _, address = await fake_server(drop={"add"})
+        monkeypatch.setattr(shadowsocks_api, "ss_manager", ShadowsocksManager(address, timeout=0.2))
+        monkeypatch.setattr(shadowsocks_api, "port_allocator", PortAllocator(10000, 10010))
+        shadowsocks_api.port_allocator.rebuild([])
+
+        with pytest.raises(Exception, match="Failed to add port"):
+            await shadowsocks_api.provision_subscription(test_session, test_subscription)
+
+        assert test_subscription.ss_port is None
+        assert 10000 not in shadowsocks_api.port_allocator
+        await shadowsocks_api.ss_manager.close()
+
+
+class TestPortAllocator:
+    """Test suite for PortAllocator"""
+
+    def test_allocate_skips_used(self):
+        """Ports from the database are never handed out"""
+        allocator = PortAllocator(10000, 10010)
+        allocator.rebuild([10000, 10002, None, 70000])
+
+        assert [allocator.allocate() for _ in range(3)] == [10001, 10003, 10004]
+        assert allocator.free_count == 5
+
+    def test_release_and_reuse(self):
+        """Released port goes back to the pool"""
+        allocator = PortAllocator(10000, 10002)
+        allocator.rebuild([])
+        first, second = allocator.allocate(), allocator.allocate()
+
+        with pytest.raises(Exception, match="No available ports"):
+            allocator.allocate()
+
+        allocator.release(first)
+        assert first not in allocator
+        assert allocator.allocate() == first
+        assert second in allocator
+
+    def test_reserve(self):
+        """Reserved port is skipped by allocate"""
+        allocator = PortAllocator(10000, 10003)
+        allocator.rebuild([])
+
+        assert allocator.reserve(10000) is True
+        assert allocator.reserve(10000) is False
+        assert allocator.reserve(9999) is False
+        assert allocator.allocate() == 10001
+        assert allocator.free_count == 1
@@ -125,6 +125,30 @@ class TestSubscriptionService:
 
         assert result is None
 
+    @pytest.mark.asyncio
+    async def test_get_active_status(self, service, test_session, test_subscription, expired_subscription):
+        """Status projection returns plain columns, not ORM objects"""
+        row = await service.get_active_status(test_session, test_subscription.telegram_id)
+
+        assert not isinstance(row, Subscription)
+        assert (row.id, row.marzban_username) == (test_subscription.id, "FreedomVPN_test_abc1")
+        assert await service.get_active_status(test_session, expired_subscription.telegram_id) is None
+        assert (await service.get_status_by_username(test_session, "FreedomVPN_expired_xyz9")).telegram_id == (
+            expired_subscription.telegram_id
+        )
+
+    @pytest.mark.asyncio
+    async def test_get_active_subscriptions_batch(self, service, test_session, test_subscription, expired_subscription):
+        """Batch lookup by ids and usernames skips expired subscriptions"""
+        result = await service.get_active_subscriptions(
+            test_session,
+            telegram_ids=[test_subscription.telegram_id, expired_subscription.telegram_id, 999999999],
+            marzban_usernames=["FreedomVPN_test_abc1", "FreedomVPN_expired_xyz9"],
+        )
+
+        assert [s.id for s in result] == [test_subscription.id]
+        assert await service.get_active_subscriptions(test_session) == []
+
     # ============== TRIAL USAGE CHECK ==============
 
     @pytest.mark.asyncio
@@ -0,0 +1,78 @@
+# Tests for the in-process subscription change bus
+import asyncio
+
+import pytest
+
+from services.subscription_events import RedisSubscriptionRelay, SubscriptionEvents, create_subscription_relay
+
+
+class TestSubscriptionEvents:
+    """Test suite for SubscriptionEvents"""
+
+    @pytest.mark.asyncio
+    async def test_publish_wakes_listener(self):
+        """Listener of the user is woken, others are not"""
+        events = SubscriptionEvents()
+        with events.subscribe(1) as queue, events.subscribe(2) as other:
+            waiter = asyncio.create_task(queue.get())
+            await asyncio.sleep(0)
+
+            assert events.publish(1) == 1
+            assert await asyncio.wait_for(waiter, timeout=1) == 1
+            assert other.empty()
+
+    @pytest.mark.asyncio
+    async def test_publish_coalesces(self):
+        """Several changes before the listener wakes up give one notification"""
+        events = SubscriptionEvents()
+        with events.subscribe(1) as queue:
+            events.publish(1)
+            events.publish(1)
+
+            assert queue.qsize() == 1
+
+    def test_unsubscribe_cleans_up(self):
+        """Leaving the context removes the listener"""
+        events = SubscriptionEvents()
+        with events.subscribe(1):
+            with events.subscribe(1):
+                assert events.listeners(1) == 2
+            assert events.listeners() == 1
+
+        assert events.listeners() == 0
+        assert events.publish(1) == 0
+
+
+class TestSubscriptionRelay:
+    """Test suite for cross-worker subscription change relays"""
+
+    @pytest.mark.asyncio
+    async def test_memory_relay_applies_locally(self):
+        """Without Redis the change is applied in the current worker"""
+        relay = create_subscription_relay("memory")
+        changed = []
+        relay.start(changed.append)
+
+        await relay.publish(42)
+
+        assert changed == [42]
+        await relay.stop()
+
+    @pytest.mark.asyncio
+    async def test_redis_publish_failure_applies_locally(self):
+        """If Redis is unreachable the worker that got the webhook still applies it"""
+
+        class BrokenRedis:
+            async def publish(self, channel, message):
+                raise ConnectionError("redis is down")
+
+        relay = RedisSubscriptionRelay.__new__(RedisSubscriptionRelay)
+        relay._redis = BrokenRedis()
+        relay.channel = "subscription_changes"
+        relay._task = None
+        changed = []
+        relay._handler = changed.append
+
+        await relay.publish(42)
+
+        assert changed == [42]
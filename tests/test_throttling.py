@@ -0,0 +1,107 @@
+# Tests for callback throttling middleware and rate limit storage
+import asyncio
+import pytest
+from unittest.mock import AsyncMock, MagicMock
+
+from bot.middlewares.throttling import ThrottlingMiddleware, ThrottleRule
+from services.rate_limiter import MemoryRateLimitStorage
+
+
+def make_callback(data: str, user_id: int = 123456789):
+    """Create a fake CallbackQuery"""
+    callback = MagicMock()
+    callback.data = data
+    callback.from_user.id = user_id
+    callback.answer = AsyncMock()
+    return callback
+
+
+class TestMemoryRateLimitStorage:
+    """Test suite for MemoryRateLimitStorage"""
+
+    @pytest.mark.asyncio
+    async def test_bucket_capacity(self):
+        """Only `capacity` requests should pass in a burst"""
+        storage = MemoryRateLimitStorage()
+
+        results = [await storage.consume("k", capacity=3, refill_rate=0.001) for _ in range(5)]
+
+        assert results == [True, True, True, False, False]
+
+    @pytest.mark.asyncio
+    async def test_lock(self):
+        """Lock can't be acquired twice until released"""
+        storage = MemoryRateLimitStorage()
+
+        assert await storage.acquire("lock", ttl=10) is True
+        assert await storage.acquire("lock", ttl=10) is False
+        await storage.release("lock")
+        assert await storage.acquire("lock", ttl=10) is True
+
+
+class TestThrottlingMiddleware:
+    """Test suite for ThrottlingMiddleware"""
+
+    @pytest.fixture
+    def middleware(self):
+        rules = {
+            "check_payment": ThrottleRule(capacity=2, refill_rate=0.001),
+            "pay_card_": ThrottleRule(capacity=1, refill_rate=0.001),
+        }
+        return ThrottlingMiddleware(MemoryRateLimitStorage(), rules=rules)
+
+    @pytest.mark.asyncio
+    async def test_unlisted_callback_passes(self, middleware):
+        """Callbacks without a rule are never throttled"""
+        handler = AsyncMock(return_value="ok")
+
+        for _ in range(10):
+            assert await middleware(handler, make_callback("back_to_menu"), {}) == "ok"
+
+        assert handler.await_count == 10
+
+    @pytest.mark.asyncio
+    async def test_throttled_after_capacity(self, middleware):
+        """Handler is not called once the bucket is empty"""
+        handler = AsyncMock(return_value="ok")
+
+        for _ in range(3):
+            await middleware(handler, make_callback("check_payment"), {})
+
+        assert handler.await_count == 2
+
+    @pytest.mark.asyncio
+    async def test_prefix_rule(self, middleware):
+        """Rule ending with '_' matches callback data by prefix"""
+        handler = AsyncMock(return_value="ok")
+
+        await middleware(handler, make_callback("pay_card_month"), {})
+        await middleware(handler, make_callback("pay_card_week"), {})
+
+        assert handler.await_count == 1
+
+    @pytest.mark.asyncio
+    async def test_inflight_deduplication(self, middleware):
+        """Second identical callback joins the running one"""
+        started = asyncio.Event()
+        release = asyncio.Event()
+        calls = 0
+
+        async def handler(event, data):
+            nonlocal calls
+            calls += 1
+            started.set()
+            await release.wait()
+            return "result"
+
+        first = asyncio.create_task(middleware(handler, make_callback("check_payment"), {}))
+        await started.wait()
+        second_callback = make_callback("check_payment")
+        second = asyncio.create_task(middleware(handler, second_callback, {}))
+        await asyncio.sleep(0)
+        release.set()
+
+        assert await first == "result"
+        assert await second == "result"
+        assert calls == 1
+        second_callback.answer.assert_awaited()
@@ -0,0 +1,120 @@
+# Tests for UserService profile cache
+import pytest
+from sqlalchemy import event, select
+
+from services.user_service import UserService, UserProfile, UserProfileCache, user_cache
+from database.models import User
+
+
+class TestUserProfileCache:
+    """Test suite for UserProfileCache"""
+
+    def test_lru_eviction(self):
+        """Oldest profile should be evicted when cache is full"""
+        cache = UserProfileCache(maxsize=2)
+        cache.put(UserProfile(1, "a", None, None))
+        cache.put(UserProfile(2, "b", None, None))
+        cache.get(1)  # 1 становится самым свежим
+        cache.put(UserProfile(3, "c", None, None))
+
+        assert cache.get(2) is None
+        assert cache.get(1) is not None
+        assert cache.get(3) is not None
+        assert len(cache) == 2
+
+
+class TestUserServiceSyncProfile:
+    """Test suite for UserService.sync_profile"""
+
+    @pytest.fixture(autouse=True)
+    def clear_cache(self):
+        user_cache.clear()
+        yield
+        user_cache.clear()
+
+    @pytest.fixture
+    def statements(self, test_engine):
+        """Collect SQL statements executed by the engine"""
+        executed = []
+
+        def before_execute(conn, cursor, statement, parameters, context, executemany):
+            executed.append(statement)
+
+        event.listen(test_engine.sync_engine, "before_cursor_execute", before_execute)
+        yield executed
+        event.remove(test_engine.sync_engine, "before_cursor_execute", before_execute)
+
+    @pytest.mark.asyncio
+    async def test_sync_profile_creates_user(self, test_session):
+        """New user should be created and cached"""
+        profile = await UserService.sync_profile(
+            test_session, telegram_id=555, username="new", first_name="New"
+        )
+
+        assert profile.telegram_id == 555
+        assert user_cache.get(555) == profile
+        user = await UserService.get_user_by_telegram_id(test_session, 555)
+        assert user is not None
+        assert user.first_name == "New"
+
+    @pytest.mark.asyncio
+    async def test_sync_profile_unchanged_skips_db(self, test_session, test_user, statements):
+        """Unchanged cached profile should not touch the database"""
+        await UserService.sync_profile(
+            test_session, test_user.telegram_id, "testuser", "Test", "User"
+        )
+        statements.clear()
+
+        await UserService.sync_profile(
+            test_session, test_user.telegram_id, "testuser", "Test", "User"
+        )
+
+        assert statements == []
+
+    @pytest.mark.asyncio
+    async def test_sync_profile_changed_writes(self, test_session, test_user, statements):
+        """Changed profile fields should be written with a single UPDATE"""
+        await UserService.sync_profile(
+            test_session, test_user.telegram_id, "testuser", "Test", "User"
+        )
+        statements.clear()
+
+        profile = await UserService.sync_profile(
+            test_session, test_user.telegram_id, "renamed", "Test", "User"
+        )
+
+        assert profile.username == "renamed"
+        assert len(statements) == 1
+        assert statements[0].startswith("UPDATE users")
+
+    @pytest.mark.asyncio
+    async def test_sync_profile_sets_admin(self, test_session, test_user):
+        """Admin flag should be set but never cleared"""
+        await UserService.sync_profile(
+            test_session, test_user.telegram_id, "testuser", "Test", "User", is_admin=True
+        )
+        profile = await UserService.sync_profile(
+            test_session, test_user.telegram_id, "testuser", "Test", "User", is_admin=False
+        )
+
+        assert profile.is_admin is True
+        await test_session.flush()
+        user = await test_session.get(User, test_user.id)
+        await test_session.refresh(user)
+        assert user.is_admin is True
+
+    # ============== BALANCE ==============
+
+    @pytest.mark.asyncio
+    async def test_debit_balance(self, test_session, test_user):
+        """Debit succeeds only while the balance covers the amount"""
+        test_user.balance = 150.0
+        await test_session.flush()
+
+        assert await UserService.debit_balance(test_session, test_user.telegram_id, 100.0) is True
+        assert await UserService.debit_balance(test_session, test_user.telegram_id, 100.0) is False
+
+        balance = await test_session.scalar(
+            select(User.balance).where(User.telegram_id == test_user.telegram_id)
+        )
+        assert balance == 50.0
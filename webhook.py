@@ -1,22 +1,108 @@
 """
 Webhook сервер для обработки уведомлений от ЮKassa
 """
-from fastapi import FastAPI, Request, HTTPException
+import asyncio
+import json
+import os
+import time
+from contextlib import asynccontextmanager
+from datetime import datetime
+
+from fastapi import Depends, FastAPI, Request, HTTPException
+from fastapi.responses import ORJSONResponse, Response, StreamingResponse
+from pydantic import BaseModel, Field
 from loguru import logger
 
-from database.database import AsyncSessionLocal
+from database.database import AsyncSessionLocal, engine
 from services.payment_service import PaymentService
 from services.subscription_service import SubscriptionService
-from services.user_service import UserService
+from services.referral_service import referral_service, referral_leaderboard
+from services.node_traffic_service import node_traffic_service
+from services.node_prober import node_prober
+from services.api_auth import admin_auth, api_rate_limit_storage, flutter_auth, metrics_auth, node_auth
+from services.lifecycle import worker_lifecycle
+from services.metrics import (
+    HTTP_SECONDS, SSE_STREAMS, WEBHOOKS_IN_FLIGHT, mark_worker_dead, render_metrics, track_queries,
+)
+from services.response_cache import CachedResponse, etag_matches, subscription_cache
+from services.subscription_events import create_subscription_relay, subscription_events
 from config import settings
 
-app = FastAPI(title="Shadowsocks VPN Bot - Webhook Server")
+
+# Изменения подписок из webhook'а доходят до всех воркеров (при THROTTLE_STORAGE=redis)
+subscription_relay = create_subscription_relay(settings.THROTTLE_STORAGE, settings.REDIS_URL)
+
+
+def apply_subscription_change(telegram_id: int):
+    """Ответы API о подписке устарели; ждущие SSE-клиенты получают новый статус"""
+    subscription_cache.invalidate_user(telegram_id)
+    subscription_events.publish(telegram_id)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """
+    Запуск и остановка воркера. Каждый воркер uvicorn — отдельный процесс
+    со своими движком БД, кэшами и фоновыми задачами.
+    """
+    worker_lifecycle.install_signal_handlers()
+    node_prober.start()
+    subscription_relay.start(apply_subscription_change)
+    logger.info(f"Webhook worker {os.getpid()} started")
+
+    yield
+
+    # uvicorn уже дождался текущих запросов; дорабатываем webhook'и, если что-то осталось
+    worker_lifecycle.start_draining()
+    await worker_lifecycle.wait_idle(settings.WEBHOOK_GRACEFUL_TIMEOUT)
+    await node_prober.stop()
+    await subscription_relay.stop()
+    if hasattr(api_rate_limit_storage, "close"):
+        await api_rate_limit_storage.close()
+    await engine.dispose()
+    worker_lifecycle.restore_signal_handlers()
+    mark_worker_dead(os.getpid())
+    logger.info(f"Webhook worker {os.getpid()} stopped")
+
+
+app = FastAPI(
+    title="Shadowsocks VPN Bot - Webhook Server",
+    lifespan=lifespan,
+    default_response_class=ORJSONResponse,
+)
+
+@app.middleware("http")
+async def observe_requests(request: Request, call_next):
+    """
+    Время ответа по шаблону маршрута (а не по URL — id пользователей не попадают в метки)
+    и число запросов к БД на HTTP-запрос (в лог)
+    """
+    start = time.perf_counter()
+    status = 500
+    with track_queries(f"{request.method} {request.url.path}") as stats:
+        try:
+            response = await call_next(request)
+            status = response.status_code
+            return response
+        finally:
+            route = request.scope.get("route")
+            route_path = route.path if route else "unmatched"
+            stats.scope = f"{request.method} {route_path}"
+            HTTP_SECONDS.labels(request.method, route_path, str(status)).observe(time.perf_counter() - start)
+
 
 payment_service = PaymentService()
 subscription_service = SubscriptionService()
 
 
-@app.post("/webhook/yukassa")
+async def track_webhook():
+    """Webhook в обработке — воркер не завершится, пока он не доработает"""
+    async with worker_lifecycle.track():
+        with WEBHOOKS_IN_FLIGHT.track_inprogress():
+            yield
+
+
+@app.post("/webhook/yukassa", dependencies=[Depends(track_webhook)])
 async def yukassa_webhook(request: Request):
     """Обработка webhook от ЮKassa"""
     try:
@@ -56,13 +142,18 @@ async def yukassa_webhook(request: Request):
                         telegram_username=telegram_username
                     )
 
-                # Начисляем реферальный бонус
-                amount_value = payment_object.get("amount", {}).get("value")
-                if amount_value:
-                    await UserService.accrue_referral_bonus(session, telegram_id, float(amount_value))
+                # Начисляем реферальный бонус (повторно с того же платежа не начислится)
+                payment = await payment_service.get_payment_by_yukassa_id(session, payment_object.get("id"))
+                if payment and payment.amount:
+                    await referral_service.process_referral_payment(
+                        session, payment.id, telegram_id, payment.amount
+                    )
 
             await session.commit()
 
+        if data.get("event") == "payment.succeeded":
+            await subscription_relay.publish(telegram_id)
+
         return {"status": "ok"}
 
     except Exception as e:
@@ -72,219 +163,414 @@ async def yukassa_webhook(request: Request):
 
 @app.get("/health")
 async def health_check():
-    """Проверка здоровья сервера"""
+    """Проверка здоровья сервера (503 во время остановки — балансировщик уводит трафик)"""
+    if worker_lifecycle.draining.is_set():
+        return ORJSONResponse({"status": "draining"}, status_code=503)
     return {"status": "healthy"}
 
 
+@app.get("/metrics", include_in_schema=False, dependencies=[Depends(metrics_auth)])
+async def metrics():
+    """Метрики Prometheus (ключ METRICS_KEY: X-API-Key или Authorization: Bearer)"""
+    content, content_type = render_metrics()
+    return Response(content, media_type=content_type)
+
+
 # ============== FLUTTER APP API ==============
 
-@app.get("/api/subscription/{telegram_id}")
-async def get_subscription_status(telegram_id: int, api_key: str = ""):
+SSE_KEEPALIVE = 15.0  # Секунды между keep-alive комментариями в потоке событий
+
+def cached_json(request: Request, cached: CachedResponse) -> Response:
+    """Ответ из кэша: 304 если у клиента та же версия, иначе тело с ETag"""
+    headers = {"ETag": cached.etag, "Cache-Control": "private, no-cache"}
+    if etag_matches(request.headers.get("if-none-match"), cached.etag):
+        return Response(status_code=304, headers=headers)
+    return Response(cached.content, media_type="application/json", headers=headers)
+
+
+def subscription_body(row, now: datetime, *extra: str) -> dict:
+    """Ответ об активной подписке из строки STATUS_COLUMNS (+ дополнительные колонки)"""
+    body = {
+        "active": True,
+        "plan_type": row.plan_type,
+        "expires_at": row.expires_at.isoformat(),
+        "days_left": max(0, (row.expires_at - now).days),
+        "hours_left": max(0, int((row.expires_at - now).total_seconds() / 3600)),
+        "marzban_username": row.marzban_username,
+    }
+    for column in extra:
+        body[column] = getattr(row, column)
+    return body
+
+
+async def load_subscription_status(telegram_id: int) -> CachedResponse:
+    """Статус подписки пользователя (из кэша или из БД)"""
+    cache_key = ("status", telegram_id)
+    cached = subscription_cache.get(cache_key)
+    if cached is not None:
+        return cached
+
+    async with AsyncSessionLocal() as session:
+        subscription = await subscription_service.get_active_status(session, telegram_id)
+
+    if not subscription:
+        body = {
+            "active": False,
+            "message": "No active subscription"
+        }
+    else:
+        body = subscription_body(subscription, datetime.utcnow(), "subscription_url")
+
+    return subscription_cache.put(cache_key, body, telegram_id)
+
+
+@app.get("/api/subscription/{telegram_id}", dependencies=[Depends(flutter_auth)])
+async def get_subscription_status(request: Request, telegram_id: int):
     """
     API для Flutter-приложения: получить статус подписки пользователя
     
     Args:
         telegram_id: Telegram ID пользователя
-        api_key: API ключ для аутентификации
     
     Returns:
-        JSON с информацией о подписке
+        JSON с информацией о подписке (ETag; 304 при If-None-Match с той же версией)
     """
-    from datetime import datetime
-    
-    # Проверка API ключа
-    if not settings.FLUTTER_API_KEY or api_key != settings.FLUTTER_API_KEY:
-        raise HTTPException(status_code=403, detail="Invalid or missing API key")
-    
     try:
-        async with AsyncSessionLocal() as session:
-            subscription = await subscription_service.get_active_subscription(
-                session, telegram_id
-            )
-            
-            if not subscription:
-                return {
-                    "active": False,
-                    "message": "No active subscription"
-                }
-            
-            # Рассчитываем оставшиеся дни
-            now = datetime.utcnow()
-            days_left = max(0, (subscription.expires_at - now).days)
-            hours_left = max(0, int((subscription.expires_at - now).total_seconds() / 3600))
-            
-            return {
-                "active": True,
-                "plan_type": subscription.plan_type,
-                "expires_at": subscription.expires_at.isoformat(),
-                "days_left": days_left,
-                "hours_left": hours_left,
-                "subscription_url": subscription.subscription_url,
-                "marzban_username": subscription.marzban_username
-            }
-    
+        cached = await load_subscription_status(telegram_id)
     except Exception as e:
         logger.error(f"Error getting subscription status: {e}")
         raise HTTPException(status_code=500, detail="Internal server error")
 
+    return cached_json(request, cached)
+
+
+def sse_event(event: str, body: str, event_id: str) -> str:
+    """Кадр text/event-stream"""
+    return f"event: {event}\nid: {event_id}\ndata: {body}\n\n"
 
-@app.get("/api/subscription/by-username/{marzban_username}")
-async def get_subscription_by_username(marzban_username: str, api_key: str = ""):
+
+@app.get("/api/subscription/{telegram_id}/events", dependencies=[Depends(flutter_auth)])
+async def subscription_events_stream(request: Request, telegram_id: int):
+    """
+    API для Flutter: поток изменений подписки (Server-Sent Events) вместо частого опроса после оплаты.
+
+    Сразу отдаёт текущий статус, затем новый статус при каждом изменении подписки.
+    Через SUBSCRIPTION_STREAM_TIMEOUT секунд поток закрывается — клиент переподключается
+    (Last-Event-ID с ETag последнего статуса пропускает повтор того же статуса).
+    """
+    async def stream():
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + settings.SUBSCRIPTION_STREAM_TIMEOUT
+        last_etag = request.headers.get("last-event-id")
+
+        timed_out = False
+
+        # Подписываемся до чтения статуса, чтобы не пропустить изменение между ними
+        with subscription_events.subscribe(telegram_id) as queue, SSE_STREAMS.track_inprogress():
+            while True:
+                try:
+                    cached = await load_subscription_status(telegram_id)
+                except Exception as e:
+                    logger.error(f"Error getting subscription status for stream: {e}")
+                    return
+                if cached.etag != last_etag:
+                    last_etag = cached.etag
+                    yield sse_event("subscription", cached.content.decode(), cached.etag)
+                elif timed_out:
+                    # Комментарий, чтобы прокси не рвали простаивающее соединение
+                    yield ": keep-alive\n\n"
+
+                remaining = deadline - loop.time()
+                if remaining <= 0 or worker_lifecycle.draining.is_set() or await request.is_disconnected():
+                    return
+
+                # Ждём события (от всех воркеров при THROTTLE_STORAGE=redis) или остановки; по таймауту
+                # статус перечитывается — так видны изменения из бота (через кэш с TTL)
+                changed = asyncio.ensure_future(queue.get())
+                draining = asyncio.ensure_future(worker_lifecycle.draining.wait())
+                done, pending = await asyncio.wait(
+                    {changed, draining},
+                    timeout=min(SSE_KEEPALIVE, remaining),
+                    return_when=asyncio.FIRST_COMPLETED,
+                )
+                for task in pending:
+                    task.cancel()
+                timed_out = not done
+
+    return StreamingResponse(
+        stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@app.get("/api/subscription/by-username/{marzban_username}", dependencies=[Depends(flutter_auth)])
+async def get_subscription_by_username(request: Request, marzban_username: str):
     """
     API для Flutter-приложения: получить статус подписки по marzban username.
     Автоматически определяет подписку из VLESS конфига (FreedomVPN_xxx_yyy).
     
     Args:
         marzban_username: Username из VLESS конфига (напр. FreedomVPN_ivan_abc1)
-        api_key: API ключ для аутентификации
     """
-    from datetime import datetime
-    from sqlalchemy import select
-    from database.models import Subscription, SubscriptionStatus
-    
-    # Проверка API ключа
-    if not settings.FLUTTER_API_KEY or api_key != settings.FLUTTER_API_KEY:
-        raise HTTPException(status_code=403, detail="Invalid or missing API key")
-    
+    cache_key = ("username", marzban_username)
+    cached = subscription_cache.get(cache_key)
+    if cached is not None:
+        return cached_json(request, cached)
+
+    telegram_id = None
     try:
         async with AsyncSessionLocal() as session:
             # Поиск по marzban_username
-            result = await session.execute(
-                select(Subscription).where(
-                    Subscription.marzban_username == marzban_username,
-                    Subscription.status == SubscriptionStatus.ACTIVE
-                )
-            )
-            subscription = result.scalar_one_or_none()
-            
-            if not subscription:
-                return {
-                    "active": False,
-                    "message": "Subscription not found"
-                }
-            
-            # Рассчитываем оставшиеся дни
-            now = datetime.utcnow()
-            if subscription.expires_at < now:
-                return {
-                    "active": False,
-                    "message": "Subscription expired"
-                }
-            
-            days_left = max(0, (subscription.expires_at - now).days)
-            hours_left = max(0, int((subscription.expires_at - now).total_seconds() / 3600))
-            
-            return {
-                "active": True,
-                "plan_type": subscription.plan_type,
-                "expires_at": subscription.expires_at.isoformat(),
-                "days_left": days_left,
-                "hours_left": hours_left,
-                "telegram_id": subscription.telegram_id,
-                "marzban_username": subscription.marzban_username
-            }
-    
+            subscription = await subscription_service.get_status_by_username(session, marzban_username)
     except Exception as e:
         logger.error(f"Error getting subscription by username: {e}")
         raise HTTPException(status_code=500, detail="Internal server error")
 
+    now = datetime.utcnow()
+    if not subscription:
+        body = {
+            "active": False,
+            "message": "Subscription not found"
+        }
+    elif subscription.expires_at < now:
+        telegram_id = subscription.telegram_id
+        body = {
+            "active": False,
+            "message": "Subscription expired"
+        }
+    else:
+        telegram_id = subscription.telegram_id
+        body = subscription_body(subscription, now, "telegram_id")
+
+    return cached_json(request, subscription_cache.put(cache_key, body, telegram_id))
+
 
-@app.get("/api/servers")
-async def get_servers(api_key: str = ""):
+MAX_BATCH_SIZE = 500  # Сколько пользователей можно запросить за раз
+
+
+class SubscriptionBatchRequest(BaseModel):
+    """Запрос статуса подписок сразу для многих пользователей"""
+    telegram_ids: list[int] = Field(default_factory=list, max_length=MAX_BATCH_SIZE)
+    marzban_usernames: list[str] = Field(default_factory=list, max_length=MAX_BATCH_SIZE)
+
+
+@app.post("/api/subscriptions/batch", dependencies=[Depends(flutter_auth)])
+async def get_subscriptions_batch(batch: SubscriptionBatchRequest):
     """
-    API для Flutter: получить список доступных серверов
+    API для Flutter и поддержки: статус подписок для списка пользователей.
+    Все подписки читаются одним запросом; ответ — словари по telegram_id и по marzban username
+    (для каждого запрошенного ключа, включая тех, у кого подписки нет).
     """
-    # Проверка API ключа
-    if not settings.FLUTTER_API_KEY or api_key != settings.FLUTTER_API_KEY:
-        raise HTTPException(status_code=403, detail="Invalid or missing API key")
-    
     try:
-        # Возвращаем информацию о сервере из Marzban
-        from services.marzban_service import marzban_service
-        
-        # Получаем информацию о сервере
-        server_info = await marzban_service.get_server_info()
-        
-        return [
-            {
-                "name": f"🚀 {settings.SERVER_LOCATION}",
-                "location": settings.SERVER_LOCATION,
-                "protocol": "VLESS + Reality",
-                "host": server_info.get("host", "107.189.23.38"),
-                "port": server_info.get("port", 443),
-                "available": True
-            }
-        ]
+        async with AsyncSessionLocal() as session:
+            subscriptions = await subscription_service.get_active_subscriptions(
+                session, batch.telegram_ids, batch.marzban_usernames
+            )
     except Exception as e:
-        logger.error(f"Error getting servers: {e}")
-        # Fallback - вернуть дефолтный сервер
-        return [
-            {
-                "name": f"🚀 {settings.SERVER_LOCATION}",
-                "location": settings.SERVER_LOCATION,
-                "protocol": "VLESS + Reality",
-                "host": "107.189.23.38",
-                "port": 443,
-                "available": True
-            }
-        ]
+        logger.error(f"Error getting subscriptions batch: {e}")
+        raise HTTPException(status_code=500, detail="Internal server error")
+
+    now = datetime.utcnow()
+    by_telegram_id = {}
+    by_username = {}
+    # Подписки отсортированы по сроку — у пользователя остаётся самая поздняя
+    for subscription in subscriptions:
+        body = subscription_body(subscription, now, "telegram_id", "subscription_url")
+        by_telegram_id.setdefault(subscription.telegram_id, body)
+        by_username.setdefault(subscription.marzban_username, body)
+
+    missing = {"active": False, "message": "No active subscription"}
+    return {
+        "telegram_ids": {
+            str(telegram_id): by_telegram_id.get(telegram_id, missing)
+            for telegram_id in batch.telegram_ids
+        },
+        "marzban_usernames": {
+            username: by_username.get(username, missing)
+            for username in batch.marzban_usernames
+        },
+    }
+
 
+@app.get("/api/servers", dependencies=[Depends(flutter_auth)])
+async def get_servers():
+    """
+    API для Flutter: получить список серверов (самый быстрый — первым)
+    """
+    # Снимок фоновой проверки: доступные первыми, затем по задержке и загрузке
+    return [
+        {
+            "name": f"🚀 {health.location}",
+            "node": health.name,
+            "location": health.location,
+            "protocol": "VLESS + Reality",
+            "host": health.host,
+            "port": health.port,
+            "available": health.available,
+            "latency_ms": round(health.latency_ms, 1) if health.latency_ms is not None else None,
+            "load": health.users_active,
+        }
+        for health in node_prober.snapshot()
+    ]
 
-@app.get("/api/vless/{telegram_id}")
-async def get_vless_link(telegram_id: int, api_key: str = ""):
+
+@app.get("/api/vless/{telegram_id}", dependencies=[Depends(flutter_auth)])
+async def get_vless_link(request: Request, telegram_id: int):
     """
-    API для Flutter: получить VLESS ссылку для подключения
+    API для Flutter: получить VLESS ссылку для подключения (ETag / 304)
     """
-    # Проверка API ключа
-    if not settings.FLUTTER_API_KEY or api_key != settings.FLUTTER_API_KEY:
-        raise HTTPException(status_code=403, detail="Invalid or missing API key")
+    cache_key = ("vless", telegram_id)
+    cached = subscription_cache.get(cache_key)
+    if cached is not None:
+        return cached_json(request, cached)
     
     try:
         async with AsyncSessionLocal() as session:
-            subscription = await subscription_service.get_active_subscription(
-                session, telegram_id
-            )
-            
-            if not subscription:
-                raise HTTPException(status_code=404, detail="No active subscription")
-            
-            if not subscription.subscription_url:
-                raise HTTPException(status_code=404, detail="No VLESS configuration found")
-            
-            # Получаем ссылки из Marzban
-            from services.marzban_service import marzban_service
-            
-            try:
-                links = await marzban_service.get_user_links(subscription.marzban_username)
-                vless_links = links.get("links", [])
-                
-                # Находим первую VLESS ссылку
-                vless_link = next(
-                    (link for link in vless_links if link.startswith("vless://")),
-                    subscription.subscription_url
-                )
-                
-                return {
-                    "vless_link": vless_link,
-                    "subscription_url": subscription.subscription_url,
-                    "all_links": vless_links
-                }
-            except Exception as e:
-                logger.error(f"Error getting VLESS links from Marzban: {e}")
-                return {
-                    "vless_link": subscription.subscription_url,
-                    "subscription_url": subscription.subscription_url,
-                    "all_links": []
-                }
-    
-    except HTTPException:
-        raise
+            subscription = await subscription_service.get_active_status(session, telegram_id)
     except Exception as e:
         logger.error(f"Error getting VLESS link: {e}")
         raise HTTPException(status_code=500, detail="Internal server error")
 
+    if not subscription:
+        raise HTTPException(status_code=404, detail="No active subscription")
+
+    if not subscription.subscription_url:
+        raise HTTPException(status_code=404, detail="No VLESS configuration found")
+
+    # Получаем ссылки из Marzban (с ноды, где живёт пользователь) — сессия БД уже закрыта
+    from services.marzban_service import marzban_pool
+
+    try:
+        links = await marzban_pool.get(subscription.node).get_user_links(subscription.marzban_username)
+        vless_links = links.get("links", [])
+
+        # Находим первую VLESS ссылку
+        vless_link = next(
+            (link for link in vless_links if link.startswith("vless://")),
+            subscription.subscription_url
+        )
+
+        body = {
+            "vless_link": vless_link,
+            "subscription_url": subscription.subscription_url,
+            "all_links": vless_links
+        }
+    except Exception as e:
+        logger.error(f"Error getting VLESS links from Marzban: {e}")
+        # Запасной ответ не кэшируем — при следующем запросе снова спросим Marzban
+        return {
+            "vless_link": subscription.subscription_url,
+            "subscription_url": subscription.subscription_url,
+            "all_links": []
+        }
+
+    return cached_json(request, subscription_cache.put(cache_key, body, telegram_id))
+
+
+@app.get("/api/referrals/leaderboard", dependencies=[Depends(admin_auth)])
+async def get_referral_leaderboard():
+    """
+    Админский API: топ рефереров по приглашённым и по заработку (ключ ADMIN_API_KEY).
+    Отдаётся из предрассчитанного лидерборда, без GROUP BY по пользователям.
+    """
+    try:
+        async with AsyncSessionLocal() as session:
+            await referral_leaderboard.ensure_fresh(session)
+            by_referrals = referral_leaderboard.top_by_referrals()
+            by_earnings = referral_leaderboard.top_by_earnings()
+
+            network = await referral_service.get_network_sizes(
+                session, list({e.telegram_id for e in by_referrals + by_earnings})
+            )
+
+        def serialize(entry) -> dict:
+            return {
+                "telegram_id": entry.telegram_id,
+                "username": entry.username,
+                "first_name": entry.first_name,
+                "total_referrals": entry.total_referrals,
+                "total_earned": entry.total_earned,
+                "network_size": network.get(entry.telegram_id, 0),
+            }
+
+        return {
+            "by_referrals": [serialize(e) for e in by_referrals],
+            "by_earnings": [serialize(e) for e in by_earnings],
+        }
+
+    except Exception as e:
+        logger.error(f"Error getting referral leaderboard: {e}")
+        raise HTTPException(status_code=500, detail="Internal server error")
+
+
+# ============== NODES TRAFFIC ==============
+
+class NodeTrafficReport(BaseModel):
+    """Отчёт monitor_traffic --daemon с ноды"""
+    month: str
+    rx_bytes: int
+    tx_bytes: int
+    rx_rate: float = 0.0
+    tx_rate: float = 0.0
+    limit_gb: float
+    interfaces: dict[str, list[float]] = {}
+
+
+@app.post("/api/nodes/{node}/traffic", dependencies=[Depends(node_auth)])
+async def report_node_traffic(node: str, report: NodeTrafficReport):
+    """Принять отчёт о трафике ноды"""
+    try:
+        async with AsyncSessionLocal() as session:
+            await node_traffic_service.save_report(session, node, **report.model_dump())
+            await session.commit()
+        return {"status": "ok"}
+
+    except Exception as e:
+        logger.error(f"Error saving traffic report from node '{node}': {e}")
+        raise HTTPException(status_code=500, detail="Internal server error")
+
+
+@app.get("/api/nodes/traffic", dependencies=[Depends(node_auth)])
+async def get_nodes_traffic(month: str | None = None):
+    """Сводка трафика по всем нодам за месяц"""
+    try:
+        async with AsyncSessionLocal() as session:
+            overview = await node_traffic_service.get_overview(session, month)
+
+        return {
+            "month": overview["month"],
+            "total_gb": round(overview["total_gb"], 2),
+            "limit_gb": overview["limit_gb"],
+            "nodes": [
+                {
+                    "node": node.node,
+                    "used_gb": round(node_traffic_service.usage_gb(node), 2),
+                    "limit_gb": node.limit_gb,
+                    "rx_bytes": node.rx_bytes,
+                    "tx_bytes": node.tx_bytes,
+                    "rx_rate": node.rx_rate,
+                    "tx_rate": node.tx_rate,
+                    "interfaces": json.loads(node.interfaces or "{}"),
+                    "updated_at": node.updated_at.isoformat(),
+                }
+                for node in overview["nodes"]
+            ],
+        }
+
+    except Exception as e:
+        logger.error(f"Error getting nodes traffic: {e}")
+        raise HTTPException(status_code=500, detail="Internal server error")
 
 if __name__ == "__main__":
     import uvicorn
-    uvicorn.run(app, host="0.0.0.0", port=8080)
+    uvicorn.run(
+        "webhook:app",
+        host=settings.WEBHOOK_HOST,
+        port=settings.WEBHOOK_PORT,
+        workers=settings.WEBHOOK_WORKERS,
+        loop="uvloop",
+        http="httptools",
+        timeout_graceful_shutdown=settings.WEBHOOK_GRACEFUL_TIMEOUT,
+    )
 